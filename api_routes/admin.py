@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+from typing import Annotated, Literal
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+from models.db_models.db_user_models import User
+from models.api_models.api_profile_models import RequestProfileRead
+from core.auth_core import get_current_admin
+from core.profiling_core import list_profiles, get_profile, profile_summary
+
+router = APIRouter(prefix="/admin", tags=["Admin Operations"])
+
+
+@router.get("/profiles", response_model=list[RequestProfileRead])
+async def list_profiles_endpoint(
+    current_admin: Annotated[User, Depends(get_current_admin)]
+):
+    # profiles live in memory, so every app worker only lists the slow requests it handled itself
+    return [
+        RequestProfileRead(
+            id=profile.id,
+            method=profile.method,
+            route=profile.route,
+            status_code=profile.status_code,
+            duration_seconds=round(profile.duration_seconds, 6),
+            created_at=datetime.fromtimestamp(profile.created_at, tz=timezone.utc),
+        )
+        for profile in list_profiles()
+    ]
+
+
+@router.get("/profiles/{profile_id}")
+async def download_profile_endpoint(
+    profile_id: int,
+    current_admin: Annotated[User, Depends(get_current_admin)],
+    format: Annotated[Literal["pstats", "text"], Query()] = "pstats",
+    sort: Annotated[Literal["cumulative", "tottime", "calls"], Query()] = "cumulative",
+):
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    if format == "text":
+        return PlainTextResponse(profile_summary(profile, sort))
+    # readable with `python -m pstats profile_<id>.prof` or snakeviz
+    return Response(
+        content=profile.stats,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile_{profile.id}.prof"'},
+    )
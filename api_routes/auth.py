@@ -1,6 +1,6 @@
 from typing import Annotated
 from uuid import uuid4
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import EmailStr, TypeAdapter, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -9,11 +9,13 @@ from models.db_models.db_user_models import User
 from models.api_models.api_auth_models import (
     Token,
     TokenSessionCreate,
+    TokenSessionListQuery,
     TokenSessionRead
 )
+from models.api_models.api_pagination_models import Page
 from core.crud.crud_tokens import (
     create_token_session,
-    get_token_session_by_jti,
+    revoke_token_session,
     list_token_sessions,
     get_token_session_by_id,
     delete_token_session,
@@ -77,12 +79,10 @@ async def logout(
     if not jti:
         raise HTTPException(status_code=400, detail="Invalid token")
 
-    session = await get_token_session_by_jti(db, jti)
+    session = await revoke_token_session(db, jti)
     if not session:
         raise HTTPException(status_code=400, detail="Session not found - you are already logged out, buddy!")
 
-    session.is_revoked = True
-    await db.commit()
     return {"detail": "Logged out successfully"}
 
 
@@ -90,13 +90,14 @@ async def logout(
 ########################## Token Session Endpoints ######################
 #########################################################################
 
-@router.get("/token-sessions", response_model=list[TokenSessionRead])
+@router.get("/token-sessions", response_model=Page[TokenSessionRead])
 async def list_token_sessions_endpoint(
+    query: Annotated[TokenSessionListQuery, Query()],
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)]
 ):
-    sessions = await list_token_sessions(db, user_id=current_user.id)
-    return sessions
+    sessions, next_cursor = await list_token_sessions(db, query, user_id=current_user.id)
+    return {"items": sessions, "next_cursor": next_cursor}
 
 
 @router.get("/token-sessions/{session_id}", response_model=TokenSessionRead)
@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from core.database_core import engine, pool_metrics
+from core.metrics_core import gauge_lines, render_metrics
+from core.render_core import render_in_flight, render_queue_depth
+
+router = APIRouter(tags=["Health"])
+
+
+@router.get("/health")
+async def health_endpoint():
+    return {"status": "ok", "db_pool": pool_metrics(engine)}
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    gauges = []
+    for name, value in pool_metrics(engine).items():
+        if name in ("checkouts", "wait_seconds_total"):
+            gauges += gauge_lines(f"db_pool_{name.removesuffix('_total')}_total", f"Connection pool {name.replace('_', ' ')}.", value, "counter")
+        elif isinstance(value, (int, float)):
+            gauges += gauge_lines(f"db_pool_{name}", f"Connection pool {name.replace('_', ' ')}.", value)
+    gauges += gauge_lines("render_in_flight", "Renders running or queued on the render pool.", render_in_flight())
+    gauges += gauge_lines("render_queue_depth", "Renders waiting for a free render worker.", render_queue_depth())
+    return PlainTextResponse(render_metrics(gauges), media_type="text/plain; version=0.0.4")
@@ -1,70 +1,298 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import os
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from core.database_core import get_db
+from core.database_core import get_db, AsyncSessionLocal
 from models.db_models.db_user_models import User
+from models.db_models.db_catalog_models import ItemConfiguration, RENDER_STATUS_PENDING, RENDER_STATUS_RENDERING
+from models.api_models.api_pagination_models import Page
 from models.api_models.api_catalog_models import (
+    ItemBatchCreate,
+    ItemBatchRead,
     ItemCreate,
+    ItemExpandQuery,
+    ItemExportQuery,
+    ItemListQuery,
     ItemRead,
-    ItemUpdate
+    ItemReadExpanded,
+    ItemRenderRead,
+    ItemUpdate,
+    MaterialRead,
+    ProductTypeRead
 )
 from core.crud.crud_catalog import (
-    get_material_by_id,
-    get_product_type_by_id,
+    material_exists,
+    product_type_exists,
+    get_source_image_by_id,
     create_item,
+    create_items_batch,
     list_items,
+    item_export_fields,
+    stream_items_for_export,
+    get_database_time,
     get_item_by_id,
     update_item,
     delete_item
 )
 from core.auth_core import get_current_user
+from core.storage_core import STORAGE_REDIRECT_DOWNLOADS, get_storage
+from core.image_core import PREVIEW_MEDIA_TYPES, PREVIEW_SPECS, preview_key
+from core.http_cache_core import file_etag, cache_headers, is_not_modified
+from core.export_core import EXPORT_BATCH_SIZE, to_ndjson, to_csv
+from core.render_jobs_core import notify_render_jobs, RENDER_JOB_POLL_SECONDS
 
 router = APIRouter(tags=["Items"])
 
+MAX_RENDER_WAIT_SECONDS = 30
 
 
-@router.post("/items", response_model=ItemRead)
+def _expanded_item(item: ItemConfiguration, expand: list[str]) -> ItemReadExpanded:
+    # relations that were not requested are not loaded, touching them would need another query
+    relations = {}
+    if "material" in expand:
+        relations["material"] = MaterialRead.model_validate(item.material)
+    if "product_type" in expand:
+        relations["product_type"] = ProductTypeRead.model_validate(item.product_type)
+    return ItemReadExpanded(**ItemRead.model_validate(item).model_dump(), **relations)
+
+
+
+@router.post("/items", response_model=ItemReadExpanded, response_model_exclude_unset=True)
 async def create_item_endpoint(
     data: ItemCreate,
+    query: Annotated[ItemExpandQuery, Query()],
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)]
 ):
-    material = await get_material_by_id(db, data.material_id)
-    if not material:
+    if not await material_exists(db, data.material_id):
         raise HTTPException(status_code=404, detail=f"Material with id={data.material_id} was not found!")
 
-    product_type = await get_product_type_by_id(db, data.product_type_id)
-    if not product_type:
+    if not await product_type_exists(db, data.product_type_id):
         raise HTTPException(status_code=404, detail=f"Product type with id={data.product_type_id} was not found!")
 
+    if data.source_image_id is not None and not await get_source_image_by_id(db, data.source_image_id):
+        raise HTTPException(status_code=404, detail=f"Source image with id={data.source_image_id} was not found!")
+
     item = await create_item(db, data)
-    return item
+    if item.render_status == RENDER_STATUS_PENDING:
+        notify_render_jobs()
+    if query.expand:
+        item = await get_item_by_id(db, item.id, query.expand)
+    return _expanded_item(item, query.expand)
+
+
+@router.post("/items/batch", response_model=ItemBatchRead)
+async def create_items_batch_endpoint(
+    data: ItemBatchCreate,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    # invalid elements do not fail the whole batch, every element reports its own outcome
+    results = await create_items_batch(db, data.items)
+
+    response = []
+    for index, (item, error) in enumerate(results):
+        if item is None:
+            response.append({"index": index, "status": "failed", "error": error})
+        else:
+            response.append({"index": index, "status": "created", "item": ItemRead.model_validate(item)})
+    created = sum(1 for item, _ in results if item is not None)
+    if any(item is not None and item.render_status == RENDER_STATUS_PENDING for item, _ in results):
+        notify_render_jobs()
+    return {"created": created, "failed": len(results) - created, "results": response}
 
 
-@router.get("/items", response_model=list[ItemRead])
+@router.get("/items", response_model=Page[ItemReadExpanded], response_model_exclude_unset=True)
 async def list_items_endpoint(
+    query: Annotated[ItemListQuery, Query()],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    items, next_cursor = await list_items(db, query)
+    return {"items": [_expanded_item(item, query.expand) for item in items], "next_cursor": next_cursor}
+
+
+@router.get("/items/export", response_class=StreamingResponse)
+async def export_items_endpoint(
+    query: Annotated[ItemExportQuery, Query()],
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)]
 ):
-    return await list_items(db)
+    # taken from the database clock before streaming starts, clients pass it as updated_since of their next sync
+    export_started_at = await get_database_time(db)
+
+    async def rows():
+        # the stream outlives the request's session dependency, so it uses a session of its own
+        async with AsyncSessionLocal() as export_db:
+            async for row in stream_items_for_export(export_db, query, batch_size=EXPORT_BATCH_SIZE):
+                yield row
+
+    if query.format == "csv":
+        body, media_type = to_csv(rows(), item_export_fields(query)), "text/csv"
+    else:
+        body, media_type = to_ndjson(rows()), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="items.{query.format}"',
+            "X-Export-Started-At": export_started_at.isoformat(),
+        },
+    )
 
 
-@router.get("/items/{item_id}", response_model=ItemRead)
+@router.get("/items/{item_id}", response_model=ItemReadExpanded, response_model_exclude_unset=True)
 async def get_item_endpoint(
     item_id: int,
+    query: Annotated[ItemExpandQuery, Query()],
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)]
 ):
+    item = await get_item_by_id(db, item_id, query.expand)
+    if not item:
+        raise HTTPException(status_code=404, detail=f"Item with id={item_id} was not found!")
+    return _expanded_item(item, query.expand)
+
+
+@router.get("/items/{item_id}/render", response_model=ItemRenderRead)
+async def get_item_render_endpoint(
+    item_id: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    wait: Annotated[float, Query(ge=0, le=MAX_RENDER_WAIT_SECONDS)] = 0
+):
+    # wait > 0 turns this into a long poll that returns as soon as the render has finished (or failed)
     item = await get_item_by_id(db, item_id)
     if not item:
         raise HTTPException(status_code=404, detail=f"Item with id={item_id} was not found!")
+
+    deadline = asyncio.get_running_loop().time() + wait
+    while item.render_status in (RENDER_STATUS_PENDING, RENDER_STATUS_RENDERING):
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            break
+        # ending the transaction drops its snapshot (REPEATABLE READ would never show the worker's update)
+        # and gives the connection back to the pool while waiting
+        await db.rollback()
+        await asyncio.sleep(min(remaining, RENDER_JOB_POLL_SECONDS / 4))
+        await db.refresh(item)
     return item
 
 
-@router.patch("/items/{item_id}", response_model=ItemRead)
+async def _artifact_response(
+    request: Request,
+    key: str,
+    filename: str,
+    media_type: str,
+    not_found_detail: str,
+    disposition: str = "attachment"
+) -> Response:
+    storage = get_storage()
+    full_path = storage.local_path(key)
+
+    if full_path is None:
+        if STORAGE_REDIRECT_DOWNLOADS:
+            # the object store serves the bytes (including Range requests) itself, the url expires after a few minutes
+            url = storage.presigned_url(key, filename, disposition)
+            if url is not None:
+                return RedirectResponse(url, status_code=307, headers={"Cache-Control": "private, no-store"})
+
+        info = await asyncio.to_thread(storage.stat, key)
+        if info is None:
+            raise HTTPException(status_code=404, detail=not_found_detail)
+        headers = cache_headers(info.etag, info.last_modified)
+        if is_not_modified(request, info.etag, info.last_modified):
+            return Response(status_code=304, headers=headers)
+        headers["Content-Length"] = str(info.size)
+        headers["Content-Disposition"] = f'{disposition}; filename="{filename}"'
+        return StreamingResponse(storage.iter_bytes(key), media_type=media_type, headers=headers)
+
+    try:
+        stat_result = os.stat(full_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=not_found_detail)
+
+    etag = file_etag(stat_result, full_path.name)
+    headers = cache_headers(etag, stat_result.st_mtime)
+    if is_not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    # FileResponse streams the file in chunks (or hands it to the server via pathsend) and answers Range requests
+    return FileResponse(
+        full_path,
+        media_type=media_type,
+        filename=filename,
+        stat_result=stat_result,
+        headers=headers,
+        content_disposition_type=disposition,
+    )
+
+
+@router.get("/items/{item_id}/pdf", response_class=FileResponse)
+async def download_item_pdf_endpoint(
+    item_id: int,
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    item = await get_item_by_id(db, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail=f"Item with id={item_id} was not found!")
+    if not item.pdf_path:
+        raise HTTPException(status_code=404, detail=f"PDF of item with id={item_id} is not available (render status: {item.render_status})")
+
+    return await _artifact_response(
+        request,
+        item.pdf_path,
+        filename=f"item_{item_id}.pdf",
+        media_type="application/pdf",
+        not_found_detail=f"PDF of item with id={item_id} was not found!",
+    )
+
+
+@router.get("/items/{item_id}/preview", response_class=FileResponse)
+async def download_item_preview_endpoint(
+    item_id: int,
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    width: Annotated[Optional[int], Query(gt=0)] = None,
+    format: Annotated[Optional[str], Query()] = None
+):
+    # returns the smallest configured preview that is at least `width` wide (or the largest one),
+    # in the first configured format unless `format` asks for another one
+    if format is None and PREVIEW_SPECS:
+        format = PREVIEW_SPECS[0].format
+    specs = [spec for spec in PREVIEW_SPECS if spec.format == format]
+    if not specs:
+        available = sorted({spec.format for spec in PREVIEW_SPECS})
+        raise HTTPException(status_code=404, detail=f"No previews in format '{format}' are configured, available: {available}")
+    specs.sort(key=lambda spec: spec.width)
+    spec = next((spec for spec in specs if width is not None and spec.width >= width), specs[-1])
+
+    item = await get_item_by_id(db, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail=f"Item with id={item_id} was not found!")
+    if not item.pdf_path:
+        raise HTTPException(status_code=404, detail=f"Preview of item with id={item_id} is not available (render status: {item.render_status})")
+
+    return await _artifact_response(
+        request,
+        preview_key(item.pdf_path, spec),
+        filename=f"item_{item_id}_{spec.width}w.{spec.format}",
+        media_type=PREVIEW_MEDIA_TYPES[spec.format],
+        not_found_detail=f"Preview of item with id={item_id} was not found, it may need a re-render (manage.py rerender-stale)",
+        disposition="inline",
+    )
+
+
+@router.patch("/items/{item_id}", response_model=ItemReadExpanded, response_model_exclude_unset=True)
 async def update_item_endpoint(
     item_id: int,
     data: ItemUpdate,
+    query: Annotated[ItemExpandQuery, Query()],
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)]
 ):
@@ -73,17 +301,23 @@ async def update_item_endpoint(
         raise HTTPException(status_code=404, detail=f"Item with id={item_id} was not found!")
 
     if data.material_id is not None:
-        material = await get_material_by_id(db, data.material_id)
-        if not material:
+        if not await material_exists(db, data.material_id):
             raise HTTPException(status_code=404, detail=f"Material with id={data.material_id} was not found! Warning: materials have been manually modified/changed!")
 
     if data.product_type_id is not None:
-        pt = await get_product_type_by_id(db, data.product_type_id)
-        if not pt:
+        if not await product_type_exists(db, data.product_type_id):
             raise HTTPException(status_code=404, detail=f"Product type with id={data.product_type_id} was not found! Warning: product types have been manually modified/changed!")
 
+    if data.source_image_id is not None and not await get_source_image_by_id(db, data.source_image_id):
+        raise HTTPException(status_code=404, detail=f"Source image with id={data.source_image_id} was not found!")
+
     item = await update_item(db, item, data)
-    return item
+    if item.render_status == RENDER_STATUS_PENDING:
+        notify_render_jobs()
+    if query.expand:
+        # the relations are loaded after the update, a changed material or product type is the new one
+        item = await get_item_by_id(db, item.id, query.expand)
+    return _expanded_item(item, query.expand)
 
 
 @router.delete("/items/{item_id}")
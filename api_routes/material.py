@@ -1,8 +1,9 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database_core import get_db
 from models.db_models.db_user_models import User
+from models.api_models.api_pagination_models import Page, PageQuery, SearchQuery
 from models.api_models.api_catalog_models import (
     MaterialCreate,
     MaterialRead,
@@ -11,11 +12,15 @@ from models.api_models.api_catalog_models import (
 from core.crud.crud_catalog import (
     create_material,
     list_materials,
+    search_materials,
+    list_cached_materials,
     get_material_by_id,
     update_material,
     delete_material
 )
 from core.auth_core import get_current_user
+from core.http_cache_core import cache_headers, is_not_modified, query_etag
+from core.reference_cache_core import REFERENCE_CACHE_ENABLED
 
 router = APIRouter(tags=["Materials"])
 
@@ -30,12 +35,37 @@ async def create_material_endpoint(
     return await create_material(db, data)
 
 
-@router.get("/materials", response_model=list[MaterialRead])
+@router.get("/materials", response_model=Page[MaterialRead])
 async def list_materials_endpoint(
+    request: Request,
+    response: Response,
+    query: Annotated[PageQuery, Query()],
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)]
 ):
-    return await list_materials(db)
+    if not REFERENCE_CACHE_ENABLED:
+        materials, next_cursor = await list_materials(db, query)
+        return {"items": materials, "next_cursor": next_cursor}
+
+    # served from the in-memory copy of the table, unchanged pages are answered with 304
+    materials, next_cursor, table_etag = await list_cached_materials(db, query)
+    etag = query_etag(table_etag, request.url.query)
+    headers = cache_headers(etag)
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return {"items": materials, "next_cursor": next_cursor}
+
+
+@router.get("/materials/search", response_model=Page[MaterialRead])
+async def search_materials_endpoint(
+    query: Annotated[SearchQuery, Query()],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    # declared before /materials/{id}, which would otherwise take "search" as an id
+    materials, next_cursor = await search_materials(db, query)
+    return {"items": materials, "next_cursor": next_cursor}
 
 
 @router.get("/materials/{material_id}", response_model=MaterialRead)
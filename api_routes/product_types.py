@@ -1,8 +1,9 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database_core import get_db
 from models.db_models.db_user_models import User
+from models.api_models.api_pagination_models import Page, PageQuery, SearchQuery
 from models.api_models.api_catalog_models import (
     ProductTypeCreate,
     ProductTypeRead,
@@ -11,10 +12,14 @@ from models.api_models.api_catalog_models import (
 from core.crud.crud_catalog import (
     create_product_type,
     list_product_types,
+    search_product_types,
+    list_cached_product_types,
     get_product_type_by_id,
     update_product_type,
     delete_product_type)
 from core.auth_core import get_current_user
+from core.http_cache_core import cache_headers, is_not_modified, query_etag
+from core.reference_cache_core import REFERENCE_CACHE_ENABLED
 
 router = APIRouter(tags=["Product Types"])
 
@@ -29,12 +34,37 @@ async def create_product_type_endpoint(
     return await create_product_type(db, data)
 
 
-@router.get("/product-types", response_model=list[ProductTypeRead])
+@router.get("/product-types", response_model=Page[ProductTypeRead])
 async def list_product_types_endpoint(
+    request: Request,
+    response: Response,
+    query: Annotated[PageQuery, Query()],
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)]
 ):
-    return await list_product_types(db)
+    if not REFERENCE_CACHE_ENABLED:
+        product_types, next_cursor = await list_product_types(db, query)
+        return {"items": product_types, "next_cursor": next_cursor}
+
+    # served from the in-memory copy of the table, unchanged pages are answered with 304
+    product_types, next_cursor, table_etag = await list_cached_product_types(db, query)
+    etag = query_etag(table_etag, request.url.query)
+    headers = cache_headers(etag)
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return {"items": product_types, "next_cursor": next_cursor}
+
+
+@router.get("/product-types/search", response_model=Page[ProductTypeRead])
+async def search_product_types_endpoint(
+    query: Annotated[SearchQuery, Query()],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    # declared before /product-types/{id}, which would otherwise take "search" as an id
+    product_types, next_cursor = await search_product_types(db, query)
+    return {"items": product_types, "next_cursor": next_cursor}
 
 
 @router.get("/product-types/{product_type_id}", response_model=ProductTypeRead)
@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+import tempfile
+from pathlib import Path
+from typing import Annotated
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database_core import get_db
+from models.db_models.db_user_models import User
+from models.api_models.api_pagination_models import Page, PageQuery
+from models.api_models.api_catalog_models import SourceImageRead
+from core.crud.crud_catalog import (
+    create_source_image,
+    list_source_images,
+    get_source_image_by_id,
+    get_source_image_by_hash,
+    count_items_with_source_image,
+    delete_source_image
+)
+from core.auth_core import get_current_user
+from core.render_core import run_render
+from core.source_image_core import save_upload, new_tiles_prefix
+from core.image_core import build_source_image
+
+router = APIRouter(tags=["Source Images"])
+
+
+
+@router.post("/source-images", response_model=SourceImageRead)
+async def create_source_image_endpoint(
+    name: Annotated[str, Form(max_length=100)],
+    file: Annotated[UploadFile, File()],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    # the upload only has to outlive the pyramid build on this machine, the tiles go to the artifact storage
+    upload_path = Path(tempfile.gettempdir()) / f"source-upload-{uuid.uuid4().hex}"
+    try:
+        content_hash = await asyncio.to_thread(save_upload, file.file, upload_path)
+        existing = await get_source_image_by_hash(db, content_hash)
+        if existing:
+            raise HTTPException(status_code=409, detail=f"This image is already registered as source image with id={existing.id}")
+
+        # building the pyramid decodes the whole image once, so it runs on the render pool like any other render;
+        # every upload writes its own tiles, concurrent uploads of the same image never share them
+        pyramid = await run_render(build_source_image, upload_path, new_tiles_prefix(), content_hash)
+        try:
+            return await create_source_image(db, name, pyramid)
+        except IntegrityError:
+            raise HTTPException(status_code=409, detail="This image is already registered as source image")
+    finally:
+        upload_path.unlink(missing_ok=True)
+
+
+@router.get("/source-images", response_model=Page[SourceImageRead])
+async def list_source_images_endpoint(
+    query: Annotated[PageQuery, Query()],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    source_images, next_cursor = await list_source_images(db, query)
+    return {"items": source_images, "next_cursor": next_cursor}
+
+
+@router.get("/source-images/{source_image_id}", response_model=SourceImageRead)
+async def get_source_image_endpoint(
+    source_image_id: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    source_image = await get_source_image_by_id(db, source_image_id)
+    if not source_image:
+        raise HTTPException(status_code=404, detail=f"Source image with id={source_image_id} was not found!")
+    return source_image
+
+
+@router.delete("/source-images/{source_image_id}")
+async def delete_source_image_endpoint(
+    source_image_id: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    source_image = await get_source_image_by_id(db, source_image_id)
+    if not source_image:
+        raise HTTPException(status_code=404, detail=f"Source image with id={source_image_id} was not found!")
+    if await count_items_with_source_image(db, source_image_id) > 0:
+        raise HTTPException(status_code=409, detail=f"Source image with id={source_image_id} is still used by items")
+
+    await delete_source_image(db, source_image)
+    return {"detail": f"Source image with id={source_image_id} was successfully deleted"}
@@ -1,9 +1,10 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database_core import get_db
 from models.db_models.db_user_models import User
-from models.api_models.api_user_models import UserCreate, UserRead, UserUpdate
+from models.api_models.api_user_models import UserCreate, UserRead, UserUpdate, UserListQuery
+from models.api_models.api_pagination_models import Page
 from core.crud.crud_users import (
     create_user,
     get_user_by_email,
@@ -12,7 +13,7 @@ from core.crud.crud_users import (
     update_user,
     delete_user,
 )
-from core.auth_core import hash_password, get_current_user
+from core.auth_core import hash_password_async, get_current_user
 
 router = APIRouter(prefix="/users", tags=["User Operations"])
 
@@ -26,17 +27,19 @@ async def create_user_endpoint(
     if existing:
         raise HTTPException(status_code=400, detail="Email already in use")
 
-    hashed = hash_password(data.password)
+    hashed = await hash_password_async(data.password)
     user = await create_user(db, data, hashed)
     return user
 
 
-@router.get("", response_model=list[UserRead])
+@router.get("", response_model=Page[UserRead])
 async def list_users_endpoint(
+    query: Annotated[UserListQuery, Query()],
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)]
 ):
-    return await list_users(db)
+    users, next_cursor = await list_users(db, query)
+    return {"items": users, "next_cursor": next_cursor}
 
 
 @router.get("/{user_id}", response_model=UserRead)
@@ -63,7 +66,7 @@ async def update_user_endpoint(
         raise HTTPException(status_code=404, detail="User not found")
 
     if data.password is not None:
-        data.password = hash_password(data.password)
+        data.password = await hash_password_async(data.password)
 
     user = await update_user(db, user, data)
     return user
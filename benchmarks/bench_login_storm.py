@@ -0,0 +1,102 @@
+"""
+Login storm benchmark: compares verifying passwords on the event loop (before) with
+verify_password_async (after).
+
+For each mode it fires --logins concurrent verifications while a "non-auth endpoint"
+coroutine keeps doing tiny await-bound requests, and reports login throughput and
+the latency that coroutine observes.
+
+Usage:
+    python benchmarks/bench_login_storm.py --logins 40 --rounds 12 --output login_storm.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def non_auth_requests(stop: asyncio.Event, latencies: list[float]) -> None:
+    # stands in for a cheap endpoint, e.g. GET /items/{id}, that mostly waits on the database
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_storm(mode: str, logins: int, hashed: str) -> dict:
+    from core.auth_core import verify_password, verify_password_async
+
+    async def login_sync() -> bool:
+        return verify_password("benchmark-password", hashed)
+
+    async def login_async() -> bool:
+        return await verify_password_async("benchmark-password", hashed)
+
+    login = login_sync if mode == "sync" else login_async
+    stop = asyncio.Event()
+    latencies: list[float] = []
+    background = asyncio.create_task(non_auth_requests(stop, latencies))
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await background
+    assert all(results)
+    return {
+        "mode": mode,
+        "logins": logins,
+        "elapsed_seconds": round(elapsed, 4),
+        "logins_per_second": round(logins / elapsed, 2),
+        "non_auth_requests": len(latencies),
+        "non_auth_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "non_auth_p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "non_auth_max_ms": round(max(latencies) * 1000, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor (BCRYPT_ROUNDS)")
+    parser.add_argument("--workers", type=int, default=None, help="PASSWORD_HASH_MAX_WORKERS")
+    parser.add_argument("--output", type=Path, default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    if args.workers is not None:
+        os.environ["PASSWORD_HASH_MAX_WORKERS"] = str(args.workers)
+    from core.auth_core import hash_password, shutdown_password_executor, PASSWORD_HASH_MAX_WORKERS
+
+    hashed = hash_password("benchmark-password")
+    results = {
+        "bcrypt_rounds": args.rounds,
+        "password_hash_max_workers": PASSWORD_HASH_MAX_WORKERS,
+        "runs": [asyncio.run(run_storm(mode, args.logins, hashed)) for mode in ("sync", "async")],
+    }
+    shutdown_password_executor()
+
+    print(json.dumps(results, indent=2))
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
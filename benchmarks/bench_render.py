@@ -0,0 +1,239 @@
+"""
+Render benchmark: latency, throughput and peak RSS of generate_item_pdf().
+
+Sweeps crop sizes from tiny to the full source image, with and without preview
+derivatives, with a cold (decoded per render) and a warm (cached) source image,
+and measures render throughput at 1..N concurrent renders on the render pool.
+Every scenario runs in its own subprocess, so the reported peak RSS belongs to
+that scenario alone. Renders are written to a temporary storage directory.
+
+Usage:
+    python benchmarks/bench_render.py --iterations 5 --concurrency 1,2,4 --output render.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import subprocess
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+SIZES = {
+    "tiny": (16, 16),
+    "small": (320, 200),
+    "medium": (800, 400),
+    "full": None,  # the whole source image
+}
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    return {
+        "renders": len(latencies),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+    }
+
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1),
+        "peak_rss_children_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor, 1),
+    }
+
+
+def source_size() -> tuple[int, int]:
+    from core.image_core import get_source_image
+    return get_source_image().size
+
+
+def run_latency_scenario(size: str, previews: bool, cache: str, iterations: int) -> dict:
+    import core.image_core as image_core
+    from core.image_core import generate_item_pdf, remove_item_pdf
+
+    width, height = SIZES[size] or source_size()
+    if not previews:
+        image_core.PREVIEW_SPECS = []
+    # one untimed render pays the one-off costs of the process (imports, codecs, fonts) and primes the source cache
+    remove_item_pdf(generate_item_pdf(width, height, 0))
+
+    latencies = []
+    for iteration in range(iterations):
+        if cache == "cold":
+            # forces the source image to be read and decoded again, like the first render of a process
+            image_core._source_image = None
+            image_core._source_key = None
+        start = time.perf_counter()
+        pdf_path = generate_item_pdf(width, height, -1 - iteration)
+        latencies.append(time.perf_counter() - start)
+        # the next iteration must render again instead of reusing the shared PDF
+        remove_item_pdf(pdf_path)
+
+    return {
+        "scenario": "latency",
+        "size": size,
+        "width": width,
+        "height": height,
+        "previews": previews,
+        "cache": cache,
+        **latency_summary(latencies),
+        **peak_rss_mb(),
+    }
+
+
+def run_concurrency_scenario(concurrency: int, size: str, iterations: int, executor: str) -> dict:
+    import asyncio
+    import core.render_core as render_core
+    from core.image_core import generate_item_pdf, remove_item_pdf
+
+    width, height = SIZES[size] or source_size()
+    render_core.RENDER_EXECUTOR = executor
+    render_core.RENDER_MAX_WORKERS = concurrency
+    render_core.RENDER_MAX_QUEUE = concurrency * iterations
+
+    async def scenario() -> tuple[float, list[str]]:
+        # warm up the workers (and their source image cache) before measuring
+        warmup = await asyncio.gather(*(
+            render_core.run_render(generate_item_pdf, width - job, height, -1000 - job) for job in range(concurrency)
+        ))
+        for pdf_path in warmup:
+            remove_item_pdf(pdf_path)
+
+        start = time.perf_counter()
+        # every job renders another width, so no render is answered from an existing PDF
+        pdf_paths = await asyncio.gather(*(
+            render_core.run_render(generate_item_pdf, width - job, height, -1 - job)
+            for job in range(concurrency * iterations)
+        ))
+        return time.perf_counter() - start, pdf_paths
+
+    try:
+        elapsed, pdf_paths = asyncio.run(scenario())
+    finally:
+        render_core.shutdown_render_executor()
+    for pdf_path in pdf_paths:
+        remove_item_pdf(pdf_path)
+
+    return {
+        "scenario": "concurrency",
+        "executor": executor,
+        "concurrency": concurrency,
+        "size": size,
+        "width": width,
+        "height": height,
+        "renders": len(pdf_paths),
+        "elapsed_seconds": round(elapsed, 4),
+        "renders_per_second": round(len(pdf_paths) / elapsed, 2),
+        **peak_rss_mb(),
+    }
+
+
+def run_child(spec: dict) -> dict:
+    if spec["scenario"] == "latency":
+        return run_latency_scenario(spec["size"], spec["previews"], spec["cache"], spec["iterations"])
+    return run_concurrency_scenario(spec["concurrency"], spec["size"], spec["iterations"], spec["executor"])
+
+
+def run_in_subprocess(spec: dict, storage_dir: str) -> dict:
+    env = {**os.environ, "STORAGE_BACKEND": "local", "STORAGE_LOCAL_DIR": storage_dir}
+    completed = subprocess.run(
+        [sys.executable, __file__, "--child", json.dumps(spec)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_commit() -> str | None:
+    try:
+        completed = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5, help="renders per latency scenario and per worker")
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"comma separated subset of {', '.join(SIZES)}")
+    parser.add_argument("--concurrency", default=None, help="comma separated worker counts, default 1,2,4,... up to the cpu count")
+    parser.add_argument("--concurrency-size", default="medium", choices=list(SIZES))
+    parser.add_argument("--executor", default="thread", choices=["thread", "process"])
+    parser.add_argument("--output", type=Path, default=None, help="write the results as JSON to this file")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_child(json.loads(args.child))))
+        return
+
+    if args.concurrency is None:
+        cpu_count = os.cpu_count() or 1
+        levels = [1]
+        while levels[-1] * 2 <= cpu_count:
+            levels.append(levels[-1] * 2)
+    else:
+        levels = [int(level) for level in args.concurrency.split(",")]
+    sizes = [size.strip() for size in args.sizes.split(",")]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {unknown}")
+
+    import PIL
+    from core.image_core import PREVIEW_DERIVATIVES
+
+    specs = [
+        {"scenario": "latency", "size": size, "previews": previews, "cache": cache, "iterations": args.iterations}
+        for size in sizes
+        for previews in (False, True)
+        for cache in ("cold", "warm")
+    ]
+    specs += [
+        {"scenario": "concurrency", "concurrency": level, "size": args.concurrency_size,
+         "iterations": args.iterations, "executor": args.executor}
+        for level in levels
+    ]
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="bench_render_") as storage_dir:
+        for spec in specs:
+            result = run_in_subprocess(spec, storage_dir)
+            print(json.dumps(result), file=sys.stderr)
+            runs.append(result)
+
+    results = {
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "cpu_count": os.cpu_count(),
+        "preview_derivatives": PREVIEW_DERIVATIVES,
+        "iterations": args.iterations,
+        "runs": runs,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
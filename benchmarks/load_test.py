@@ -0,0 +1,224 @@
+"""
+End-to-end load test of the whole FastAPI app (main.app), without a network or a MySQL server.
+
+Requests go through httpx's ASGI transport into the real app, including its lifespan, against
+a throwaway SQLite database (or any DATABASE_URL given with --database-url, e.g. a local MySQL).
+--users virtual users each run --iterations rounds of the scenario:
+
+    login -> authenticated reads -> item creation (with render) -> list endpoints -> logout
+
+Per route it reports requests, errors, requests per second and p50/p95/p99 latency. Latency
+budgets come from --budgets (JSON, default benchmarks/load_budgets.json) and --budget; the exit
+code is 1 when a budget is exceeded or a request failed, so it can gate a CI job.
+
+Usage:
+    python benchmarks/load_test.py --users 10 --iterations 5 --output load_test.json
+    python benchmarks/load_test.py --budget "GET /items:p95=50" --budget "*:p99=2000"
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+import itertools
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+DEFAULT_BUDGETS = Path(__file__).resolve().parent / "load_budgets.json"
+PASSWORD = "load-test-password"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class RouteStats:
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, list[str]] = {}
+
+    async def request(self, client, route: str, method: str, url: str, expected: int = 200, **kwargs):
+        # route is the label the results are grouped by, e.g. "GET /items/{item_id}"
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies.setdefault(route, []).append(time.perf_counter() - start)
+        if response.status_code != expected:
+            self.errors.setdefault(route, []).append(f"{response.status_code}: {response.text[:200]}")
+        return response
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {}
+        for route, latencies in sorted(self.latencies.items()):
+            routes[route] = {
+                "requests": len(latencies),
+                "errors": len(self.errors.get(route, [])),
+                "rps": round(len(latencies) / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+                "max_ms": round(max(latencies) * 1000, 3),
+            }
+        return routes
+
+
+async def virtual_user(client, stats: RouteStats, email: str, iterations: int, catalog: dict, sizes) -> None:
+    for _ in range(iterations):
+        response = await stats.request(client, "POST /login", "POST", "/login",
+                                       data={"username": email, "password": PASSWORD})
+        if response.status_code != 200:
+            continue
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        await stats.request(client, "GET /users/{user_id}", "GET", f"/users/{catalog['user_ids'][email]}", headers=headers)
+        await stats.request(client, "GET /materials/{material_id}", "GET", f"/materials/{catalog['material_id']}", headers=headers)
+
+        # every item gets its own width, so each creation really renders a PDF instead of reusing one
+        width = next(sizes)
+        response = await stats.request(client, "POST /items", "POST", "/items", headers=headers, json={
+            "material_id": catalog["material_id"],
+            "product_type_id": catalog["product_type_id"],
+            "width": width,
+            "height": 150,
+        })
+        if response.status_code == 200:
+            item_id = response.json()["id"]
+            await stats.request(client, "GET /items/{item_id}", "GET", f"/items/{item_id}", headers=headers)
+
+        await stats.request(client, "GET /items", "GET", "/items", headers=headers, params={"limit": 20})
+        await stats.request(client, "GET /items?material_id", "GET", "/items", headers=headers,
+                            params={"material_id": catalog["material_id"], "min_width": 200, "limit": 20})
+        await stats.request(client, "GET /materials", "GET", "/materials", headers=headers)
+        await stats.request(client, "GET /product-types", "GET", "/product-types", headers=headers)
+        await stats.request(client, "GET /token-sessions", "GET", "/token-sessions", headers=headers)
+
+        await stats.request(client, "POST /logout", "POST", "/logout", headers=headers)
+
+
+async def run_load_test(users: int, iterations: int) -> dict:
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+            setup = RouteStats()
+            emails = [f"load-user-{index}@example.com" for index in range(users)]
+            user_ids = {}
+            for email in emails:
+                response = await setup.request(client, "POST /users", "POST", "/users",
+                                               json={"email": email, "password": PASSWORD})
+                user_ids[email] = response.json()["id"]
+
+            response = await setup.request(client, "POST /login", "POST", "/login",
+                                           data={"username": emails[0], "password": PASSWORD})
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            material = await setup.request(client, "POST /materials", "POST", "/materials",
+                                           json={"name": "Load test material"}, headers=headers)
+            product_type = await setup.request(client, "POST /product-types", "POST", "/product-types",
+                                               json={"name": "Load test product type"}, headers=headers)
+            if setup.errors:
+                raise RuntimeError(f"Load test setup failed: {setup.errors}")
+            catalog = {
+                "user_ids": user_ids,
+                "material_id": material.json()["id"],
+                "product_type_id": product_type.json()["id"],
+            }
+
+            stats = RouteStats()
+            sizes = itertools.cycle(range(200, 1600))
+            start = time.perf_counter()
+            await asyncio.gather(*(virtual_user(client, stats, email, iterations, catalog, sizes) for email in emails))
+            elapsed = time.perf_counter() - start
+
+    total = sum(len(latencies) for latencies in stats.latencies.values())
+    return {
+        "users": users,
+        "iterations": iterations,
+        "elapsed_seconds": round(elapsed, 4),
+        "requests": total,
+        "rps": round(total / elapsed, 2),
+        "routes": stats.summary(elapsed),
+        "errors": {route: errors[:5] for route, errors in stats.errors.items()},
+    }
+
+
+def parse_budget(value: str) -> tuple[str, str, float]:
+    # "GET /items:p95=50" -> ("GET /items", "p95_ms", 50.0); "*" applies to every route
+    try:
+        route, limit = value.rsplit(":", 1)
+        metric, milliseconds = limit.split("=")
+        if metric not in ("p50", "p95", "p99", "max"):
+            raise ValueError
+        return route, f"{metric}_ms", float(milliseconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid budget '{value}', expected ROUTE:p50|p95|p99|max=MILLISECONDS")
+
+
+def load_budgets(path: Path | None) -> list[tuple[str, str, float]]:
+    # {"GET /items": {"p95": 50}, "*": {"p99": 2000}}
+    if path is None:
+        return []
+    budgets = json.loads(path.read_text())
+    return [parse_budget(f"{route}:{metric}={limit}") for route, limits in budgets.items() for metric, limit in limits.items()]
+
+
+def check_budgets(routes: dict, budgets: list[tuple[str, str, float]]) -> list[str]:
+    violations = []
+    for route_pattern, metric, limit in budgets:
+        for route, result in routes.items():
+            if route_pattern in ("*", route) and result[metric] > limit:
+                violations.append(f"{route}: {metric}={result[metric]} exceeds the budget of {limit}")
+    return violations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=5, help="scenario rounds per virtual user")
+    parser.add_argument("--database-url", default=None, help="default: a temporary SQLite database")
+    parser.add_argument("--rounds", type=int, default=4, help="bcrypt cost factor (BCRYPT_ROUNDS)")
+    parser.add_argument("--budgets", type=Path, default=DEFAULT_BUDGETS, help="JSON file with latency budgets per route")
+    parser.add_argument("--no-budgets", action="store_true", help="ignore the --budgets file")
+    parser.add_argument("--budget", type=parse_budget, action="append", default=[], help="ROUTE:p95=MILLISECONDS, repeatable")
+    parser.add_argument("--output", type=Path, default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    budgets = ([] if args.no_budgets else load_budgets(args.budgets)) + args.budget
+
+    with tempfile.TemporaryDirectory(prefix="load_test_") as tmp_dir:
+        # the app reads its settings at import time, so they are set before main is imported
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{tmp_dir}/load_test.db"
+        os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+        os.environ["AUTO_MIGRATE"] = "1"
+        os.environ.setdefault("STORAGE_BACKEND", "local")
+        os.environ["STORAGE_LOCAL_DIR"] = str(Path(tmp_dir) / "storage")
+        # the app logs with print(), keep stdout for the JSON results
+        with contextlib.redirect_stdout(sys.stderr):
+            results = asyncio.run(run_load_test(args.users, args.iterations))
+
+    results["budget_violations"] = check_budgets(results["routes"], budgets)
+    print(json.dumps(results, indent=2))
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    for violation in results["budget_violations"]:
+        print(f"BUDGET EXCEEDED {violation}", file=sys.stderr)
+    for route, errors in results["errors"].items():
+        print(f"FAILED REQUESTS {route}: {errors}", file=sys.stderr)
+    if results["budget_violations"] or results["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+from datetime import datetime, timezone
+from typing import Optional
+from core.cache_core import get_cache_backend
+from models.db_models.db_user_models import User
+
+AUTH_CACHE_ENABLED = os.getenv("AUTH_CACHE_ENABLED", "1") == "1"
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+
+
+def _session_key(jti: str) -> str:
+    return f"auth:session:{jti}"
+
+
+def _user_key(user_id: int) -> str:
+    return f"auth:user:{user_id}"
+
+
+def _remaining_seconds(expires_at: datetime) -> float:
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return (expires_at - datetime.now(timezone.utc)).total_seconds()
+
+
+def _ttl(expires_at: datetime) -> float:
+    # nothing may outlive the token it was cached for
+    return min(AUTH_CACHE_TTL_SECONDS, _remaining_seconds(expires_at))
+
+
+async def get_cached_session(jti: str) -> Optional[dict]:
+    if not AUTH_CACHE_ENABLED:
+        return None
+    return await get_cache_backend().get(_session_key(jti))
+
+
+async def cache_session(jti: str, user_id: int, is_revoked: bool, expires_at: datetime) -> None:
+    # only adds: a session read from the database before it was revoked must not replace the tombstone
+    # invalidate_session left meanwhile
+    ttl = _ttl(expires_at)
+    if not AUTH_CACHE_ENABLED or ttl <= 0:
+        return
+    await get_cache_backend().add(_session_key(jti), {"user_id": user_id, "is_revoked": is_revoked}, ttl)
+
+
+async def get_cached_user(user_id: int) -> Optional[User]:
+    # the returned user is a detached snapshot without password hash, it is only meant to identify the caller
+    if not AUTH_CACHE_ENABLED:
+        return None
+    snapshot = await get_cache_backend().get(_user_key(user_id))
+    if snapshot is None:
+        return None
+    return User(
+        id=snapshot["id"],
+        email=snapshot["email"],
+        is_active=snapshot["is_active"],
+        created_at=datetime.fromisoformat(snapshot["created_at"]) if snapshot["created_at"] else None,
+    )
+
+
+async def cache_user(user: User, expires_at: datetime) -> None:
+    ttl = _ttl(expires_at)
+    if not AUTH_CACHE_ENABLED or ttl <= 0:
+        return
+    snapshot = {
+        "id": user.id,
+        "email": user.email,
+        "is_active": user.is_active,
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+    }
+    await get_cache_backend().set(_user_key(user.id), snapshot, ttl)
+
+
+async def invalidate_session(jti: str, expires_at: datetime) -> None:
+    # sessions are only ever revoked or deleted, so the entry becomes a revoked tombstone for the rest of the
+    # token's lifetime instead of disappearing
+    remaining = _remaining_seconds(expires_at)
+    if remaining <= 0:
+        await get_cache_backend().delete(_session_key(jti))
+        return
+    await get_cache_backend().set(_session_key(jti), {"user_id": None, "is_revoked": True}, remaining)
+
+
+async def invalidate_user(user_id: int) -> None:
+    await get_cache_backend().delete(_user_key(user_id))
@@ -1,4 +1,7 @@
 import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Annotated
 from fastapi import Depends, HTTPException, status
@@ -15,15 +18,40 @@ from core.crud.crud_users import (
     get_user_by_id
 )
 from core.crud.crud_tokens import get_token_session_by_jti
+from core.auth_cache_core import (
+    get_cached_session,
+    cache_session,
+    get_cached_user,
+    cache_user
+)
+from core.revocation_core import REVOCATION_INDEX_ENABLED, get_revocation_index
 
 
 SECRET_KEY = os.getenv("SECRET_KEY", "rueckwand24ROCKS!")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_MAX_WORKERS = int(os.getenv("PASSWORD_HASH_MAX_WORKERS", min(4, os.cpu_count() or 1)))
+# comma separated emails of the users allowed to use the admin endpoints
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# bcrypt releases the GIL, so a small thread pool is enough to keep it off the event loop,
+# and its size caps how many CPU cores a burst of logins can occupy
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_executor_lock = threading.Lock()
+
+
+def get_password_executor() -> ThreadPoolExecutor:
+    # created on first use, so the app can be started again after shutdown_password_executor (e.g. in tests)
+    global _password_executor
+    with _password_executor_lock:
+        if _password_executor is None:
+            _password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_MAX_WORKERS, thread_name_prefix="bcrypt")
+        return _password_executor
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -33,6 +61,24 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(get_password_executor(), hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        get_password_executor(), verify_password, plain_password, hashed_password
+    )
+
+
+def shutdown_password_executor() -> None:
+    global _password_executor
+    with _password_executor_lock:
+        if _password_executor is not None:
+            _password_executor.shutdown(wait=False, cancel_futures=True)
+            _password_executor = None
+
+
 def create_access_token(
         data: dict,
         expires_delta: Optional[timedelta] = None
@@ -58,7 +104,7 @@ async def authenticate_user(
     user = await get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
     return user
 
@@ -75,18 +121,43 @@ async def get_current_user(
 
     try:
         payload = decode_token(token)
-        user_id: str = payload.get("sub")
+        user_id = int(payload.get("sub"))
         jti: str = payload.get("jti")
-        if user_id is None or jti is None:
+        expires_at = datetime.fromtimestamp(payload.get("exp"), tz=timezone.utc)
+        if jti is None:
             raise credentials_exception
     except Exception:
         raise credentials_exception
 
-    token_session = await get_token_session_by_jti(db, jti)
-    if not token_session or token_session.is_revoked:
-        raise credentials_exception
+    revocation_index = get_revocation_index()
+    if REVOCATION_INDEX_ENABLED and revocation_index.is_fresh():
+        # every revoked or deleted session is in the index, so a token that is not needs no session lookup
+        if revocation_index.contains(jti):
+            raise credentials_exception
+    else:
+        # sessions and users are cached until they change (see auth_cache_core), so most calls skip both queries
+        session = await get_cached_session(jti)
+        if session is None:
+            token_session = await get_token_session_by_jti(db, jti)
+            if not token_session:
+                raise credentials_exception
+            session = {"user_id": token_session.user_id, "is_revoked": token_session.is_revoked}
+            await cache_session(jti, token_session.user_id, token_session.is_revoked, expires_at)
+        if session["is_revoked"] or session["user_id"] != user_id:
+            raise credentials_exception
 
-    user = await get_user_by_id(db, int(user_id))
+    user = await get_cached_user(user_id)
     if user is None:
-        raise credentials_exception
+        user = await get_user_by_id(db, user_id)
+        if user is None:
+            raise credentials_exception
+        await cache_user(user, expires_at)
     return user
+
+
+async def get_current_admin(
+    current_user: Annotated[User, Depends(get_current_user)]
+) -> User:
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+# empty = every app worker keeps its own cache, "redis://host:6379/0" = one cache shared by all workers
+CACHE_BACKEND_URL = os.getenv("CACHE_BACKEND_URL", "")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+
+
+class TTLCache:
+    # LRU cache in which every entry also expires after its own time to live
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key: str, value: Any, ttl: float) -> bool:
+        # like set, but only if the key holds no live entry yet
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return False
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CacheBackend:
+    # values must be JSON serializable, so that every backend can store them
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        # sets the key only if it does not exist, returns whether it did
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+
+class LocalCacheBackend(CacheBackend):
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.cache = TTLCache(max_entries)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self.cache.set(key, value, ttl)
+
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        return self.cache.add(key, value, ttl)
+
+    async def delete(self, *keys: str) -> None:
+        self.cache.delete(*keys)
+
+
+class RedisCacheBackend(CacheBackend):
+    # works with any client offering the redis.asyncio get/set/delete API
+
+    def __init__(self, client: Any, prefix: str = "rueckwand24:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self.client.set(self.prefix + key, json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        return bool(await self.client.set(self.prefix + key, json.dumps(value), px=max(1, int(ttl * 1000)), nx=True))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+
+def create_cache_backend(url: str) -> CacheBackend:
+    if not url:
+        return LocalCacheBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND_URL points to redis, but the 'redis' package is not installed")
+        return RedisCacheBackend(redis_asyncio.from_url(url))
+    raise ValueError(f"Unsupported CACHE_BACKEND_URL '{url}'")
+
+
+_backend: Optional[CacheBackend] = None
+
+
+def get_cache_backend() -> CacheBackend:
+    global _backend
+    if _backend is None:
+        _backend = create_cache_backend(CACHE_BACKEND_URL)
+    return _backend
+
+
+def set_cache_backend(backend: CacheBackend) -> None:
+    global _backend
+    _backend = backend
@@ -1,51 +1,291 @@
-from models.db_models.db_catalog_models import Material, ProductType, ItemConfiguration
-from models.api_models.api_catalog_models import MaterialCreate,MaterialUpdate, ProductTypeCreate,ProductTypeUpdate, ItemCreate, ItemUpdate
-from typing import Optional, Sequence
-from sqlalchemy import select
+from models.db_models.db_catalog_models import (
+    Material,
+    ProductType,
+    SourceImage,
+    ItemConfiguration,
+    ItemDeletion,
+    RENDER_STATUS_PENDING,
+    RENDER_STATUS_RENDERING,
+    RENDER_STATUS_DONE,
+)
+from models.api_models.api_catalog_models import MaterialCreate,MaterialUpdate, ProductTypeCreate,ProductTypeUpdate, ItemCreate, ItemUpdate, ItemListQuery, ItemExportQuery
+from models.api_models.api_pagination_models import PageQuery, SearchQuery
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Optional, Sequence
+from fastapi import HTTPException
+from sqlalchemy import select, update, func, or_, and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from core.image_core import generate_item_pdf
-
-
-async def create_item(db: AsyncSession, data: ItemCreate) -> ItemConfiguration:
-    item = ItemConfiguration(
+from sqlalchemy.orm import joinedload
+from core.render_core import RENDER_MODE, RENDER_MAX_WORKERS, render_item
+from core.image_core import (
+    PDF_CACHE_MAX_BYTES,
+    RenderError,
+    get_render_key,
+    is_shared_pdf,
+    item_artifact_keys,
+    list_shared_pdfs,
+    remove_item_pdf,
+)
+from core.storage_core import get_storage
+from core.source_image_core import publish_pyramid, remove_pyramid, remove_pyramid_tiles
+from core.pagination_core import paginate, paginate_rows, paginate_ranked
+from core.reference_cache_core import materials_cache, product_types_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _new_item(data: ItemCreate, render_status: str) -> ItemConfiguration:
+    return ItemConfiguration(
         material_id=data.material_id,
         product_type_id=data.product_type_id,
+        source_image_id=data.source_image_id,
+        crop_x=data.crop_x,
+        crop_y=data.crop_y,
         width=data.width,
         height=data.height,
-        pdf_path=None
+        timestamp_overlay=data.timestamp_overlay,
+        pdf_path=None,
+        render_status=render_status
     )
+
+
+def _render_input(item: ItemConfiguration) -> tuple:
+    # everything that ends up in the rendered PDF
+    return item.source_image_id, item.crop_x, item.crop_y, item.width, item.height
+
+
+async def render_configuration(item: ItemConfiguration) -> tuple[str, str]:
+    return await render_item(
+        item.width, item.height, item.id, item.timestamp_overlay, item.source_image_id, item.crop_x, item.crop_y
+    )
+
+
+async def create_item(db: AsyncSession, data: ItemCreate) -> ItemConfiguration:
+    render_in_background = RENDER_MODE == "job"
+    item = _new_item(data, RENDER_STATUS_PENDING if render_in_background else RENDER_STATUS_DONE)
     db.add(item)
 
+    if render_in_background:
+        # the render worker picks the row up from the database, so a restart never loses the job
+        await db.commit()
+        await db.refresh(item)
+        return item
+
     await db.flush()
 
     try:
-        pdf_path = generate_item_pdf(
-            cropped_width=item.width,
-            cropped_height=item.height,
-            item_id=item.id
-        )
+        item.pdf_path, item.render_key = await render_configuration(item)
     except Exception:
         await db.rollback()
         raise
 
-    item.pdf_path = pdf_path
-
     await db.commit()
     await db.refresh(item)
+    await ensure_pdfs_stored(db, [item.pdf_path])
     return item
 
 
+async def _existing_ids(db: AsyncSession, model: Any, ids: set[int]) -> set[int]:
+    result = await db.execute(select(model.id).where(model.id.in_(ids)))
+    return set(result.scalars().all())
 
-async def list_items(db: AsyncSession) -> Sequence[ItemConfiguration]:
-    result = await db.execute(select(ItemConfiguration))
-    return result.scalars().all()
+
+async def create_items_batch(
+        db: AsyncSession,
+        items_data: Sequence[ItemCreate]
+) -> list[tuple[Optional[ItemConfiguration], Optional[str]]]:
+    # one (item, error) pair per element, in request order; all created items are committed together
+    material_ids = await materials_cache.existing_ids(db, {data.material_id for data in items_data})
+    product_type_ids = await product_types_cache.existing_ids(db, {data.product_type_id for data in items_data})
+    source_image_ids = await _existing_ids(
+        db, SourceImage, {data.source_image_id for data in items_data if data.source_image_id is not None}
+    )
+
+    render_in_background = RENDER_MODE == "job"
+    results: list[tuple[Optional[ItemConfiguration], Optional[str]]] = []
+    for data in items_data:
+        if data.material_id not in material_ids:
+            results.append((None, f"Material with id={data.material_id} was not found!"))
+        elif data.product_type_id not in product_type_ids:
+            results.append((None, f"Product type with id={data.product_type_id} was not found!"))
+        elif data.source_image_id is not None and data.source_image_id not in source_image_ids:
+            results.append((None, f"Source image with id={data.source_image_id} was not found!"))
+        else:
+            item = _new_item(data, RENDER_STATUS_PENDING if render_in_background else RENDER_STATUS_DONE)
+            results.append((item, None))
+
+    items = [item for item, _ in results if item is not None]
+    if not items:
+        return results
+    db.add_all(items)
+    await db.flush()
+
+    if not render_in_background:
+        render_errors = await render_items(items)
+        for index, (item, _) in enumerate(results):
+            if item is not None and item.id in render_errors:
+                await db.delete(item)
+                results[index] = (None, render_errors[item.id])
+
+    await db.commit()
+
+    created_ids = [item.id for item, _ in results if item is not None]
+    if created_ids:
+        # reloads server side defaults (created_at) of all created rows with one query
+        await db.execute(
+            select(ItemConfiguration)
+            .where(ItemConfiguration.id.in_(created_ids))
+            .execution_options(populate_existing=True)
+        )
+        await ensure_pdfs_stored(db, [item.pdf_path for item, _ in results if item is not None])
+    return results
+
+
+async def render_items(items: Sequence[ItemConfiguration]) -> dict[int, str]:
+    # renders all items and sets their pdf_path/render_key, returns the errors by item id;
+    # items with the same geometry share one PDF, so every distinct render runs once; at most
+    # RENDER_MAX_WORKERS renders of a batch are submitted at a time, a large batch must not fill the render queue
+    renders: dict[tuple, list[ItemConfiguration]] = {}
+    for item in items:
+        key = (*_render_input(item), item.id if item.timestamp_overlay else None)
+        renders.setdefault(key, []).append(item)
+
+    semaphore = asyncio.Semaphore(RENDER_MAX_WORKERS)
+    errors: dict[int, str] = {}
+
+    async def render(group: list[ItemConfiguration]) -> None:
+        first = group[0]
+        async with semaphore:
+            try:
+                pdf_path, render_key = await render_configuration(first)
+            except HTTPException as e:
+                error = str(e.detail)
+            except Exception as e:
+                logger.exception("Rendering item %s failed", first.id)
+                error = "Rendering the PDF failed"
+            else:
+                for item in group:
+                    item.pdf_path, item.render_key = pdf_path, render_key
+                return
+        for item in group:
+            errors[item.id] = error
+
+    await asyncio.gather(*(render(group) for group in renders.values()))
+    return errors
+
+
+
+def _item_load_options(expand: Sequence[str]) -> list:
+    # both relations are many-to-one, so joining them adds columns but never rows: one statement per page,
+    # and LIMIT keeps counting items
+    options = []
+    if "material" in expand:
+        options.append(joinedload(ItemConfiguration.material))
+    if "product_type" in expand:
+        options.append(joinedload(ItemConfiguration.product_type))
+    return options
+
+
+async def list_items(
+        db: AsyncSession,
+        query: ItemListQuery
+) -> tuple[Sequence[ItemConfiguration], Optional[str]]:
+    stmt = select(ItemConfiguration).options(*_item_load_options(query.expand))
+    if query.material_id is not None:
+        stmt = stmt.where(ItemConfiguration.material_id == query.material_id)
+    if query.product_type_id is not None:
+        stmt = stmt.where(ItemConfiguration.product_type_id == query.product_type_id)
+    if query.source_image_id is not None:
+        stmt = stmt.where(ItemConfiguration.source_image_id == query.source_image_id)
+    if query.min_width is not None:
+        stmt = stmt.where(ItemConfiguration.width >= query.min_width)
+    if query.max_width is not None:
+        stmt = stmt.where(ItemConfiguration.width <= query.max_width)
+    if query.min_height is not None:
+        stmt = stmt.where(ItemConfiguration.height >= query.min_height)
+    if query.max_height is not None:
+        stmt = stmt.where(ItemConfiguration.height <= query.max_height)
+    if query.render_status is not None:
+        stmt = stmt.where(ItemConfiguration.render_status == query.render_status)
+    return await paginate(db, stmt, ItemConfiguration, query, sort=query.sort)
+
+
+def _item_export_columns(query: ItemExportQuery) -> list[Any]:
+    columns = [
+        ItemConfiguration.id,
+        ItemConfiguration.material_id,
+        ItemConfiguration.product_type_id,
+        ItemConfiguration.source_image_id,
+        ItemConfiguration.crop_x,
+        ItemConfiguration.crop_y,
+        ItemConfiguration.width,
+        ItemConfiguration.height,
+        ItemConfiguration.timestamp_overlay,
+        ItemConfiguration.pdf_path,
+        ItemConfiguration.render_status,
+        ItemConfiguration.created_at,
+        ItemConfiguration.updated_at,
+    ]
+    if query.include_names:
+        columns += [Material.name.label("material_name"), ProductType.name.label("product_type_name")]
+    return columns
+
+
+def item_export_fields(query: ItemExportQuery) -> list[str]:
+    # incremental exports carry deleted_at, it is only set on the rows of deleted items
+    fields = [column.key for column in _item_export_columns(query)]
+    return fields + ["deleted_at"] if query.updated_since is not None else fields
+
+
+async def stream_items_for_export(
+        db: AsyncSession,
+        query: ItemExportQuery,
+        batch_size: int = 1000
+) -> AsyncIterator[dict[str, Any]]:
+    # plain columns through a server side cursor: rows are fetched batch_size at a time and never become ORM objects
+    stmt = select(*_item_export_columns(query))
+    if query.include_names:
+        stmt = stmt.join(Material, ItemConfiguration.material_id == Material.id)
+        stmt = stmt.join(ProductType, ItemConfiguration.product_type_id == ProductType.id)
+
+    if query.updated_since is None:
+        result = await db.stream(stmt.order_by(ItemConfiguration.id).execution_options(yield_per=batch_size))
+        async for row in result.mappings():
+            yield dict(row)
+        return
+
+    stmt = stmt.where(ItemConfiguration.updated_at >= query.updated_since)
+    stmt = stmt.order_by(ItemConfiguration.updated_at, ItemConfiguration.id)
+    result = await db.stream(stmt.execution_options(yield_per=batch_size))
+    async for row in result.mappings():
+        yield {**row, "deleted_at": None}
+
+    # deletions come last: ids are never reused, so applying them after the changes is always safe
+    deleted_row = dict.fromkeys(item_export_fields(query))
+    stmt = (
+        select(ItemDeletion.item_id, ItemDeletion.deleted_at)
+        .where(ItemDeletion.deleted_at >= query.updated_since)
+        .order_by(ItemDeletion.deleted_at, ItemDeletion.id)
+    )
+    result = await db.stream(stmt.execution_options(yield_per=batch_size))
+    async for item_id, deleted_at in result:
+        yield {**deleted_row, "id": item_id, "deleted_at": deleted_at}
+
+
+async def get_database_time(db: AsyncSession) -> datetime:
+    result = await db.execute(select(func.now()))
+    return result.scalar_one()
 
 
 async def get_item_by_id(
         db: AsyncSession,
-        item_id: int
+        item_id: int,
+        expand: Sequence[str] = ()
 ) -> Optional[ItemConfiguration]:
-    result = await db.execute(select(ItemConfiguration).where(ItemConfiguration.id == item_id))
+    stmt = select(ItemConfiguration).options(*_item_load_options(expand)).where(ItemConfiguration.id == item_id)
+    result = await db.execute(stmt)
     return result.scalar_one_or_none()
 
 
@@ -58,13 +298,36 @@ async def update_item(
         item.material_id = data.material_id
     if data.product_type_id is not None:
         item.product_type_id = data.product_type_id
-    if data.width is not None:
-        item.width = data.width
-    if data.height is not None:
-        item.height = data.height
+
+    # only the source image and the crop rectangle end up in the PDF, any other change keeps the current render
+    old_render_input = _render_input(item)
+    if "source_image_id" in data.model_fields_set:
+        item.source_image_id = data.source_image_id
+    for field in ("crop_x", "crop_y", "width", "height"):
+        if getattr(data, field) is not None:
+            setattr(item, field, getattr(data, field))
+    old_pdf_path = item.pdf_path
+    if _render_input(item) != old_render_input:
+        if RENDER_MODE == "job":
+            # the outdated PDF must not be served anymore, the worker renders the new one
+            item.pdf_path, item.render_key = None, None
+            item.render_status, item.render_error, item.render_started_at = RENDER_STATUS_PENDING, None, None
+        else:
+            # the new PDF is written next to the old one (or atomically replaces a per-item PDF),
+            # the item only points at it once the render succeeded
+            try:
+                item.pdf_path, item.render_key = await render_configuration(item)
+            except Exception:
+                await db.rollback()
+                raise
+            item.render_status, item.render_error = RENDER_STATUS_DONE, None
 
     await db.commit()
     await db.refresh(item)
+
+    if old_pdf_path is not None and old_pdf_path != item.pdf_path:
+        await ensure_pdfs_stored(db, [item.pdf_path])
+        await release_unused_pdf(db, old_pdf_path)
     return item
 
 
@@ -72,9 +335,232 @@ async def delete_item(
         db: AsyncSession,
         item: ItemConfiguration
 ) -> None:
+    pdf_path = item.pdf_path
+    # the tombstone is committed with the deletion, so an export with updated_since can never miss it
+    db.add(ItemDeletion(item_id=item.id))
     await db.delete(item)
     await db.commit()
 
+    if pdf_path is not None:
+        await release_unused_pdf(db, pdf_path)
+
+
+async def count_items_with_pdf_path(db: AsyncSession, pdf_path: str) -> int:
+    result = await db.execute(
+        select(func.count()).select_from(ItemConfiguration).where(ItemConfiguration.pdf_path == pdf_path)
+    )
+    return result.scalar_one()
+
+
+async def _restore_referenced_pdf(db: AsyncSession, pdf_path: str) -> None:
+    # renders are deterministic, so a PDF that was removed while an item started to use it is simply made again
+    result = await db.execute(select(ItemConfiguration).where(ItemConfiguration.pdf_path == pdf_path).limit(1))
+    item = result.scalar_one_or_none()
+    if item is None:
+        return
+    try:
+        await render_configuration(item)
+    except Exception:
+        # the item now has a missing PDF, which `manage.py rerender-stale` finds and renders
+        logger.exception("Restoring %s of item %s failed", pdf_path, item.id)
+
+
+async def ensure_pdfs_stored(db: AsyncSession, pdf_paths: Sequence[Optional[str]]) -> None:
+    # called after the commit that made items point at pdf_paths: a release that counted no reference just
+    # before that commit may have removed a shared render that was reused; a removal starting later sees the reference
+    storage = get_storage()
+    for pdf_path in set(pdf_paths):
+        if pdf_path is not None and is_shared_pdf(pdf_path) and not await asyncio.to_thread(storage.exists, pdf_path):
+            await _restore_referenced_pdf(db, pdf_path)
+
+
+async def _remove_unreferenced_pdf(db: AsyncSession, pdf_path: str) -> bool:
+    # every count runs in a transaction of its own, so it sees the items other sessions committed meanwhile
+    await db.commit()
+    if await count_items_with_pdf_path(db, pdf_path) > 0:
+        return False
+    await asyncio.to_thread(remove_item_pdf, pdf_path)
+    await db.commit()
+    if await count_items_with_pdf_path(db, pdf_path) > 0:
+        # an item started to use the render between the count and the removal, and its
+        # ensure_pdfs_stored may have found the files still in place
+        await _restore_referenced_pdf(db, pdf_path)
+        return False
+    return True
+
+
+async def evict_unreferenced_pdfs(db: AsyncSession, max_bytes: int = PDF_CACHE_MAX_BYTES) -> list[str]:
+    # the cache of unused shared renders is whatever the storage holds and no item points at, so it is the same
+    # for every process and survives restarts; the oldest renders are removed until the rest fits max_bytes
+    renders = await asyncio.to_thread(list_shared_pdfs)
+
+    referenced = set()
+    pdf_paths = [render.pdf_path for render in renders]
+    for start in range(0, len(pdf_paths), 1000):
+        result = await db.execute(
+            select(ItemConfiguration.pdf_path).where(ItemConfiguration.pdf_path.in_(pdf_paths[start:start + 1000])).distinct()
+        )
+        referenced.update(result.scalars())
+
+    unreferenced = sorted((render for render in renders if render.pdf_path not in referenced), key=lambda render: render.rendered_at)
+    total_size = sum(render.size for render in unreferenced)
+    evicted = []
+    for render in unreferenced:
+        if total_size <= max_bytes:
+            break
+        if await _remove_unreferenced_pdf(db, render.pdf_path):
+            evicted.append(render.pdf_path)
+        total_size -= render.size
+    return evicted
+
+
+async def release_unused_pdf(db: AsyncSession, pdf_path: str) -> None:
+    # the item table is the reference count of a rendered PDF, files are only removed once nothing points at them;
+    # unused shared renders stay cached for reuse, the PDF cache janitor keeps them within budget
+    if not is_shared_pdf(pdf_path):
+        await _remove_unreferenced_pdf(db, pdf_path)
+
+
+async def claim_render_jobs(
+        db: AsyncSession,
+        limit: int,
+        stale_before: datetime
+) -> Sequence[ItemConfiguration]:
+    # jobs stuck in "rendering" since before stale_before belong to a worker that died and are taken over
+    claimable = or_(
+        ItemConfiguration.render_status == RENDER_STATUS_PENDING,
+        and_(
+            ItemConfiguration.render_status == RENDER_STATUS_RENDERING,
+            ItemConfiguration.render_started_at < stale_before
+        )
+    )
+    result = await db.execute(
+        select(ItemConfiguration.id).where(claimable).order_by(ItemConfiguration.id).limit(limit)
+    )
+    candidate_ids = result.scalars().all()
+
+    claimed_ids = []
+    now = datetime.now(timezone.utc)
+    for item_id in candidate_ids:
+        # the conditional update makes sure that concurrent workers never claim the same job twice
+        claim = await db.execute(
+            update(ItemConfiguration)
+            .where(ItemConfiguration.id == item_id, claimable)
+            .values(render_status=RENDER_STATUS_RENDERING, render_started_at=now, render_error=None)
+            .execution_options(synchronize_session=False)
+        )
+        if claim.rowcount == 1:
+            claimed_ids.append(item_id)
+    await db.commit()
+
+    if not claimed_ids:
+        return []
+    result = await db.execute(select(ItemConfiguration).where(ItemConfiguration.id.in_(claimed_ids)))
+    return result.scalars().all()
+
+
+async def finish_render_job(
+        db: AsyncSession,
+        item: ItemConfiguration,
+        render_status: str,
+        pdf_path: Optional[str] = None,
+        render_error: Optional[str] = None,
+        render_key: Optional[str] = None
+) -> bool:
+    # item is the claimed job; the result is dropped if the item was changed (e.g. re-rendered by a PATCH) meanwhile
+    values = {"render_status": render_status, "render_error": render_error}
+    if pdf_path is not None:
+        values["pdf_path"] = pdf_path
+        values["render_key"] = render_key
+    result = await db.execute(
+        update(ItemConfiguration)
+        .where(
+            ItemConfiguration.id == item.id,
+            ItemConfiguration.source_image_id.is_not_distinct_from(item.source_image_id),
+            ItemConfiguration.crop_x == item.crop_x,
+            ItemConfiguration.crop_y == item.crop_y,
+            ItemConfiguration.width == item.width,
+            ItemConfiguration.height == item.height,
+            ItemConfiguration.render_status == RENDER_STATUS_RENDERING
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def find_stale_render_item_ids(db: AsyncSession, batch_size: int = 1000) -> list[int]:
+    # a render is stale if it was made from another source image or geometry (or before render keys
+    # were stored), or if its PDF or one of the configured previews is missing
+    stmt = (
+        select(ItemConfiguration.id, ItemConfiguration.source_image_id, ItemConfiguration.crop_x,
+               ItemConfiguration.crop_y, ItemConfiguration.width, ItemConfiguration.height,
+               ItemConfiguration.render_key, ItemConfiguration.pdf_path)
+        .where(ItemConfiguration.render_status == RENDER_STATUS_DONE)
+        .order_by(ItemConfiguration.id)
+        .execution_options(yield_per=batch_size)
+    )
+    expected_keys: dict[tuple, Optional[str]] = {}
+    stored: dict[str, bool] = {}
+    stale_ids = []
+    result = await db.stream(stmt)
+    async for item_id, source_image_id, crop_x, crop_y, width, height, render_key, pdf_path in result:
+        render_input = (source_image_id, crop_x, crop_y, width, height)
+        if render_input not in expected_keys:
+            # reads the source image's metadata from the storage on first use
+            try:
+                expected_keys[render_input] = await asyncio.to_thread(
+                    get_render_key, width, height, source_image_id, crop_x, crop_y
+                )
+            except (FileNotFoundError, RenderError):
+                expected_keys[render_input] = None
+        if pdf_path is not None and pdf_path not in stored:
+            # shared renders are checked once, however many items use them
+            stored[pdf_path] = await asyncio.to_thread(_artifacts_stored, pdf_path)
+        if (
+            render_key is None
+            or render_key != expected_keys[render_input]
+            or pdf_path is None
+            or not stored[pdf_path]
+        ):
+            stale_ids.append(item_id)
+    return stale_ids
+
+
+def _artifacts_stored(pdf_path: str) -> bool:
+    storage = get_storage()
+    return all(storage.exists(key) for key in item_artifact_keys(pdf_path))
+
+
+async def queue_render_jobs(db: AsyncSession, item_ids: Sequence[int]) -> int:
+    # the current PDF stays available until the worker has rendered its replacement
+    result = await db.execute(
+        update(ItemConfiguration)
+        .where(ItemConfiguration.id.in_(item_ids), ItemConfiguration.render_status == RENDER_STATUS_DONE)
+        .values(render_status=RENDER_STATUS_PENDING, render_error=None, render_started_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def rerender_items(db: AsyncSession, item_ids: Sequence[int]) -> dict[int, str]:
+    # renders the items again and swaps their PDFs in one commit, returns the errors by item id;
+    # items that failed keep their previous PDF
+    result = await db.execute(select(ItemConfiguration).where(ItemConfiguration.id.in_(item_ids)))
+    items = result.scalars().all()
+    old_pdf_paths = {item.id: item.pdf_path for item in items}
+
+    errors = await render_items(items)
+    await db.commit()
+    await ensure_pdfs_stored(db, [item.pdf_path for item in items])
+
+    replaced = {old_pdf_paths[item.id] for item in items if old_pdf_paths[item.id] not in (None, item.pdf_path)}
+    for old_pdf_path in replaced:
+        await release_unused_pdf(db, old_pdf_path)
+    return errors
+
 
 
 
@@ -93,13 +579,37 @@ async def create_material(
     )
     db.add(material)
     await db.commit()
+    await materials_cache.invalidate()
     await db.refresh(material)
     return material
 
 
-async def list_materials(db: AsyncSession) -> Sequence[Material]:
-    material_list = await db.execute(select(Material))
-    return material_list.scalars().all()
+async def list_materials(
+        db: AsyncSession,
+        query: PageQuery
+) -> tuple[Sequence[Material], Optional[str]]:
+    return await paginate(db, select(Material), Material, query)
+
+
+async def list_cached_materials(
+        db: AsyncSession,
+        query: PageQuery
+) -> tuple[list[dict], Optional[str], str]:
+    # the page, its cursor and the ETag of the whole table
+    snapshot = await materials_cache.snapshot(db)
+    rows, next_cursor = paginate_rows(list(snapshot.rows.values()), query)
+    return rows, next_cursor, snapshot.etag
+
+
+async def search_materials(
+        db: AsyncSession,
+        query: SearchQuery
+) -> tuple[list[dict], Optional[str]]:
+    return paginate_ranked(await materials_cache.search(db, query.q), query)
+
+
+async def material_exists(db: AsyncSession, material_id: int) -> bool:
+    return material_id in await materials_cache.existing_ids(db, {material_id})
 
 
 async def get_material_by_id(
@@ -129,13 +639,22 @@ async def update_material(
         material.description = data.description
 
     await db.commit()
+    await materials_cache.invalidate()
     await db.refresh(material)
     return material
 
 
+async def _record_item_deletions(db: AsyncSession, *conditions) -> None:
+    # items removed along with their material or product type are reported by exports like any other deletion
+    result = await db.execute(select(ItemConfiguration.id).where(*conditions))
+    db.add_all([ItemDeletion(item_id=item_id) for item_id in result.scalars().all()])
+
+
 async def delete_material(db: AsyncSession, material: Material) -> None:
+    await _record_item_deletions(db, ItemConfiguration.material_id == material.id)
     await db.delete(material)
     await db.commit()
+    await materials_cache.invalidate()
 
 
 
@@ -151,13 +670,36 @@ async def create_product_type(
     pt = ProductType(name=data.name, description=data.description)
     db.add(pt)
     await db.commit()
+    await product_types_cache.invalidate()
     await db.refresh(pt)
     return pt
 
 
-async def list_product_types(db: AsyncSession) -> Sequence[ProductType]:
-    result = await db.execute(select(ProductType))
-    return result.scalars().all()
+async def list_product_types(
+        db: AsyncSession,
+        query: PageQuery
+) -> tuple[Sequence[ProductType], Optional[str]]:
+    return await paginate(db, select(ProductType), ProductType, query)
+
+
+async def list_cached_product_types(
+        db: AsyncSession,
+        query: PageQuery
+) -> tuple[list[dict], Optional[str], str]:
+    snapshot = await product_types_cache.snapshot(db)
+    rows, next_cursor = paginate_rows(list(snapshot.rows.values()), query)
+    return rows, next_cursor, snapshot.etag
+
+
+async def search_product_types(
+        db: AsyncSession,
+        query: SearchQuery
+) -> tuple[list[dict], Optional[str]]:
+    return paginate_ranked(await product_types_cache.search(db, query.q), query)
+
+
+async def product_type_exists(db: AsyncSession, product_type_id: int) -> bool:
+    return product_type_id in await product_types_cache.existing_ids(db, {product_type_id})
 
 
 async def get_product_type_by_id(
@@ -171,9 +713,9 @@ async def get_product_type_by_id(
 async def get_product_type_by_name(
         db: AsyncSession,
         name: str
-) -> Optional[ProductType]:
+) -> Sequence[ProductType]:
     result = await db.execute(select(ProductType).where(ProductType.name.ilike(f"%{name}%")))
-    return result.scalar_one_or_none()
+    return result.scalars().all()
 
 
 async def update_product_type(
@@ -187,6 +729,7 @@ async def update_product_type(
         pt.description = data.description
 
     await db.commit()
+    await product_types_cache.invalidate()
     await db.refresh(pt)
     return pt
 
@@ -195,5 +738,87 @@ async def delete_product_type(
         db: AsyncSession,
         pt: ProductType
 ) -> None:
+    await _record_item_deletions(db, ItemConfiguration.product_type_id == pt.id)
     await db.delete(pt)
     await db.commit()
+    await product_types_cache.invalidate()
+
+
+
+
+#############################################################################################
+################################# Source Images CRUD operations #############################
+#############################################################################################
+
+async def create_source_image(
+        db: AsyncSession,
+        name: str,
+        pyramid: dict
+) -> SourceImage:
+    # the pyramid's tiles were stored under a prefix of their own and the metadata pointing at them gets
+    # the id of the row before the commit, so renders never see a source image without tiles
+    source_image = SourceImage(
+        name=name,
+        content_hash=pyramid["content_hash"],
+        width=pyramid["width"],
+        height=pyramid["height"],
+        tile_size=pyramid["tile_size"],
+        levels=pyramid["levels"],
+    )
+    db.add(source_image)
+    source_image_id = None
+    try:
+        # a concurrent upload of the same image fails here with an IntegrityError on content_hash
+        await db.flush()
+        source_image_id = source_image.id
+        publish_pyramid(pyramid, source_image_id)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        if source_image_id is not None:
+            remove_pyramid(source_image_id)
+        remove_pyramid_tiles(pyramid)
+        raise
+    await db.refresh(source_image)
+    return source_image
+
+
+async def list_source_images(
+        db: AsyncSession,
+        query: PageQuery
+) -> tuple[Sequence[SourceImage], Optional[str]]:
+    return await paginate(db, select(SourceImage), SourceImage, query)
+
+
+async def get_source_image_by_id(
+        db: AsyncSession,
+        source_image_id: int
+) -> Optional[SourceImage]:
+    result = await db.execute(select(SourceImage).where(SourceImage.id == source_image_id))
+    return result.scalar_one_or_none()
+
+
+async def get_source_image_by_hash(
+        db: AsyncSession,
+        content_hash: str
+) -> Optional[SourceImage]:
+    result = await db.execute(select(SourceImage).where(SourceImage.content_hash == content_hash))
+    return result.scalar_one_or_none()
+
+
+async def count_items_with_source_image(db: AsyncSession, source_image_id: int) -> int:
+    result = await db.execute(
+        select(func.count()).select_from(ItemConfiguration).where(ItemConfiguration.source_image_id == source_image_id)
+    )
+    return result.scalar_one()
+
+
+async def delete_source_image(
+        db: AsyncSession,
+        source_image: SourceImage
+) -> None:
+    source_image_id = source_image.id
+    await db.delete(source_image)
+    await db.commit()
+    remove_pyramid(source_image_id)
+
@@ -1,8 +1,12 @@
-from typing import Optional, Sequence
-from sqlalchemy import select
+from datetime import datetime
+from typing import Any, Optional, Sequence
+from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
-from models.db_models.db_auth_models import TokenSession
-from models.api_models.api_auth_models import TokenSessionCreate
+from models.db_models.db_auth_models import TokenSession, RevokedToken
+from models.api_models.api_auth_models import TokenSessionCreate, TokenSessionListQuery
+from core.auth_cache_core import invalidate_session
+from core.revocation_core import record_revocation
+from core.pagination_core import paginate
 
 
 async def create_token_session(
@@ -36,8 +40,12 @@ async def revoke_token_session(
     session = await get_token_session_by_jti(db, jti)
     if not session:
         return None
-    session.is_revoked = True
+    if not session.is_revoked:
+        session.is_revoked = True
+        db.add(RevokedToken(jti=jti, expires_at=session.expires_at))
     await db.commit()
+    record_revocation(jti, session.expires_at)
+    await invalidate_session(jti, session.expires_at)
     await db.refresh(session)
     return session
 
@@ -51,18 +59,64 @@ async def get_token_session_by_id(
 
 async def list_token_sessions(
         db: AsyncSession,
+        query: TokenSessionListQuery,
         user_id: Optional[int] = None
-) -> Sequence[TokenSession]:
+) -> tuple[Sequence[TokenSession], Optional[str]]:
     stmt = select(TokenSession)
     if user_id is not None:
         stmt = stmt.where(TokenSession.user_id == user_id)
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    if query.is_revoked is not None:
+        stmt = stmt.where(TokenSession.is_revoked == query.is_revoked)
+    return await paginate(db, stmt, TokenSession, query, sort=query.sort)
 
 
 async def delete_token_session(
         db: AsyncSession,
         session: TokenSession
 ) -> None:
+    # a deleted session's token must stop working as well, so it is revoked like on logout
+    jti, expires_at = session.jti, session.expires_at
+    if not session.is_revoked:
+        db.add(RevokedToken(jti=jti, expires_at=expires_at))
     await db.delete(session)
-    await db.commit()
\ No newline at end of file
+    await db.commit()
+    record_revocation(jti, expires_at)
+    await invalidate_session(jti, expires_at)
+
+
+async def _delete_expired(
+        db: AsyncSession,
+        model: Any,
+        expired_before: datetime,
+        batch_size: int
+) -> int:
+    # deletes at most batch_size rows in one short transaction, oldest first along the expires_at index
+    result = await db.execute(
+        select(model.id)
+        .where(model.expires_at < expired_before)
+        .order_by(model.expires_at)
+        .limit(batch_size)
+    )
+    ids = result.scalars().all()
+    if not ids:
+        return 0
+    await db.execute(delete(model).where(model.id.in_(ids)))
+    await db.commit()
+    return len(ids)
+
+
+async def delete_expired_token_sessions(
+        db: AsyncSession,
+        expired_before: datetime,
+        batch_size: int
+) -> int:
+    # an expired token is rejected by its JWT signature check already, so its session row is never needed again
+    return await _delete_expired(db, TokenSession, expired_before, batch_size)
+
+
+async def delete_expired_revoked_tokens(
+        db: AsyncSession,
+        expired_before: datetime,
+        batch_size: int
+) -> int:
+    return await _delete_expired(db, RevokedToken, expired_before, batch_size)
@@ -1,9 +1,14 @@
+from datetime import datetime, timezone
 from typing import Optional, Sequence
 from pydantic import EmailStr
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from models.db_models.db_user_models import User
-from models.api_models.api_user_models import UserCreate, UserUpdate
+from models.db_models.db_auth_models import TokenSession, RevokedToken
+from models.api_models.api_user_models import UserCreate, UserUpdate, UserListQuery
+from core.auth_cache_core import invalidate_session, invalidate_user
+from core.revocation_core import record_revocation
+from core.pagination_core import paginate
 
 
 async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
@@ -24,9 +29,11 @@ async def create_user(db: AsyncSession, data: UserCreate, hashed_password: str)
     return user
 
 
-async def list_users(db: AsyncSession) -> Sequence[User]:
-    result = await db.execute(select(User))
-    return result.scalars().all()
+async def list_users(db: AsyncSession, query: UserListQuery) -> tuple[Sequence[User], Optional[str]]:
+    stmt = select(User)
+    if query.is_active is not None:
+        stmt = stmt.where(User.is_active == query.is_active)
+    return await paginate(db, stmt, User, query, sort=query.sort)
 
 
 async def update_user(db: AsyncSession, user: User, data: UserUpdate) -> User:
@@ -38,10 +45,25 @@ async def update_user(db: AsyncSession, user: User, data: UserUpdate) -> User:
         user.is_active = data.is_active
 
     await db.commit()
+    await invalidate_user(user.id)
     await db.refresh(user)
     return user
 
 
 async def delete_user(db: AsyncSession, user: User) -> None:
+    # the sessions go with the user, their tokens are revoked like on session deletion so no worker accepts them anymore
+    user_id = user.id
+    result = await db.execute(
+        select(TokenSession.jti, TokenSession.expires_at)
+        .where(TokenSession.user_id == user_id)
+        .where(TokenSession.is_revoked.is_(False))
+        .where(TokenSession.expires_at > datetime.now(timezone.utc))
+    )
+    revoked = result.all()
+    db.add_all([RevokedToken(jti=jti, expires_at=expires_at) for jti, expires_at in revoked])
     await db.delete(user)
-    await db.commit()
\ No newline at end of file
+    await db.commit()
+    for jti, expires_at in revoked:
+        record_revocation(jti, expires_at)
+        await invalidate_session(jti, expires_at)
+    await invalidate_user(user_id)
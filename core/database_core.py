@@ -1,14 +1,128 @@
 import os
+import time
+import random
+import asyncio
+import threading
 from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
     "mysql+aiomysql://<user>:<password>@localhost:3306/<db_name>"
 )
 
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"  # logs every SQL statement, only meant for debugging
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # keep it below MySQL's wait_timeout
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# startup waits for the database with exponential backoff: 0.5s, 1s, 2s, ... capped at 10s, each randomly shortened
+DB_CONNECT_ATTEMPTS = int(os.getenv("DB_CONNECT_ATTEMPTS", 12))
+DB_CONNECT_BASE_DELAY_SECONDS = float(os.getenv("DB_CONNECT_BASE_DELAY_SECONDS", 0.5))
+DB_CONNECT_MAX_DELAY_SECONDS = float(os.getenv("DB_CONNECT_MAX_DELAY_SECONDS", 10))
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+
+class PoolWaitStats:
+
+    def __init__(self):
+        self.checkouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait_seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    # measures how long callers wait for a connection, including the time spent opening new ones
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.wait_stats.record(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+def create_engine_from_settings(database_url: str = DATABASE_URL) -> AsyncEngine:
+    if database_url.startswith("sqlite") and (":memory:" in database_url or database_url.endswith("://")):
+        # an in-memory SQLite database only lives as long as its single connection
+        return create_async_engine(database_url, echo=DB_ECHO, poolclass=StaticPool)
+
+    return create_async_engine(
+        database_url,
+        echo=DB_ECHO,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+
+def pool_metrics(async_engine: AsyncEngine) -> dict:
+    pool = async_engine.pool
+    if not isinstance(pool, InstrumentedAsyncQueuePool):
+        return {"pool": type(pool).__name__}
+
+    stats = pool.wait_stats
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checkouts": stats.checkouts,
+        "wait_seconds_total": round(stats.total_wait_seconds, 6),
+        "wait_seconds_max": round(stats.max_wait_seconds, 6),
+    }
+
+
+def backoff_delay(
+        attempt: int,
+        base_delay_seconds: float = DB_CONNECT_BASE_DELAY_SECONDS,
+        max_delay_seconds: float = DB_CONNECT_MAX_DELAY_SECONDS
+) -> float:
+    # full jitter, so replicas that were started together do not hit the database in lockstep
+    return random.uniform(0, min(max_delay_seconds, base_delay_seconds * 2 ** (attempt - 1)))
+
+
+async def wait_for_database(async_engine: AsyncEngine, attempts: int = DB_CONNECT_ATTEMPTS) -> None:
+    for attempt in range(1, attempts + 1):
+        try:
+            async with async_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            print("Database connected successfully! :)")
+            return
+        except OperationalError as e:
+            if attempt == attempts:
+                print("DB is too slow or dead!")
+                raise
+            delay = backoff_delay(attempt)
+            print(f"DB is still waking up... (attempt {attempt}/{attempts}, retrying in {delay:.1f}s): {e}")
+            await asyncio.sleep(delay)
+
+
+engine = create_engine_from_settings()
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -0,0 +1,33 @@
+import io
+import csv
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def to_ndjson(rows: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    async for row in rows:
+        yield json.dumps(row, default=_json_default, separators=(",", ":")) + "\n"
+
+
+async def to_csv(rows: AsyncIterator[dict[str, Any]], fieldnames: list[str]) -> AsyncIterator[str]:
+    # the header comes first even if there are no rows, only one row is ever buffered
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    async for row in rows:
+        writer.writerow({key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
@@ -0,0 +1,61 @@
+import os
+import hashlib
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request
+
+# responses depend on the caller's token, so shared caches must not store them, but clients may revalidate cheaply
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def file_etag(stat_result: os.stat_result, name: str) -> str:
+    # files are only ever replaced atomically, so name, size and mtime identify the exact bytes on disk
+    etag_base = f"{name}:{stat_result.st_size}:{stat_result.st_mtime_ns}"
+    return f'"{hashlib.sha256(etag_base.encode()).hexdigest()[:32]}"'
+
+
+def query_etag(etag: str, query: str) -> str:
+    # a page of an in-memory table is fully determined by the table's content and the query string
+    return f'"{hashlib.sha256(f"{etag}?{query}".encode()).hexdigest()[:32]}"'
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def is_not_modified(
+        request: Request,
+        etag: str,
+        last_modified: Optional[float] = None
+) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since must be ignored when If-None-Match is present (RFC 9110, 13.1.3)
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return int(last_modified) <= since.timestamp()
+
+
+def cache_headers(etag: str, last_modified: Optional[float] = None) -> dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": PRIVATE_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
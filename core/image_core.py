@@ -1,69 +1,327 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from io import BytesIO
 from pathlib import Path
 from datetime import datetime
+from typing import Callable, NamedTuple, Optional
 from PIL import Image, ImageDraw, ImageFont
-from fastapi import HTTPException
+from core.storage_core import ArtifactStorage, get_storage
+from core.source_image_core import (
+    UnsupportedImageError,
+    build_source_pyramid,
+    load_pyramid,
+    pyramid_level_for,
+    read_source_region,
+)
+from core.metrics_core import observe_render
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 SOURCE_IMAGE_PATH = BASE_DIR / "resources" / "images" / "calm_kitchen.jpg"
-PDF_OUTPUT_DIR = BASE_DIR / "resources" / "cropped_images"
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", 256 * 1024 * 1024))  # budget for renders no item uses anymore
+PDF_CACHE_EVICT_SECONDS = float(os.getenv("PDF_CACHE_EVICT_SECONDS", 60))  # how often the PDF cache janitor sweeps the storage
+# previews rendered next to every PDF, as comma separated <format>:<width>:<quality>
+PREVIEW_DERIVATIVES = os.getenv("PREVIEW_DERIVATIVES", "webp:320:80,webp:640:80,jpeg:640:85")
+PREVIEW_MEDIA_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "avif": "image/avif"}
 
 
-def generate_item_pdf(cropped_width: int, cropped_height: int, item_id: int) -> str:
+class RenderError(Exception):
+    # raised by renders instead of HTTPException, which a process pool cannot send back (it does not unpickle)
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class PreviewSpec(NamedTuple):
+    format: str
+    width: int
+    quality: int
+
+
+def parse_preview_specs(value: str) -> list[PreviewSpec]:
+    specs = []
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        try:
+            image_format, width, quality = entry.split(":")
+            spec = PreviewSpec(image_format.lower(), int(width), int(quality))
+        except ValueError:
+            raise ValueError(f"Invalid preview '{entry}' in PREVIEW_DERIVATIVES, expected <format>:<width>:<quality>")
+        if spec.format not in PREVIEW_MEDIA_TYPES or spec.width <= 0:
+            raise ValueError(f"Invalid preview '{entry}' in PREVIEW_DERIVATIVES")
+        specs.append(spec)
+    return specs
+
+
+PREVIEW_SPECS = parse_preview_specs(PREVIEW_DERIVATIVES)
+
+_source_lock = threading.Lock()
+_source_image: Optional[Image.Image] = None
+_source_hash: Optional[str] = None
+_source_key: Optional[tuple[str, int, int]] = None
+
+_SHARED_PDF_PATTERN = re.compile(r"[0-9a-f]{64}\.pdf")
+
+
+def _load_source_image() -> tuple[Image.Image, str]:
+    # the decoded source is shared by all renders of this process and must never be modified in place,
+    # crops are independent copies of the requested region only
+    global _source_image, _source_hash, _source_key
+    stat = SOURCE_IMAGE_PATH.stat()
+    key = (str(SOURCE_IMAGE_PATH), stat.st_mtime_ns, stat.st_size)
+
+    with _source_lock:
+        if _source_image is None or _source_key != key:
+            data = SOURCE_IMAGE_PATH.read_bytes()
+            img = Image.open(BytesIO(data))
+            img.load()
+            _source_image = img
+            _source_hash = hashlib.sha256(data).hexdigest()
+            _source_key = key
+        return _source_image, _source_hash
+
+
+def get_source_image() -> Image.Image:
+    return _load_source_image()[0]
+
+
+def get_source_image_hash() -> str:
+    return _load_source_image()[1]
+
+
+def _load_source_pyramid(source_image_id: int) -> dict:
+    try:
+        return load_pyramid(source_image_id)
+    except FileNotFoundError as e:
+        raise RenderError(400, str(e))
+
+
+def get_render_key(
+        cropped_width: int,
+        cropped_height: int,
+        source_image_id: Optional[int] = None,
+        crop_x: int = 0,
+        crop_y: int = 0
+) -> str:
+    # identical crops of the identical source produce identical PDFs, so they are stored only once;
+    # source_image_id None is the built-in source image
+    if source_image_id is None:
+        source_hash = get_source_image_hash()
+    else:
+        source_hash = _load_source_pyramid(source_image_id)["content_hash"]
+    render_input = f"{source_hash}:{cropped_width}x{cropped_height}"
+    if crop_x or crop_y:
+        render_input += f"+{crop_x}+{crop_y}"
+    return hashlib.sha256(render_input.encode()).hexdigest()
+
+
+def is_shared_pdf(pdf_path: str) -> bool:
+    # shared renders are stored under their render key, any other PDF belongs to exactly one item
+    return _SHARED_PDF_PATTERN.fullmatch(pdf_path) is not None
+
+
+def preview_key(pdf_path: str, spec: PreviewSpec) -> str:
+    # previews are stored next to their PDF and share its lifetime
+    return f"{pdf_path.removesuffix('.pdf')}_{spec.width}w_q{spec.quality}.{spec.format}"
+
+
+def item_artifact_keys(pdf_path: str) -> list[str]:
+    return [pdf_path] + [preview_key(pdf_path, spec) for spec in PREVIEW_SPECS]
+
+
+def _save_previews(
+        storage: ArtifactStorage,
+        pdf_path: str,
+        specs: list[PreviewSpec],
+        image_for_width: Callable[[int], Image.Image],
+        artifact_bytes: dict[str, int]
+) -> None:
+    # image_for_width returns an image at least as wide as the preview (or the whole crop), which is
+    # then scaled down; reducing_gap lets Pillow shrink large crops cheaply before resampling;
+    # crops are never scaled up
+    for spec in specs:
+        image = image_for_width(spec.width)
+        if spec.width < image.width:
+            height = max(1, round(image.height * spec.width / image.width))
+            image = image.resize((spec.width, height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+        def write(fp, image=image, spec=spec):
+            image.save(fp, spec.format.upper(), quality=spec.quality)
+            artifact_bytes[f"{spec.format}_{spec.width}w"] = fp.tell()
+
+        storage.save(preview_key(pdf_path, spec), write)
+
+
+def _draw_timestamp(cropped: Image.Image) -> None:
+    draw = ImageDraw.Draw(cropped)
+    timestamp = datetime.now().strftime("%d.%m.%Y @ %H:%M:%S")
+
+    margin_from_image = 2
+    inner_padding = 2
+    font = ImageFont.load_default()
+
+    bbox = draw.textbbox((0, 0), timestamp, font=font)
+    text_w = bbox[2] - bbox[0]
+    text_h = bbox[3] - bbox[1]
+
+    needed_width = margin_from_image + text_w + 2 * inner_padding
+    needed_height = text_h + 2 * inner_padding + margin_from_image
+
+    if cropped.width < needed_width or cropped.height < needed_height:
+        raise RenderError(400, f"Cropped size {cropped.width}x{cropped.height} too small for timestamp box! Need at least {needed_width}x{needed_height}")
+
+
+    rect_x0 = margin_from_image
+    rect_x1 = rect_x0 + text_w + 2 * inner_padding
+
+    rect_y1 = cropped.height - margin_from_image
+    rect_y0 = rect_y1 - text_h - 2 * inner_padding
+
+    draw.rectangle([rect_x0, rect_y0, rect_x1, rect_y1], fill="white")
+
+    text_x = rect_x0 + inner_padding
+    text_y = rect_y0 + inner_padding
+
+    draw.text(
+        (text_x, text_y),
+        timestamp,
+        fill="black",
+        font=font,
+    )
+
+
+def generate_item_pdf(
+        cropped_width: int,
+        cropped_height: int,
+        item_id: int,
+        timestamp_overlay: bool = False,
+        source_image_id: Optional[int] = None,
+        crop_x: int = 0,
+        crop_y: int = 0
+) -> str:
     if cropped_width <= 0 or cropped_height <= 0:
-        raise HTTPException(status_code=400, detail=f"Invalid width or height values: {cropped_width}x{cropped_height}")
-    if not SOURCE_IMAGE_PATH.exists():
-        raise HTTPException(status_code=400, detail=f"Source image not found at {SOURCE_IMAGE_PATH}")
+        raise RenderError(400, f"Invalid width or height values: {cropped_width}x{cropped_height}")
+    if crop_x < 0 or crop_y < 0:
+        raise RenderError(400, f"Invalid crop offset: ({crop_x}, {crop_y})")
+    start = time.perf_counter()
 
-    with Image.open(SOURCE_IMAGE_PATH) as img:
+    if source_image_id is None:
+        if not SOURCE_IMAGE_PATH.exists():
+            raise RenderError(400, f"Source image not found at {SOURCE_IMAGE_PATH}")
+        img = get_source_image()
         img_width, img_height = img.size
+    else:
+        # registered sources are never decoded as a whole, crops only read the tiles they cover
+        pyramid = _load_source_pyramid(source_image_id)
+        img_width, img_height = pyramid["width"], pyramid["height"]
 
-        if cropped_width > img_width or cropped_height > img_height:
-            raise HTTPException(status_code=400, detail=f"Requested crop {cropped_width}x{cropped_height} exceeds source image size {img_width}x{img_height}")
+    if crop_x + cropped_width > img_width or crop_y + cropped_height > img_height:
+        raise RenderError(
+            400,
+            f"Requested crop {cropped_width}x{cropped_height} at ({crop_x}, {crop_y}) exceeds source image size {img_width}x{img_height}"
+        )
 
-        box = (0, 0, cropped_width, cropped_height)
-        cropped = img.crop(box)
+    # the returned pdf path is the key of the PDF in the artifact storage
+    storage = get_storage()
+    if timestamp_overlay:
+        # the timestamp makes every render unique, so these PDFs belong to exactly one item
+        pdf_path = f"item_{item_id}.pdf"
+        missing = set(item_artifact_keys(pdf_path))
+    else:
+        pdf_path = f"{get_render_key(cropped_width, cropped_height, source_image_id, crop_x, crop_y)}.pdf"
+        missing = {key for key in item_artifact_keys(pdf_path) if not storage.exists(key)}
+        if not missing:
+            observe_render(False, {}, {})
+            return pdf_path
+    source_done = time.perf_counter()
 
-        draw = ImageDraw.Draw(cropped)
-        timestamp = datetime.now().strftime("%d.%m.%Y @ %H:%M:%S")
+    def crop(level: int = 0) -> Image.Image:
+        if source_image_id is None:
+            return img.crop((crop_x, crop_y, crop_x + cropped_width, crop_y + cropped_height))
+        return read_source_region(source_image_id, crop_x, crop_y, cropped_width, cropped_height, level)
 
-        margin_from_image = 2
-        inner_padding = 2
-        font = ImageFont.load_default()
+    # the PDF and all previews come from one crop; previews of registered sources are read
+    # from the coarsest pyramid level that is still large enough
+    cropped = crop() if pdf_path in missing or timestamp_overlay or source_image_id is None else None
+    if timestamp_overlay:
+        _draw_timestamp(cropped)
+    crop_done = time.perf_counter()
 
-        bbox = draw.textbbox((0, 0), timestamp, font=font)
-        text_w = bbox[2] - bbox[0]
-        text_h = bbox[3] - bbox[1]
+    def image_for_width(width: int) -> Image.Image:
+        if cropped is not None and (timestamp_overlay or source_image_id is None):
+            return cropped
+        return crop(pyramid_level_for(cropped_width, width, pyramid["levels"]))
 
-        needed_width = margin_from_image + text_w + 2 * inner_padding
-        needed_height = text_h + 2 * inner_padding + margin_from_image
+    artifact_bytes = {}
+    _save_previews(
+        storage, pdf_path, [spec for spec in PREVIEW_SPECS if preview_key(pdf_path, spec) in missing], image_for_width, artifact_bytes
+    )
+    previews_done = time.perf_counter()
 
-        if cropped_width < needed_width or cropped_height < needed_height:
-            raise HTTPException(status_code=400, detail=f"Cropped size {cropped_width}x{cropped_height} too small for timestamp box! Need at least {needed_width}x{needed_height}")
+    def write_pdf(fp):
+        cropped.save(fp, "PDF")
+        artifact_bytes["pdf"] = fp.tell()
 
+    # the PDF is saved last, once it exists the whole render is complete
+    if pdf_path in missing:
+        storage.save(pdf_path, write_pdf)
+    done = time.perf_counter()
 
-        rect_x0 = margin_from_image
-        rect_x1 = rect_x0 + text_w + 2 * inner_padding
+    observe_render(True, {
+        "source": source_done - start,
+        "crop": crop_done - source_done,
+        "previews": previews_done - crop_done,
+        "pdf": done - previews_done,
+        "total": done - start,
+    }, artifact_bytes)
 
-        rect_y1 = cropped.height - margin_from_image
-        rect_y0 = rect_y1 - text_h - 2 * inner_padding
+    return pdf_path
 
-        draw.rectangle([rect_x0, rect_y0, rect_x1, rect_y1], fill="white")
 
-        text_x = rect_x0 + inner_padding
-        text_y = rect_y0 + inner_padding
+def generate_item_render(
+        cropped_width: int,
+        cropped_height: int,
+        item_id: int,
+        timestamp_overlay: bool = False,
+        source_image_id: Optional[int] = None,
+        crop_x: int = 0,
+        crop_y: int = 0
+) -> tuple[str, str]:
+    # the PDF together with the render key it was made from, items store the key to detect stale renders
+    pdf_path = generate_item_pdf(cropped_width, cropped_height, item_id, timestamp_overlay, source_image_id, crop_x, crop_y)
+    return pdf_path, get_render_key(cropped_width, cropped_height, source_image_id, crop_x, crop_y)
 
-        draw.text(
-            (text_x, text_y),
-            timestamp,
-            fill="black",
-            font=font,
-        )
 
-        PDF_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+def build_source_image(image_path: Path, tiles_prefix: str, content_hash: str) -> dict:
+    # runs on the render pool like a render, so a bad upload is reported like a bad render
+    try:
+        return build_source_pyramid(image_path, tiles_prefix, content_hash)
+    except UnsupportedImageError as e:
+        raise RenderError(400, str(e))
+
+
+class StoredRender(NamedTuple):
+    pdf_path: str
+    size: int  # the PDF together with its previews
+    rendered_at: float
+
 
-        filename = f"item_{item_id}.pdf"
-        pdf_full_path = PDF_OUTPUT_DIR / filename
+def list_shared_pdfs(storage: Optional[ArtifactStorage] = None) -> list[StoredRender]:
+    # the shared renders are found in the storage itself, so every process (and a restarted one) sees the same list
+    storage = storage or get_storage()
+    objects = dict(storage.iter_objects())
+    return [
+        StoredRender(key, sum(objects[artifact].size for artifact in item_artifact_keys(key) if artifact in objects), info.last_modified)
+        for key, info in objects.items()
+        if is_shared_pdf(key)
+    ]
 
-        cropped.save(pdf_full_path, "PDF")
 
-        return pdf_full_path.relative_to(BASE_DIR).as_posix()
+def remove_item_pdf(pdf_path: str) -> None:
+    # the PDF goes first, a render is only complete while its PDF exists
+    storage = get_storage()
+    for key in item_artifact_keys(pdf_path):
+        storage.delete(key)
@@ -0,0 +1,224 @@
+import os
+import time
+import math
+import threading
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024, 100 * 1024 * 1024)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    # cumulative buckets as in the Prometheus exposition format, plus _sum and _count per label set
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            counts, total = self._values.setdefault(label_values, ([0] * len(self.buckets), [0.0]))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            total[0] += value
+
+    def count(self, *label_values: str) -> int:
+        entry = self._values.get(label_values)
+        return entry[0][-1] if entry else 0
+
+    def sum(self, *label_values: str) -> float:
+        entry = self._values.get(label_values)
+        return entry[1][0] if entry else 0.0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    labels = _format_labels(self.labels, label_values, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total[0])}")
+                lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request.", ("method", "route", "status")
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent executing SQL statements per request.", ("method", "route")
+)
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed, inside and outside of requests.")
+DB_QUERY_SECONDS = Counter("db_query_seconds_total", "Time spent executing SQL statements.")
+RENDER_SECONDS = Histogram(
+    "render_phase_duration_seconds", "Time generate_item_pdf() spent per phase of a render.", ("phase",)
+)
+RENDER_OUTPUT_BYTES = Histogram(
+    "render_output_bytes", "Size of rendered artifacts.", ("artifact",), SIZE_BUCKETS
+)
+RENDERS = Counter("renders_total", "generate_item_pdf() calls, by whether they rendered or reused existing artifacts.", ("result",))
+
+_METRICS = [
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUEST_DB_QUERIES,
+    HTTP_REQUEST_DB_SECONDS,
+    DB_QUERIES,
+    DB_QUERY_SECONDS,
+    RENDER_SECONDS,
+    RENDER_OUTPUT_BYTES,
+    RENDERS,
+]
+
+
+class RequestDbStats:
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# set by the metrics middleware for the duration of a request; the object is shared with the
+# tasks and threads the request spawns, so statements executed there are counted too
+_request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+def start_request_db_stats() -> RequestDbStats:
+    stats = RequestDbStats()
+    _request_db_stats.set(stats)
+    return stats
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info["query_start_times"].pop()
+    DB_QUERIES.inc()
+    DB_QUERY_SECONDS.inc(amount=elapsed)
+    stats = _request_db_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+
+
+def _handle_error(exception_context) -> None:
+    # failed statements never reach after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_times"):
+        connection.info["query_start_times"].pop()
+
+
+def instrument_engine(async_engine: AsyncEngine) -> None:
+    sync_engine = async_engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+def observe_request(method: str, route: str, status_code: int, seconds: float, db_stats: RequestDbStats) -> None:
+    HTTP_REQUEST_SECONDS.observe(seconds, method, route, str(status_code))
+    HTTP_REQUEST_DB_QUERIES.observe(db_stats.queries, method, route)
+    HTTP_REQUEST_DB_SECONDS.observe(db_stats.seconds, method, route)
+
+
+# inside a render process observations are collected here and sent back with the result,
+# since metrics recorded in that process would never show up on /metrics
+_render_observations: ContextVar[Optional[list]] = ContextVar("render_observations", default=None)
+
+
+def observe_render(rendered: bool, phase_seconds: dict[str, float], artifact_bytes: dict[str, int]) -> None:
+    pending = _render_observations.get()
+    if pending is not None:
+        pending.append((rendered, phase_seconds, artifact_bytes))
+        return
+
+    RENDERS.inc("rendered" if rendered else "cached")
+    for phase, seconds in phase_seconds.items():
+        RENDER_SECONDS.observe(seconds, phase)
+    for artifact, size in artifact_bytes.items():
+        RENDER_OUTPUT_BYTES.observe(size, artifact)
+
+
+def call_collecting_render_metrics(func: Callable[..., Any], *args: Any) -> tuple[Any, list]:
+    token = _render_observations.set([])
+    try:
+        return func(*args), _render_observations.get()
+    finally:
+        _render_observations.reset(token)
+
+
+def replay_render_metrics(observations: list) -> None:
+    for observation in observations:
+        observe_render(*observation)
+
+
+def gauge_lines(name: str, documentation: str, value: float, kind: str = "gauge") -> list[str]:
+    # values read at scrape time from elsewhere, e.g. the connection pool; monotonic ones are exposed as counters
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {_format_value(value)}"]
+
+
+def render_metrics(gauges: Optional[list[str]] = None) -> str:
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    lines.extend(gauges or [])
+    return "\n".join(lines) + "\n"
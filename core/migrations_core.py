@@ -0,0 +1,286 @@
+import os
+import shutil
+from pathlib import Path, PurePosixPath
+from typing import Callable, NamedTuple, Optional
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Connection,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    inspect,
+    insert,
+    select,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import AddConstraint, CreateColumn
+from core.storage_core import get_storage
+
+_PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# 0 = the app only checks the schema version at startup and `python manage.py migrate` runs as a separate deploy step
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "0") == "1"
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(100)),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+# every step spells out the tables and columns as they were when it was released, the ORM models only describe
+# the latest schema and must never leak into a step; steps check what already exists: databases created by
+# create_all before the migrations existed have some of the changes already, and MySQL commits DDL
+# immediately, so a failed step can simply run again
+
+def _add_column(conn: Connection, metadata: MetaData, table_name: str, column: Column) -> None:
+    if column.name in {existing["name"] for existing in inspect(conn).get_columns(table_name)}:
+        return
+    table = Table(table_name, metadata, column, extend_existing=True)
+    default = column.server_default
+    if conn.dialect.name == "sqlite" and default is not None and not isinstance(default.arg, str):
+        # SQLite only adds columns with constant defaults, existing rows get the default's value afterwards
+        added = Column(column.name, column.type, nullable=True)
+        Table(table_name, MetaData(), added)
+        conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {CreateColumn(added).compile(dialect=conn.dialect)}"))
+        conn.execute(table.update().values({column.name: default.arg}))
+    else:
+        conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}"))
+
+    # SQLite cannot add constraints to existing tables
+    if conn.dialect.name != "sqlite":
+        for foreign_key in column.foreign_keys:
+            conn.execute(AddConstraint(foreign_key.constraint))
+
+
+def _create_index(conn: Connection, table_name: str, column_name: str) -> None:
+    # named like the indexes create_all makes for index=True columns
+    table = Table(table_name, MetaData(), Column(column_name))
+    Index(f"ix_{table_name}_{column_name}", table.c[column_name]).create(conn, checkfirst=True)
+
+
+def _initial_schema(conn: Connection) -> None:
+    # the tables exactly as the first release created them with create_all
+    metadata = MetaData()
+    Table(
+        "users",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("email", String(255), nullable=False, unique=True, index=True),
+        Column("hashed_password", String(255), nullable=False),
+        Column("is_active", Boolean, nullable=False),
+        Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    )
+    Table(
+        "token_sessions",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        Column("jti", String(255), nullable=False, index=True),
+        Column("expires_at", DateTime(timezone=True), nullable=False),
+        Column("is_revoked", Boolean, nullable=False),
+        Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    )
+    for name in ("materials", "product_types"):
+        Table(
+            name,
+            metadata,
+            Column("id", Integer, primary_key=True, index=True, autoincrement=True),
+            Column("name", String(100), nullable=False),
+            Column("description", String(255), nullable=True),
+        )
+    Table(
+        "item_configurations",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True, autoincrement=True),
+        Column("material_id", Integer, ForeignKey("materials.id", ondelete="RESTRICT"), nullable=False, index=True),
+        Column("product_type_id", Integer, ForeignKey("product_types.id", ondelete="RESTRICT"), nullable=False, index=True),
+        Column("width", Integer, nullable=False),
+        Column("height", Integer, nullable=False),
+        Column("pdf_path", String(255), nullable=True),
+        Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    )
+    metadata.create_all(conn)
+
+
+def _render_jobs(conn: Connection) -> None:
+    metadata = MetaData()
+    _add_column(conn, metadata, "item_configurations", Column("render_status", String(20), nullable=False, server_default="done"))
+    _add_column(conn, metadata, "item_configurations", Column("render_error", String(255), nullable=True))
+    _add_column(conn, metadata, "item_configurations", Column("render_started_at", DateTime(timezone=True), nullable=True))
+    _create_index(conn, "item_configurations", "render_status")
+
+
+def _shared_renders(conn: Connection) -> None:
+    _add_column(conn, MetaData(), "item_configurations", Column("timestamp_overlay", Boolean, nullable=False, server_default="0"))
+    _create_index(conn, "item_configurations", "pdf_path")
+
+
+def _created_at_indexes(conn: Connection) -> None:
+    for table_name in ("users", "token_sessions", "item_configurations"):
+        _create_index(conn, table_name, "created_at")
+
+
+def _item_updated_at(conn: Connection) -> None:
+    _add_column(conn, MetaData(), "item_configurations", Column("updated_at", DateTime(timezone=True), nullable=False, server_default=func.now()))
+    _create_index(conn, "item_configurations", "updated_at")
+
+
+def _item_render_key(conn: Connection) -> None:
+    _add_column(conn, MetaData(), "item_configurations", Column("render_key", String(64), nullable=True))
+
+
+def _source_images(conn: Connection) -> None:
+    metadata = MetaData()
+    source_images = Table(
+        "source_images",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True, autoincrement=True),
+        Column("name", String(100), nullable=False),
+        Column("content_hash", String(64), nullable=False, unique=True, index=True),
+        Column("width", Integer, nullable=False),
+        Column("height", Integer, nullable=False),
+        Column("tile_size", Integer, nullable=False),
+        Column("levels", Integer, nullable=False),
+        Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now(), index=True),
+    )
+    source_images.create(conn, checkfirst=True)
+    _add_column(conn, metadata, "item_configurations",
+                Column("source_image_id", Integer, ForeignKey("source_images.id", ondelete="RESTRICT"), nullable=True))
+    _add_column(conn, metadata, "item_configurations", Column("crop_x", Integer, nullable=False, server_default="0"))
+    _add_column(conn, metadata, "item_configurations", Column("crop_y", Integer, nullable=False, server_default="0"))
+    _create_index(conn, "item_configurations", "source_image_id")
+
+
+def _token_session_expiry_index(conn: Connection) -> None:
+    _create_index(conn, "token_sessions", "expires_at")
+
+
+def _revoked_tokens(conn: Connection) -> None:
+    Table(
+        "revoked_tokens",
+        MetaData(),
+        Column("id", Integer, primary_key=True, index=True),
+        Column("jti", String(255), nullable=False, unique=True, index=True),
+        Column("expires_at", DateTime(timezone=True), nullable=False, index=True),
+        Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    ).create(conn, checkfirst=True)
+    # the revocation index only reads this table, so sessions logged out before it existed must be in it too
+    conn.execute(text(
+        "INSERT INTO revoked_tokens (jti, expires_at) "
+        "SELECT jti, MAX(expires_at) FROM token_sessions "
+        "WHERE is_revoked = 1 AND expires_at > CURRENT_TIMESTAMP "
+        "AND jti NOT IN (SELECT jti FROM revoked_tokens) GROUP BY jti"
+    ))
+
+
+def _pdf_storage_keys(conn: Connection) -> None:
+    # rows from before the artifact storage hold paths relative to the project (e.g. "resources/cropped_images/item_1.pdf"),
+    # their files move into the storage and the rows keep the key only; run it where the old files are, a PDF
+    # that is gone by then is reported and rendered again by `manage.py rerender-stale`
+    storage = get_storage()
+    legacy_paths = conn.execute(
+        text("SELECT DISTINCT pdf_path FROM item_configurations WHERE pdf_path LIKE :prefix"),
+        {"prefix": "resources/%"}
+    ).scalars().all()
+    for legacy_path in legacy_paths:
+        key = PurePosixPath(legacy_path).name
+        legacy_file = _PROJECT_DIR / legacy_path
+        if legacy_file.is_file() and not storage.exists(key):
+            with open(legacy_file, "rb") as source:
+                storage.save(key, lambda fp: shutil.copyfileobj(source, fp))
+        conn.execute(
+            text("UPDATE item_configurations SET pdf_path = :key WHERE pdf_path = :legacy_path"),
+            {"key": key, "legacy_path": legacy_path}
+        )
+        # the copy is in the storage, so running the step again after a failed commit still finds it
+        legacy_file.unlink(missing_ok=True)
+
+
+def _item_deletions(conn: Connection) -> None:
+    Table(
+        "item_deletions",
+        MetaData(),
+        Column("id", Integer, primary_key=True, index=True, autoincrement=True),
+        Column("item_id", Integer, nullable=False, index=True),
+        Column("deleted_at", DateTime(timezone=True), nullable=False, server_default=func.now(), index=True),
+    ).create(conn, checkfirst=True)
+
+
+# append only: a released migration is never changed, later schema changes get a new version
+MIGRATIONS = [
+    Migration(1, "initial schema", _initial_schema),
+    Migration(2, "item render jobs", _render_jobs),
+    Migration(3, "shared item renders", _shared_renders),
+    Migration(4, "created_at indexes", _created_at_indexes),
+    Migration(5, "item updated_at", _item_updated_at),
+    Migration(6, "item render key", _item_render_key),
+    Migration(7, "source images", _source_images),
+    Migration(8, "token session expiry index", _token_session_expiry_index),
+    Migration(9, "revoked tokens", _revoked_tokens),
+    Migration(10, "pdf storage keys", _pdf_storage_keys),
+    Migration(11, "item deletions", _item_deletions),
+]
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def _current_version(conn: Connection) -> Optional[int]:
+    if not inspect(conn).has_table(schema_version.name):
+        return None
+    return conn.execute(select(func.max(schema_version.c.version))).scalar()
+
+
+async def get_schema_version(async_engine: AsyncEngine) -> Optional[int]:
+    async with async_engine.connect() as conn:
+        return await conn.run_sync(_current_version)
+
+
+async def migrate(async_engine: AsyncEngine, target: int = LATEST_SCHEMA_VERSION) -> list[Migration]:
+    # run it from one place only (e.g. `python manage.py migrate` before rolling out the app)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(schema_version.create, checkfirst=True)
+    current = await get_schema_version(async_engine) or 0
+
+    applied = []
+    for migration in MIGRATIONS:
+        if current < migration.version <= target:
+            # one transaction per step, so a failure keeps every step before it
+            async with async_engine.begin() as conn:
+                await conn.run_sync(migration.upgrade)
+                await conn.execute(insert(schema_version).values(version=migration.version, name=migration.name))
+            print(f"Applied migration {migration.version}: {migration.name}")
+            applied.append(migration)
+    return applied
+
+
+async def check_schema_version(async_engine: AsyncEngine) -> int:
+    # the app start path: one query instead of reflecting the whole schema
+    version = await get_schema_version(async_engine)
+    if version is None or version < LATEST_SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f"Database schema is at version {version or 0}, this app needs {LATEST_SCHEMA_VERSION}. "
+            f"Run `python manage.py migrate` first (or set AUTO_MIGRATE=1)"
+        )
+    if version > LATEST_SCHEMA_VERSION:
+        # during a rolling deploy the old app version keeps running against the migrated schema
+        print(f"Database schema version {version} is newer than this app's {LATEST_SCHEMA_VERSION}")
+    return version
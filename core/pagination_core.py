@@ -0,0 +1,104 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Optional, Sequence
+from fastapi import HTTPException
+from sqlalchemy import Select, and_, or_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.api_models.api_pagination_models import PageQuery, SearchQuery
+
+
+def encode_cursor(sort: str, order: str, values: list[Any]) -> str:
+    encoded_values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps({"s": sort, "o": order, "v": encoded_values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> list[Any]:
+    invalid_cursor = HTTPException(status_code=400, detail="Invalid cursor, please restart from the first page")
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        decoded = json.loads(raw)
+        values = decoded["v"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise invalid_cursor
+    # a cursor only makes sense for the ordering it was created with
+    if decoded.get("s") != sort or decoded.get("o") != order:
+        raise invalid_cursor
+    expected_length = 2 if sort == "created_at" else 1
+    if not isinstance(values, list) or len(values) != expected_length:
+        raise invalid_cursor
+    # every cursor ends with an id (or a rank offset); values of another type would fail in the query instead
+    if not isinstance(values[-1], int) or isinstance(values[-1], bool):
+        raise invalid_cursor
+    if sort == "created_at":
+        try:
+            values[0] = datetime.fromisoformat(values[0])
+        except (TypeError, ValueError):
+            raise invalid_cursor
+    return values
+
+
+async def paginate(
+        db: AsyncSession,
+        stmt: Select,
+        model: Any,
+        query: PageQuery,
+        sort: str = "id"
+) -> tuple[Sequence[Any], Optional[str]]:
+    # keyset pagination: the next page starts right after the sort key of the last row,
+    # so every page costs an index range scan no matter how deep the client pages
+    descending = query.order == "desc"
+    keys = [model.created_at, model.id] if sort == "created_at" else [model.id]
+
+    if query.cursor is not None:
+        values = decode_cursor(query.cursor, sort, query.order)
+        if len(keys) == 1:
+            stmt = stmt.where(keys[0] < values[0] if descending else keys[0] > values[0])
+        else:
+            (first_key, second_key), (first_value, second_value) = keys, values
+            if db.get_bind().dialect.name == "sqlite":
+                # SQLite compares datetimes as text and server_default timestamps lack the microseconds of bound values
+                first_key, first_value = func.datetime(first_key), func.datetime(first_value)
+            after_first = first_key < first_value if descending else first_key > first_value
+            after_second = second_key < second_value if descending else second_key > second_value
+            stmt = stmt.where(or_(after_first, and_(first_key == first_value, after_second)))
+
+    stmt = stmt.order_by(*(key.desc() if descending else key.asc() for key in keys)).limit(query.limit + 1)
+    result = await db.execute(stmt)
+    rows = result.scalars().all()
+
+    if len(rows) <= query.limit:
+        return rows, None
+    rows = rows[:query.limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort, query.order, [getattr(last, key.key) for key in keys])
+
+
+def paginate_rows(rows: Sequence[dict], query: PageQuery) -> tuple[list[dict], Optional[str]]:
+    # the same pages and cursors as paginate() sorted by id, for tables that are served from memory
+    descending = query.order == "desc"
+    ordered = sorted(rows, key=lambda row: row["id"], reverse=descending)
+    if query.cursor is not None:
+        last_id, = decode_cursor(query.cursor, "id", query.order)
+        ordered = [row for row in ordered if (row["id"] < last_id if descending else row["id"] > last_id)]
+
+    if len(ordered) <= query.limit:
+        return ordered, None
+    page = ordered[:query.limit]
+    return page, encode_cursor("id", query.order, [page[-1]["id"]])
+
+
+def paginate_ranked(rows: Sequence[dict], query: SearchQuery) -> tuple[list[dict], Optional[str]]:
+    # ranked results have no sortable key, so the cursor holds the offset and is only valid for the same term
+    offset = 0
+    if query.cursor is not None:
+        offset, = decode_cursor(query.cursor, "rank", query.q)
+        if offset < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor, please restart from the first page")
+
+    page = list(rows[offset:offset + query.limit])
+    if offset + query.limit >= len(rows):
+        return page, None
+    return page, encode_cursor("rank", query.q, [offset + query.limit])
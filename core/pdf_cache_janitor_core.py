@@ -0,0 +1,24 @@
+import os
+import asyncio
+from core.database_core import AsyncSessionLocal
+from core.image_core import PDF_CACHE_EVICT_SECONDS
+from core.crud.crud_catalog import evict_unreferenced_pdfs
+
+
+PDF_CACHE_JANITOR_ENABLED = os.getenv("PDF_CACHE_JANITOR_ENABLED", "1") == "1"
+
+
+async def run_pdf_cache_janitor() -> None:
+    # the sweep lists the whole storage, so it runs here instead of in the request that released a render;
+    # several app workers may sweep at once, a render removed twice is harmless
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                evicted = await evict_unreferenced_pdfs(db)
+            if evicted:
+                print(f"PDF cache janitor evicted {len(evicted)} unused renders")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"PDF cache janitor failed, retrying in {PDF_CACHE_EVICT_SECONDS}s: {e!r}")
+        await asyncio.sleep(PDF_CACHE_EVICT_SECONDS)
@@ -0,0 +1,145 @@
+import io
+import os
+import time
+import pstats
+import random
+import marshal
+import cProfile
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, NamedTuple, Optional
+
+# 0 = off; e.g. 0.01 profiles 1% of the requests, only the slow ones among them are kept
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", 0.5))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", 20))  # most recent slow request profiles kept per process
+
+
+class RequestProfile(NamedTuple):
+    id: int
+    method: str
+    route: str
+    status_code: int
+    duration_seconds: float
+    created_at: float
+    stats: bytes  # marshalled pstats data, readable with pstats.Stats or e.g. snakeviz
+
+
+class _CollectedStats:
+    # pstats.Stats.add() accepts anything with create_stats() and a stats dict, e.g. stats sent back by a render worker
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+class _ActiveProfile:
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.worker_stats: list[dict] = []
+        self._lock = threading.Lock()
+
+    def add_worker_stats(self, stats: dict) -> None:
+        with self._lock:
+            self.worker_stats.append(stats)
+
+
+_profiles: deque[RequestProfile] = deque(maxlen=PROFILE_BUFFER_SIZE)
+_profiles_lock = threading.Lock()
+_next_profile_id = 1
+# cProfile hooks the whole event loop thread, so only one request per process is profiled at a time
+_profiling = threading.Lock()
+_active_profile: ContextVar[Optional[_ActiveProfile]] = ContextVar("active_profile", default=None)
+
+
+def start_request_profile(sample_rate: float = PROFILE_SAMPLE_RATE) -> Optional[_ActiveProfile]:
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return None
+    if not _profiling.acquire(blocking=False):
+        return None
+
+    active = _ActiveProfile()
+    try:
+        active.profiler.enable()
+    except ValueError:
+        # another profiler (e.g. a debugger) already owns this thread
+        _profiling.release()
+        return None
+    _active_profile.set(active)
+    return active
+
+
+def finish_request_profile(
+        active: _ActiveProfile,
+        method: str,
+        route: str,
+        status_code: int,
+        duration_seconds: float,
+        slow_seconds: float = PROFILE_SLOW_SECONDS
+) -> Optional[RequestProfile]:
+    global _next_profile_id
+    active.profiler.disable()
+    _active_profile.set(None)
+    _profiling.release()
+    if duration_seconds < slow_seconds:
+        return None
+
+    stats = pstats.Stats(active.profiler)
+    for worker_stats in active.worker_stats:
+        stats.add(_CollectedStats(worker_stats))
+
+    with _profiles_lock:
+        profile = RequestProfile(
+            _next_profile_id, method, route, status_code, duration_seconds, time.time(), marshal.dumps(stats.stats)
+        )
+        _next_profile_id += 1
+        _profiles.append(profile)
+    print(f"Profiled slow request #{profile.id}: {method} {route} took {duration_seconds:.3f}s")
+    return profile
+
+
+def is_profiling() -> bool:
+    return _active_profile.get() is not None
+
+
+def call_profiled(func: Callable[..., Any], *args: Any) -> tuple[Any, dict]:
+    # runs in a render worker (thread or process) on behalf of a profiled request,
+    # the stats are sent back and merged into the request's profile
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return func(*args), {}
+    try:
+        result = func(*args)
+    finally:
+        profiler.disable()
+    profiler.create_stats()
+    return result, profiler.stats
+
+
+def add_worker_stats(stats: dict) -> None:
+    active = _active_profile.get()
+    if active is not None and stats:
+        active.add_worker_stats(stats)
+
+
+def list_profiles() -> list[RequestProfile]:
+    with _profiles_lock:
+        return list(reversed(_profiles))
+
+
+def get_profile(profile_id: int) -> Optional[RequestProfile]:
+    with _profiles_lock:
+        return next((profile for profile in _profiles if profile.id == profile_id), None)
+
+
+def profile_summary(profile: RequestProfile, sort: str = "cumulative", limit: int = 50) -> str:
+    output = io.StringIO()
+    stats = pstats.Stats(_CollectedStats(marshal.loads(profile.stats)), stream=output)
+    stats.sort_stats(sort).print_stats(limit)
+    return output.getvalue()
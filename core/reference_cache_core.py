@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+from typing import Any, NamedTuple, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.cache_core import get_cache_backend
+from core.search_core import TrigramIndex
+from models.db_models.db_catalog_models import Material, ProductType
+from models.api_models.api_catalog_models import MaterialRead, ProductTypeRead
+
+REFERENCE_CACHE_ENABLED = os.getenv("REFERENCE_CACHE_ENABLED", "1") == "1"
+# how long a worker trusts its copy before asking the cache backend whether another worker changed the table
+REFERENCE_CACHE_CHECK_SECONDS = float(os.getenv("REFERENCE_CACHE_CHECK_SECONDS", 1))
+_VERSION_TTL_SECONDS = 7 * 24 * 3600
+
+
+class ReferenceSnapshot(NamedTuple):
+    version: str
+    rows: dict[int, dict]  # id -> response fields, ordered by id
+    etag: str
+
+
+class ReferenceTable:
+    # every worker keeps the whole (small) table in memory; writers change the table's version in the
+    # cache backend, which is shared by all workers with redis and a process-local stand-in otherwise
+
+    def __init__(self, name: str, model: Any, schema: Any):
+        self.name = name
+        self.model = model
+        self.schema = schema
+        self._snapshot: Optional[ReferenceSnapshot] = None
+        self._checked_at = 0.0
+        self._generation = 0
+        self._search_index = TrigramIndex()
+        self._indexed: Optional[ReferenceSnapshot] = None
+
+    @property
+    def _version_key(self) -> str:
+        return f"reference:version:{self.name}"
+
+    async def _shared_version(self) -> str:
+        backend = get_cache_backend()
+        version = await backend.get(self._version_key)
+        if version is None:
+            # first worker after a (re)start of the cache backend, everybody reloads once
+            version = uuid.uuid4().hex
+            await backend.set(self._version_key, version, _VERSION_TTL_SECONDS)
+        return version
+
+    async def snapshot(self, db: AsyncSession) -> ReferenceSnapshot:
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < REFERENCE_CACHE_CHECK_SECONDS:
+            return snapshot
+
+        generation = self._generation
+        # the version is read before the rows, so a write in between makes the copy stale instead of lost
+        version = await self._shared_version()
+        if snapshot is None or snapshot.version != version:
+            result = await db.execute(select(self.model).order_by(self.model.id))
+            rows = {row.id: self.schema.model_validate(row).model_dump(mode="json") for row in result.scalars()}
+            content = json.dumps(list(rows.values()), sort_keys=True, separators=(",", ":"))
+            snapshot = ReferenceSnapshot(version, rows, f'"{hashlib.sha256(content.encode()).hexdigest()[:32]}"')
+        # a write of this worker during the reload already dropped the copy, it must not come back
+        if generation == self._generation:
+            self._snapshot = snapshot
+            self._checked_at = now
+        return snapshot
+
+    async def existing_ids(self, db: AsyncSession, ids: set[int]) -> set[int]:
+        if REFERENCE_CACHE_ENABLED:
+            known = ids & (await self.snapshot(db)).rows.keys()
+            # rows another worker created a moment ago are not in the copy yet, so misses still ask the database
+            ids = ids - known
+        else:
+            known = set()
+        if ids:
+            result = await db.execute(select(self.model.id).where(self.model.id.in_(ids)))
+            known |= set(result.scalars().all())
+        return known
+
+    async def search(self, db: AsyncSession, term: str) -> list[dict]:
+        # ranked by name; the index follows the copy of the table and only re-indexes the rows that changed
+        snapshot = await self.snapshot(db)
+        if self._indexed is not snapshot:
+            self._search_index.sync({row_id: row["name"] for row_id, row in snapshot.rows.items()})
+            self._indexed = snapshot
+        return [snapshot.rows[row_id] for row_id in self._search_index.search(term)]
+
+    async def invalidate(self) -> None:
+        self._generation += 1
+        self._snapshot = None
+        await get_cache_backend().set(self._version_key, uuid.uuid4().hex, _VERSION_TTL_SECONDS)
+
+
+materials_cache = ReferenceTable("materials", Material, MaterialRead)
+product_types_cache = ReferenceTable("product_types", ProductType, ProductTypeRead)
@@ -0,0 +1,150 @@
+import os
+import asyncio
+import threading
+from typing import Any, Callable, Optional
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException, status
+from core.image_core import RenderError, generate_item_pdf, generate_item_render
+from core.metrics_core import call_collecting_render_metrics, replay_render_metrics
+from core.profiling_core import is_profiling, call_profiled, add_worker_stats
+
+
+RENDER_MODE = os.getenv("RENDER_MODE", "inline")  # "inline" or "job"
+RENDER_EXECUTOR = os.getenv("RENDER_EXECUTOR", "thread")  # "thread" or "process"
+RENDER_MAX_WORKERS = int(os.getenv("RENDER_MAX_WORKERS", min(4, os.cpu_count() or 1)))
+RENDER_MAX_QUEUE = int(os.getenv("RENDER_MAX_QUEUE", 16))
+RENDER_RETRY_AFTER_SECONDS = int(os.getenv("RENDER_RETRY_AFTER_SECONDS", 5))
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def get_render_executor() -> Executor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if RENDER_EXECUTOR == "process":
+                _executor = ProcessPoolExecutor(max_workers=RENDER_MAX_WORKERS)
+            elif RENDER_EXECUTOR == "thread":
+                _executor = ThreadPoolExecutor(max_workers=RENDER_MAX_WORKERS, thread_name_prefix="render")
+            else:
+                raise ValueError(f"Unknown RENDER_EXECUTOR '{RENDER_EXECUTOR}', expected 'thread' or 'process'")
+        return _executor
+
+
+def shutdown_render_executor(wait: bool = True) -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=True)
+            _executor = None
+
+
+def _discard_broken_executor(executor: Executor) -> None:
+    # e.g. a worker process was killed; the next render starts a new pool instead of failing forever
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _workers_restarted() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="The render workers were restarted, please retry",
+        headers={"Retry-After": str(RENDER_RETRY_AFTER_SECONDS)},
+    )
+
+
+def render_in_flight() -> int:
+    return _in_flight
+
+
+def render_queue_depth() -> int:
+    return max(0, _in_flight - RENDER_MAX_WORKERS)
+
+
+def _release_slot(_future) -> None:
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight -= 1
+
+
+async def run_render(func: Callable[..., Any], *args: Any) -> Any:
+    # the slot is held until the executor job itself finishes (not the awaiting coroutine),
+    # so cancelled requests cannot push more work into the pool than the configured limits allow
+    global _in_flight
+    with _in_flight_lock:
+        if _in_flight >= RENDER_MAX_WORKERS + RENDER_MAX_QUEUE:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many PDFs are being rendered right now, please retry later",
+                headers={"Retry-After": str(RENDER_RETRY_AFTER_SECONDS)},
+            )
+        _in_flight += 1
+
+    # renders of a profiled request are profiled inside the worker, the event loop's profiler cannot see them
+    profiled = is_profiling()
+    job = (call_profiled, func, *args) if profiled else (func, *args)
+    try:
+        executor = get_render_executor()
+        in_process = isinstance(executor, ProcessPoolExecutor)
+        if in_process:
+            # render metrics recorded in a worker process are sent back and recorded here
+            future = executor.submit(call_collecting_render_metrics, *job)
+        else:
+            future = executor.submit(*job)
+    except BrokenProcessPool:
+        _release_slot(None)
+        _discard_broken_executor(executor)
+        raise _workers_restarted()
+    except Exception:
+        _release_slot(None)
+        raise
+    future.add_done_callback(_release_slot)
+    try:
+        result = await asyncio.wrap_future(future)
+    except RenderError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except BrokenProcessPool:
+        _discard_broken_executor(executor)
+        raise _workers_restarted()
+    if in_process:
+        result, observations = result
+        replay_render_metrics(observations)
+    if profiled:
+        result, stats = result
+        add_worker_stats(stats)
+    return result
+
+
+async def render_item_pdf(
+        cropped_width: int,
+        cropped_height: int,
+        item_id: int,
+        timestamp_overlay: bool = False,
+        source_image_id: Optional[int] = None,
+        crop_x: int = 0,
+        crop_y: int = 0
+) -> str:
+    return await run_render(
+        generate_item_pdf, cropped_width, cropped_height, item_id, timestamp_overlay, source_image_id, crop_x, crop_y
+    )
+
+
+async def render_item(
+        cropped_width: int,
+        cropped_height: int,
+        item_id: int,
+        timestamp_overlay: bool = False,
+        source_image_id: Optional[int] = None,
+        crop_x: int = 0,
+        crop_y: int = 0
+) -> tuple[str, str]:
+    return await run_render(
+        generate_item_render, cropped_width, cropped_height, item_id, timestamp_overlay, source_image_id, crop_x, crop_y
+    )
@@ -0,0 +1,105 @@
+import os
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, status
+from core.database_core import AsyncSessionLocal
+from core.render_core import RENDER_MAX_WORKERS, shutdown_render_executor
+from core.profiling_core import start_request_profile, finish_request_profile
+from core.crud.crud_catalog import (
+    claim_render_jobs,
+    ensure_pdfs_stored,
+    finish_render_job,
+    release_unused_pdf,
+    render_configuration,
+)
+from models.db_models.db_catalog_models import (
+    ItemConfiguration,
+    RENDER_STATUS_PENDING,
+    RENDER_STATUS_DONE,
+    RENDER_STATUS_FAILED,
+)
+
+
+RENDER_JOB_POLL_SECONDS = float(os.getenv("RENDER_JOB_POLL_SECONDS", 2))
+RENDER_JOB_BATCH_SIZE = int(os.getenv("RENDER_JOB_BATCH_SIZE", RENDER_MAX_WORKERS))
+RENDER_JOB_TIMEOUT_SECONDS = int(os.getenv("RENDER_JOB_TIMEOUT_SECONDS", 300))
+RENDER_WORKER_IN_APP = os.getenv("RENDER_WORKER_IN_APP", "1") == "1"
+
+_wakeup = asyncio.Event()
+
+
+def notify_render_jobs() -> None:
+    # only wakes a worker running in this process, other workers find the job on their next poll
+    _wakeup.set()
+
+
+async def _render_job(item: ItemConfiguration) -> tuple[str, str | None, str | None, str | None]:
+    try:
+        pdf_path, render_key = await render_configuration(item)
+        return RENDER_STATUS_DONE, pdf_path, render_key, None
+    except HTTPException as e:
+        if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+            return RENDER_STATUS_PENDING, None, None, None
+        return RENDER_STATUS_FAILED, None, None, str(e.detail)[:255]
+    except Exception as e:
+        print(f"Rendering item {item.id} failed: {e!r}")
+        return RENDER_STATUS_FAILED, None, None, repr(e)[:255]
+
+
+async def run_render_jobs_once() -> int:
+    # batches are sampled like requests, slow ones end up next to the slow request profiles
+    profile = start_request_profile()
+    start = time.perf_counter()
+    try:
+        return await _run_render_jobs_once()
+    finally:
+        if profile is not None:
+            finish_request_profile(profile, "JOB", "render-jobs", 200, time.perf_counter() - start)
+
+
+async def _run_render_jobs_once() -> int:
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=RENDER_JOB_TIMEOUT_SECONDS)
+    async with AsyncSessionLocal() as db:
+        items = await claim_render_jobs(db, RENDER_JOB_BATCH_SIZE, stale_before)
+        old_pdf_paths = [item.pdf_path for item in items]
+        results = await asyncio.gather(*(_render_job(item) for item in items))
+        for item, old_pdf_path, (render_status, pdf_path, render_key, render_error) in zip(items, old_pdf_paths, results):
+            updated = await finish_render_job(
+                db, item, render_status, pdf_path=pdf_path, render_error=render_error, render_key=render_key
+            )
+            if not updated and pdf_path is not None:
+                # the item was deleted or changed while its PDF was rendering
+                await release_unused_pdf(db, pdf_path)
+            elif updated and pdf_path is not None:
+                await ensure_pdfs_stored(db, [pdf_path])
+                if old_pdf_path not in (None, pdf_path):
+                    # a re-render replaced the PDF the item pointed at
+                    await release_unused_pdf(db, old_pdf_path)
+    return len(items)
+
+
+async def run_render_worker() -> None:
+    while True:
+        _wakeup.clear()
+        try:
+            processed = await run_render_jobs_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Render worker failed to process jobs, retrying in {RENDER_JOB_POLL_SECONDS}s: {e!r}")
+            processed = 0
+
+        if processed == 0:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=RENDER_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+if __name__ == "__main__":
+    # standalone worker, e.g. `python -m core.render_jobs_core`, to scale rendering independently of the API
+    try:
+        asyncio.run(run_render_worker())
+    finally:
+        shutdown_render_executor()
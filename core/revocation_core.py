@@ -0,0 +1,99 @@
+import os
+import time
+import asyncio
+import threading
+from datetime import datetime, timezone
+from typing import Iterable
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database_core import AsyncSessionLocal
+from models.db_models.db_auth_models import RevokedToken
+
+REVOCATION_INDEX_ENABLED = os.getenv("REVOCATION_INDEX_ENABLED", "1") == "1"
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", 10))  # how late other workers may learn about a revocation
+# an index that could not be synced for this long is not trusted anymore, sessions are then checked in the database
+REVOCATION_MAX_STALENESS_SECONDS = float(os.getenv("REVOCATION_MAX_STALENESS_SECONDS", 3 * REVOCATION_SYNC_SECONDS))
+
+
+def _timestamp(expires_at: datetime) -> float:
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at.timestamp()
+
+
+class RevocationIndex:
+    # exact set of revoked, unexpired jtis; revocations are rare, so a plain hash set stays small
+    # and, unlike a bloom filter, never sends a valid token to the database
+
+    def __init__(self):
+        self._expires_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.synced_at: float | None = None
+
+    def add(self, jti: str, expires_at: datetime) -> None:
+        with self._lock:
+            self._expires_at[jti] = _timestamp(expires_at)
+
+    def contains(self, jti: str) -> bool:
+        with self._lock:
+            expires_at = self._expires_at.get(jti)
+            if expires_at is None:
+                return False
+            if expires_at <= time.time():
+                # the token is rejected by its exp claim anyway
+                del self._expires_at[jti]
+                return False
+            return True
+
+    def merge(self, entries: Iterable[tuple[str, datetime]]) -> None:
+        # revocations are never undone, so entries only leave the index when they expire
+        with self._lock:
+            for jti, expires_at in entries:
+                self._expires_at[jti] = _timestamp(expires_at)
+            self.synced_at = time.monotonic()
+
+    def prune(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [jti for jti, expires_at in self._expires_at.items() if expires_at <= now]
+            for jti in expired:
+                del self._expires_at[jti]
+            return len(expired)
+
+    def is_fresh(self, max_staleness_seconds: float = REVOCATION_MAX_STALENESS_SECONDS) -> bool:
+        return self.synced_at is not None and time.monotonic() - self.synced_at <= max_staleness_seconds
+
+    def __len__(self) -> int:
+        return len(self._expires_at)
+
+
+_index = RevocationIndex()
+
+
+def get_revocation_index() -> RevocationIndex:
+    return _index
+
+
+def record_revocation(jti: str, expires_at: datetime) -> None:
+    _index.add(jti, expires_at)
+
+
+async def sync_revocation_index(db: AsyncSession, index: RevocationIndex = _index) -> int:
+    now = datetime.now(timezone.utc)
+    result = await db.execute(select(RevokedToken.jti, RevokedToken.expires_at).where(RevokedToken.expires_at > now))
+    index.merge(result.all())
+    index.prune()
+    return len(index)
+
+
+async def run_revocation_sync() -> None:
+    # picks up revocations made by other app workers
+    while True:
+        await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+        try:
+            async with AsyncSessionLocal() as db:
+                await sync_revocation_index(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Syncing the revocation index failed, retrying in {REVOCATION_SYNC_SECONDS}s: {e!r}")
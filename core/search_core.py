@@ -0,0 +1,71 @@
+import os
+from collections import Counter
+
+# pg_trgm's default threshold: below it a name only matches if it contains the search term
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", 0.3))
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def trigrams(text: str) -> set[str]:
+    # padded like pg_trgm, so words also match by their first letters
+    padded = f"  {_normalize(text)} "
+    return {padded[start:start + 3] for start in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    # inverted index trigram -> ids; a lookup only touches the ids that share a trigram with the term
+
+    def __init__(self):
+        self._postings: dict[str, set[int]] = {}
+        self._texts: dict[int, str] = {}
+        self._trigrams: dict[int, set[str]] = {}
+
+    def add(self, doc_id: int, text: str) -> None:
+        self.remove(doc_id)
+        self._texts[doc_id] = _normalize(text)
+        self._trigrams[doc_id] = trigrams(text)
+        for trigram in self._trigrams[doc_id]:
+            self._postings.setdefault(trigram, set()).add(doc_id)
+
+    def remove(self, doc_id: int) -> None:
+        for trigram in self._trigrams.pop(doc_id, ()):
+            postings = self._postings[trigram]
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[trigram]
+        self._texts.pop(doc_id, None)
+
+    def sync(self, texts: dict[int, str]) -> None:
+        # only re-indexes what changed, e.g. after one material was renamed
+        for doc_id in self._texts.keys() - texts.keys():
+            self.remove(doc_id)
+        for doc_id, text in texts.items():
+            if self._texts.get(doc_id) != _normalize(text):
+                self.add(doc_id, text)
+
+    def search(self, term: str, min_similarity: float = SEARCH_MIN_SIMILARITY) -> list[int]:
+        # names containing the term first, then by trigram similarity (Jaccard, like pg_trgm), then by id
+        normalized = _normalize(term)
+        term_trigrams = trigrams(term)
+        shared = Counter(doc_id for trigram in term_trigrams for doc_id in self._postings.get(trigram, ()))
+        if len(normalized) < 3:
+            # a longer term shares its inner trigrams with every name containing it, a shorter one has none
+            # (e.g. "gl" in "plexiglas"), so short terms also check every name for containment
+            for doc_id, text in self._texts.items():
+                if normalized in text:
+                    shared.setdefault(doc_id, 0)
+
+        ranked = []
+        for doc_id, count in shared.items():
+            similarity = count / (len(term_trigrams) + len(self._trigrams[doc_id]) - count)
+            contains = normalized in self._texts[doc_id]
+            if contains or similarity >= min_similarity:
+                ranked.append((not contains, -similarity, doc_id))
+        ranked.sort()
+        return [doc_id for _, _, doc_id in ranked]
+
+    def __len__(self) -> int:
+        return len(self._texts)
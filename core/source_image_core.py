@@ -0,0 +1,203 @@
+import os
+import io
+import json
+import math
+import uuid
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import BinaryIO
+from PIL import Image, UnidentifiedImageError
+from core.storage_core import get_storage
+
+SOURCE_TILE_SIZE = int(os.getenv("SOURCE_TILE_SIZE", 512))
+SOURCE_TILE_CACHE_TILES = int(os.getenv("SOURCE_TILE_CACHE_TILES", 64))  # decoded tiles kept per process
+
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_pyramid_lock = threading.Lock()
+_pyramids: dict[int, dict] = {}
+_tile_lock = threading.Lock()
+_tiles: OrderedDict[tuple[int, int, int, int], Image.Image] = OrderedDict()
+
+
+class UnsupportedImageError(ValueError):
+    pass
+
+
+# pyramids live in the artifact storage like the PDFs, so every replica and render worker reads the same tiles;
+# the tiles of every upload get their own prefix and a source image's metadata points at the prefix it uses
+
+def new_tiles_prefix() -> str:
+    return f"source_{uuid.uuid4().hex}"
+
+
+def _pyramid_key(source_image_id: int) -> str:
+    return f"source_image_{source_image_id}.json"
+
+
+def _tile_key(tiles_prefix: str, level: int, col: int, row: int) -> str:
+    return f"{tiles_prefix}_{level}_{col}_{row}.png"
+
+
+def _level_grid(metadata: dict, level: int) -> tuple[int, int]:
+    # columns and rows of a level, every level halves the previous one (rounding up like Image.reduce)
+    width, height = metadata["width"], metadata["height"]
+    for _ in range(level):
+        width, height = math.ceil(width / 2), math.ceil(height / 2)
+    tile_size = metadata["tile_size"]
+    return math.ceil(width / tile_size), math.ceil(height / tile_size)
+
+
+def save_upload(upload: BinaryIO, target_path: Path) -> str:
+    # copies the upload in chunks and returns its sha256, the content hash identifies a source image
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    sha256 = hashlib.sha256()
+    with open(target_path, "wb") as fp:
+        while chunk := upload.read(_UPLOAD_CHUNK_SIZE):
+            sha256.update(chunk)
+            fp.write(chunk)
+    return sha256.hexdigest()
+
+
+def build_source_pyramid(image_path: Path, tiles_prefix: str, content_hash: str, tile_size: int = SOURCE_TILE_SIZE) -> dict:
+    # the only full decode a source image ever gets: level 0 holds the original pixels, every
+    # further level halves the previous one until a single tile covers it
+    try:
+        with Image.open(image_path) as uploaded:
+            image = uploaded.convert("RGB")
+    except UnidentifiedImageError:
+        raise UnsupportedImageError("The uploaded file is not a supported image")
+    except Image.DecompressionBombError:
+        raise UnsupportedImageError(f"The uploaded image has more than {2 * Image.MAX_IMAGE_PIXELS} pixels")
+    width, height = image.size
+
+    storage = get_storage()
+    metadata = {
+        "width": width,
+        "height": height,
+        "tile_size": tile_size,
+        "levels": 1,
+        "content_hash": content_hash,
+        "tiles_prefix": tiles_prefix,
+    }
+    try:
+        level = 0
+        while True:
+            for row in range(math.ceil(image.height / tile_size)):
+                for col in range(math.ceil(image.width / tile_size)):
+                    box = (col * tile_size, row * tile_size,
+                           min((col + 1) * tile_size, image.width), min((row + 1) * tile_size, image.height))
+                    tile = image.crop(box)
+                    storage.save(_tile_key(tiles_prefix, level, col, row), lambda fp, tile=tile: tile.save(fp, "PNG"))
+            metadata["levels"] = level + 1
+            if max(image.size) <= tile_size:
+                break
+            image = image.reduce(2)
+            level += 1
+    except Exception:
+        remove_pyramid_tiles(metadata)
+        raise
+    return metadata
+
+
+def publish_pyramid(metadata: dict, source_image_id: int) -> None:
+    # until its metadata exists a source image has no tiles for renders
+    data = json.dumps(metadata).encode()
+    get_storage().save(_pyramid_key(source_image_id), lambda fp: fp.write(data))
+
+
+def remove_pyramid_tiles(metadata: dict) -> None:
+    storage = get_storage()
+    for level in range(metadata["levels"]):
+        cols, rows = _level_grid(metadata, level)
+        for row in range(rows):
+            for col in range(cols):
+                storage.delete(_tile_key(metadata["tiles_prefix"], level, col, row))
+
+
+def remove_pyramid(source_image_id: int) -> None:
+    try:
+        metadata = load_pyramid(source_image_id)
+    except FileNotFoundError:
+        metadata = None
+    with _pyramid_lock:
+        _pyramids.pop(source_image_id, None)
+    with _tile_lock:
+        for key in [key for key in _tiles if key[0] == source_image_id]:
+            del _tiles[key]
+    if metadata is not None:
+        # the metadata goes first, renders never find a pyramid with missing tiles
+        get_storage().delete(_pyramid_key(source_image_id))
+        remove_pyramid_tiles(metadata)
+
+
+def _read_artifact(key: str, source_image_id: int) -> bytes:
+    storage = get_storage()
+    try:
+        return b"".join(storage.iter_bytes(key))
+    except Exception:
+        if not storage.exists(key):
+            raise FileNotFoundError(f"Source image with id={source_image_id} was not found!")
+        raise
+
+
+def load_pyramid(source_image_id: int) -> dict:
+    # pyramids never change once published, so their metadata is read once per process
+    with _pyramid_lock:
+        metadata = _pyramids.get(source_image_id)
+        if metadata is None:
+            metadata = json.loads(_read_artifact(_pyramid_key(source_image_id), source_image_id))
+            _pyramids[source_image_id] = metadata
+        return metadata
+
+
+def pyramid_level_for(crop_width: int, target_width: int, levels: int) -> int:
+    # the coarsest level that still has at least target_width pixels across the crop
+    level = 0
+    while level + 1 < levels and crop_width / 2 ** (level + 1) >= target_width:
+        level += 1
+    return level
+
+
+def _load_tile(source_image_id: int, level: int, col: int, row: int) -> Image.Image:
+    key = (source_image_id, level, col, row)
+    with _tile_lock:
+        tile = _tiles.get(key)
+        if tile is not None:
+            _tiles.move_to_end(key)
+            return tile
+
+    tile_key = _tile_key(load_pyramid(source_image_id)["tiles_prefix"], level, col, row)
+    with Image.open(io.BytesIO(_read_artifact(tile_key, source_image_id))) as tile:
+        tile.load()
+
+    with _tile_lock:
+        _tiles[key] = tile
+        while len(_tiles) > SOURCE_TILE_CACHE_TILES:
+            _tiles.popitem(last=False)
+    return tile
+
+
+def read_source_region(
+        source_image_id: int,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        level: int = 0
+) -> Image.Image:
+    # assembles the region (given in full resolution pixels) from the tiles of one pyramid level,
+    # at level n the result is 2^n times smaller
+    tile_size = load_pyramid(source_image_id)["tile_size"]
+    scale = 2 ** level
+    level_x, level_y = x // scale, y // scale
+    level_width, level_height = max(1, math.ceil(width / scale)), max(1, math.ceil(height / scale))
+
+    region = Image.new("RGB", (level_width, level_height))
+    for row in range(level_y // tile_size, (level_y + level_height - 1) // tile_size + 1):
+        for col in range(level_x // tile_size, (level_x + level_width - 1) // tile_size + 1):
+            tile = _load_tile(source_image_id, level, col, row)
+            region.paste(tile, (col * tile_size - level_x, row * tile_size - level_y))
+    return region
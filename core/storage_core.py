@@ -0,0 +1,217 @@
+import os
+import hashlib
+import mimetypes
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterator, NamedTuple, Optional
+from core.http_cache_core import file_etag
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")  # "local" or "s3"
+STORAGE_LOCAL_DIR = Path(os.getenv("STORAGE_LOCAL_DIR", Path(__file__).resolve().parent.parent / "resources" / "cropped_images"))
+STORAGE_SHARD_DEPTH = int(os.getenv("STORAGE_SHARD_DEPTH", 2))  # directory levels of 256 entries each
+STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", 64 * 1024))
+STORAGE_REDIRECT_DOWNLOADS = os.getenv("STORAGE_REDIRECT_DOWNLOADS", "1") == "1"
+STORAGE_PRESIGN_EXPIRES_SECONDS = int(os.getenv("STORAGE_PRESIGN_EXPIRES_SECONDS", 300))
+
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_PREFIX = os.getenv("S3_PREFIX", "cropped_images/")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None  # e.g. a local MinIO: http://minio:9000
+S3_REGION = os.getenv("S3_REGION") or None
+
+_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+
+class ObjectInfo(NamedTuple):
+    size: int
+    last_modified: float
+    etag: str
+
+
+class ArtifactStorage:
+    # keys are flat names such as "<render key>.pdf" or "item_<id>.pdf", the layout behind them is up to the driver
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        raise NotImplementedError
+
+    def save(self, key: str, write: Callable[[BinaryIO], None]) -> None:
+        # write() streams the content into a file object, readers only ever see the complete object
+        raise NotImplementedError
+
+    def iter_bytes(self, key: str, chunk_size: int = STORAGE_CHUNK_SIZE) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def iter_objects(self) -> Iterator[tuple[str, ObjectInfo]]:
+        # every stored key, in no particular order
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[Path]:
+        # only drivers that keep files on this machine return a path, so it can be sent without copying
+        return None
+
+    def presigned_url(
+            self,
+            key: str,
+            filename: str,
+            disposition: str = "attachment",
+            expires_in: int = STORAGE_PRESIGN_EXPIRES_SECONDS
+    ) -> Optional[str]:
+        # only drivers that can serve downloads themselves return an url
+        return None
+
+
+class LocalDiskStorage(ArtifactStorage):
+
+    def __init__(self, root: Path = STORAGE_LOCAL_DIR, shard_depth: int = STORAGE_SHARD_DEPTH):
+        self.root = Path(root)
+        self.shard_depth = shard_depth
+
+    def _path(self, key: str) -> Path:
+        # hash prefixed directories keep every directory small, no matter how many files are stored
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        shards = [digest[level * 2:level * 2 + 2] for level in range(self.shard_depth)]
+        return self.root.joinpath(*shards, key)
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        path = self._path(key)
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return ObjectInfo(stat_result.st_size, stat_result.st_mtime, file_etag(stat_result, path.name))
+
+    def save(self, key: str, write: Callable[[BinaryIO], None]) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # concurrent saves of the same key simply replace each other
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as fp:
+                write(fp)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def iter_bytes(self, key: str, chunk_size: int = STORAGE_CHUNK_SIZE) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as fp:
+            while chunk := fp.read(chunk_size):
+                yield chunk
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def iter_objects(self) -> Iterator[tuple[str, ObjectInfo]]:
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                # saves in progress are hidden temporary files
+                if name.startswith("."):
+                    continue
+                path = Path(directory, name)
+                try:
+                    stat_result = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield name, ObjectInfo(stat_result.st_size, stat_result.st_mtime, file_etag(stat_result, name))
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self._path(key)
+
+
+def _is_not_found(error: Exception) -> bool:
+    # botocore errors carry the response, anything else (e.g. a connection error) may have none or None
+    code = (getattr(error, "response", None) or {}).get("Error", {}).get("Code")
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+class S3Storage(ArtifactStorage):
+    # works with any client offering the boto3 S3 client API (AWS, MinIO, Ceph, ...)
+
+    def __init__(self, client: Any, bucket: str, prefix: str = S3_PREFIX):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except Exception as e:
+            if _is_not_found(e):
+                return None
+            raise
+        return ObjectInfo(head["ContentLength"], head["LastModified"].timestamp(), head["ETag"])
+
+    def save(self, key: str, write: Callable[[BinaryIO], None]) -> None:
+        # small files stay in memory, larger ones spill to disk; upload_fileobj sends them in parts
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES) as fp:
+            write(fp)
+            fp.seek(0)
+            self.client.upload_fileobj(fp, self.bucket, self.prefix + key, ExtraArgs={"ContentType": content_type})
+
+    def iter_bytes(self, key: str, chunk_size: int = STORAGE_CHUNK_SIZE) -> Iterator[bytes]:
+        body = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def iter_objects(self) -> Iterator[tuple[str, ObjectInfo]]:
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for entry in page.get("Contents", ()):
+                info = ObjectInfo(entry["Size"], entry["LastModified"].timestamp(), entry["ETag"])
+                yield entry["Key"][len(self.prefix):], info
+
+    def presigned_url(
+            self,
+            key: str,
+            filename: str,
+            disposition: str = "attachment",
+            expires_in: int = STORAGE_PRESIGN_EXPIRES_SECONDS
+    ) -> Optional[str]:
+        params = {
+            "Bucket": self.bucket,
+            "Key": self.prefix + key,
+            "ResponseContentDisposition": f'{disposition}; filename="{filename}"',
+        }
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in)
+
+
+def create_storage(backend: str) -> ArtifactStorage:
+    if backend == "local":
+        return LocalDiskStorage()
+    if backend == "s3":
+        if not S3_BUCKET:
+            raise ValueError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND is s3, but the 'boto3' package is not installed")
+        return S3Storage(boto3.client("s3", endpoint_url=S3_ENDPOINT_URL, region_name=S3_REGION), S3_BUCKET)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}', expected 'local' or 's3'")
+
+
+_storage: Optional[ArtifactStorage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> ArtifactStorage:
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = create_storage(STORAGE_BACKEND)
+        return _storage
+
+
+def set_storage(storage: ArtifactStorage) -> None:
+    global _storage
+    with _storage_lock:
+        _storage = storage
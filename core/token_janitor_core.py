@@ -0,0 +1,47 @@
+import os
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+from core.database_core import AsyncSessionLocal
+from core.crud.crud_tokens import delete_expired_token_sessions, delete_expired_revoked_tokens
+
+
+TOKEN_JANITOR_ENABLED = os.getenv("TOKEN_JANITOR_ENABLED", "1") == "1"
+TOKEN_JANITOR_INTERVAL_SECONDS = float(os.getenv("TOKEN_JANITOR_INTERVAL_SECONDS", 300))
+TOKEN_JANITOR_BATCH_SIZE = int(os.getenv("TOKEN_JANITOR_BATCH_SIZE", 1000))
+TOKEN_JANITOR_MAX_BATCHES = int(os.getenv("TOKEN_JANITOR_MAX_BATCHES", 100))  # per run, the rest waits for the next run
+
+
+async def purge_expired_token_sessions(
+        batch_size: int = TOKEN_JANITOR_BATCH_SIZE,
+        max_batches: Optional[int] = TOKEN_JANITOR_MAX_BATCHES
+) -> int:
+    # every batch is its own transaction, so logins never wait long for the janitor's locks;
+    # max_batches=None runs until no expired session is left
+    expired_before = datetime.now(timezone.utc)
+    deleted = 0
+    # revoked tokens expire together with their sessions, they are purged the same way
+    for delete_expired in (delete_expired_token_sessions, delete_expired_revoked_tokens):
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            async with AsyncSessionLocal() as db:
+                batch_deleted = await delete_expired(db, expired_before, batch_size)
+            deleted += batch_deleted
+            batches += 1
+            if batch_deleted < batch_size:
+                break
+    return deleted
+
+
+async def run_token_janitor() -> None:
+    # several app workers may run a janitor, deleting the same expired rows twice is harmless
+    while True:
+        try:
+            deleted = await purge_expired_token_sessions()
+            if deleted:
+                print(f"Token janitor deleted {deleted} expired token sessions and revocations")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Token janitor failed, retrying in {TOKEN_JANITOR_INTERVAL_SECONDS}s: {e!r}")
+        await asyncio.sleep(TOKEN_JANITOR_INTERVAL_SECONDS)
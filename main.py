@@ -1,40 +1,119 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from contextlib import asynccontextmanager
 import sqlalchemy.exc
 import asyncio
-from core.database_core import engine
-from models.db_models.db_base import Base
+import time
+from core.database_core import engine, AsyncSessionLocal, wait_for_database
+from core.migrations_core import AUTO_MIGRATE, migrate, check_schema_version
+from core.auth_core import shutdown_password_executor
+from core.metrics_core import METRICS_ENABLED, instrument_engine, start_request_db_stats, observe_request
+from core.profiling_core import PROFILE_SAMPLE_RATE, start_request_profile, finish_request_profile
+from core.render_core import RENDER_MODE, shutdown_render_executor
+from core.render_jobs_core import RENDER_WORKER_IN_APP, run_render_worker
+from core.token_janitor_core import TOKEN_JANITOR_ENABLED, run_token_janitor
+from core.pdf_cache_janitor_core import PDF_CACHE_JANITOR_ENABLED, run_pdf_cache_janitor
+from core.revocation_core import REVOCATION_INDEX_ENABLED, sync_revocation_index, run_revocation_sync
 from api_routes.auth import router as auth_router
 from api_routes.users import router as users_router
 from api_routes.material import router as material_router
 from api_routes.product_types import router as product_type_router
 from api_routes.items import router as catalog_router
-
-max_attempts = 16
-delay_seconds = 2
+from api_routes.source_images import router as source_image_router
+from api_routes.health import router as health_router
+from api_routes.admin import router as admin_router
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    for attempt in range(1, max_attempts + 1):
+    await wait_for_database(engine)
+    if AUTO_MIGRATE:
+        await migrate(engine)
+    else:
+        # the schema is migrated by `python manage.py migrate`, starting a replica only checks its version
+        await check_schema_version(engine)
+
+    background_tasks = []
+    if REVOCATION_INDEX_ENABLED:
+        # until the index is loaded, tokens are checked against their session in the database
         try:
-            async with engine.begin() as conn:
-                await conn.run_sync(Base.metadata.create_all)
-            print("Database connected successfully! :)")
-            break
-        except sqlalchemy.exc.OperationalError as e:
-            print(f"DB is still waking up... (attempt {attempt}/{max_attempts}): {e}")
-            if attempt == max_attempts:
-                print("DB is too slow or dead!")
-                raise
-            await asyncio.sleep(delay_seconds)
+            async with AsyncSessionLocal() as db:
+                print(f"Loaded {await sync_revocation_index(db)} revoked tokens")
+        except sqlalchemy.exc.SQLAlchemyError as e:
+            print(f"Loading the revocation index failed, checking sessions in the database for now: {e!r}")
+        background_tasks.append(asyncio.create_task(run_revocation_sync()))
+    if RENDER_MODE == "job" and RENDER_WORKER_IN_APP:
+        background_tasks.append(asyncio.create_task(run_render_worker()))
+    if TOKEN_JANITOR_ENABLED:
+        background_tasks.append(asyncio.create_task(run_token_janitor()))
+    if PDF_CACHE_JANITOR_ENABLED:
+        background_tasks.append(asyncio.create_task(run_pdf_cache_janitor()))
 
     yield
 
+    for task in background_tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    shutdown_render_executor()
+    shutdown_password_executor()
+
 app = FastAPI(lifespan=lifespan)
 
+if METRICS_ENABLED:
+    instrument_engine(engine)
+
+    @app.middleware("http")
+    async def metrics_middleware(request: Request, call_next):
+        # streamed bodies are still being sent after call_next returns, they are timed up to the headers
+        db_stats = start_request_db_stats()
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            # the route template keeps the number of label values bounded, unmatched paths share one label
+            route = request.scope.get("route")
+            observe_request(
+                request.method,
+                getattr(route, "path", "unmatched"),
+                status_code,
+                time.perf_counter() - start,
+                db_stats,
+            )
+
+if PROFILE_SAMPLE_RATE > 0:
+
+    @app.middleware("http")
+    async def profiling_middleware(request: Request, call_next):
+        # sampled requests are profiled, only the ones slower than PROFILE_SLOW_SECONDS are kept
+        profile = start_request_profile()
+        if profile is None:
+            return await call_next(request)
+
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            finish_request_profile(
+                profile,
+                request.method,
+                getattr(route, "path", "unmatched"),
+                status_code,
+                time.perf_counter() - start,
+            )
 
 app.include_router(auth_router) # login/logout and token session endpoints
 app.include_router(users_router) # user CRUD endpoints
 app.include_router(material_router) # material endpoints
 app.include_router(product_type_router) # product type endpoints
 app.include_router(catalog_router) # catalog (items) endpoints
+app.include_router(source_image_router) # source image registry endpoints
+app.include_router(health_router) # health check, connection pool gauges and prometheus metrics
+app.include_router(admin_router) # admin only endpoints, e.g. slow request profiles
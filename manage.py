@@ -0,0 +1,87 @@
+"""
+Maintenance commands.
+
+Usage:
+    python manage.py migrate [--target VERSION]
+    python manage.py rerender-stale [--dry-run] [--batch-size 100]
+    python manage.py purge-token-sessions [--batch-size 1000]
+"""
+import asyncio
+import argparse
+from core.database_core import AsyncSessionLocal, engine, wait_for_database
+from core.migrations_core import LATEST_SCHEMA_VERSION, get_schema_version, migrate
+from core.render_core import RENDER_MODE, shutdown_render_executor
+from core.crud.crud_catalog import find_stale_render_item_ids, queue_render_jobs, rerender_items
+from core.token_janitor_core import purge_expired_token_sessions
+
+
+async def rerender_stale(dry_run: bool, batch_size: int) -> None:
+    async with AsyncSessionLocal() as db:
+        stale_ids = await find_stale_render_item_ids(db)
+    print(f"Found {len(stale_ids)} items with a stale or missing PDF")
+    if dry_run or not stale_ids:
+        return
+
+    failed = 0
+    for start in range(0, len(stale_ids), batch_size):
+        batch = stale_ids[start:start + batch_size]
+        async with AsyncSessionLocal() as db:
+            if RENDER_MODE == "job":
+                # the render workers pick the items up, nothing is rendered in this process
+                queued = await queue_render_jobs(db, batch)
+                print(f"Queued {queued} items for rendering")
+                continue
+            errors = await rerender_items(db, batch)
+        for item_id, error in errors.items():
+            print(f"Re-rendering item {item_id} failed: {error}")
+        failed += len(errors)
+        print(f"Re-rendered {min(start + batch_size, len(stale_ids))}/{len(stale_ids)} items")
+
+    if failed:
+        print(f"{failed} items could not be re-rendered and keep their previous PDF")
+
+
+async def run_migrations(target: int) -> None:
+    await wait_for_database(engine)
+    version = await get_schema_version(engine)
+    applied = await migrate(engine, target)
+    if not applied:
+        print(f"Database schema is up to date (version {version})")
+    else:
+        print(f"Migrated the database schema from version {version or 0} to {applied[-1].version}")
+
+
+async def run(args: argparse.Namespace) -> None:
+    try:
+        if args.command == "migrate":
+            await run_migrations(args.target)
+        elif args.command == "rerender-stale":
+            await rerender_stale(args.dry_run, args.batch_size)
+        elif args.command == "purge-token-sessions":
+            # runs until no expired session is left, unlike the janitor which stops after TOKEN_JANITOR_MAX_BATCHES
+            deleted = await purge_expired_token_sessions(args.batch_size, max_batches=None)
+            print(f"Deleted {deleted} expired token sessions and revocations")
+    finally:
+        await engine.dispose()
+        shutdown_render_executor()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="bring the database schema to the version this code needs")
+    migrate_parser.add_argument("--target", type=int, default=LATEST_SCHEMA_VERSION, help="stop after this version")
+
+    rerender = commands.add_parser("rerender-stale", help="render the PDFs of items whose render is outdated again")
+    rerender.add_argument("--dry-run", action="store_true", help="only report how many items are stale")
+    rerender.add_argument("--batch-size", type=int, default=100, help="items re-rendered per transaction")
+
+    purge = commands.add_parser("purge-token-sessions", help="delete all expired token sessions now")
+    purge.add_argument("--batch-size", type=int, default=1000, help="sessions deleted per transaction")
+
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel, ConfigDict
+from models.api_models.api_pagination_models import SortedPageQuery
 
 
 class TokenSessionBase(BaseModel):
@@ -20,6 +22,10 @@ class TokenSessionRead(TokenSessionBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class TokenSessionListQuery(SortedPageQuery):
+    is_revoked: Optional[bool] = None
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
\ No newline at end of file
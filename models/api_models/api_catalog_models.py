@@ -1,6 +1,10 @@
+import os
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, ConfigDict
+from typing import Any, Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from models.api_models.api_pagination_models import SortedPageQuery
+
+ITEM_BATCH_MAX_SIZE = int(os.getenv("ITEM_BATCH_MAX_SIZE", 1000))
 
 
 # Materials
@@ -45,12 +49,30 @@ class ProductTypeRead(ProductTypeBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+# Source Images
+class SourceImageRead(BaseModel):
+    id: int
+    name: str
+    content_hash: str
+    width: int
+    height: int
+    tile_size: int
+    levels: int
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 # Item Configuration
 class ItemBase(BaseModel):
     material_id: int
     product_type_id: int
     width: int
     height: int
+    timestamp_overlay: bool = False
+    source_image_id: Optional[int] = None
+    crop_x: int = Field(0, ge=0)
+    crop_y: int = Field(0, ge=0)
 
 
 class ItemCreate(ItemBase):
@@ -62,11 +84,81 @@ class ItemUpdate(BaseModel):
     product_type_id: Optional[int] = None
     width: Optional[int] = None
     height: Optional[int] = None
+    source_image_id: Optional[int] = None  # an explicit null switches back to the built-in source image
+    crop_x: Optional[int] = Field(None, ge=0)
+    crop_y: Optional[int] = Field(None, ge=0)
 
 
 class ItemRead(ItemBase):
     id: int
     pdf_path: Optional[str] = None
+    render_status: str
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class ItemReadExpanded(ItemRead):
+    # only the relations requested with expand are present in the response
+    material: Optional[MaterialRead] = None
+    product_type: Optional[ProductTypeRead] = None
+
+
+ItemExpansion = Literal["material", "product_type"]
+
+
+class ItemExpandQuery(BaseModel):
+    # ?expand=material,product_type (or repeated expand parameters) embeds the referenced rows
+    expand: list[ItemExpansion] = []
+
+    @field_validator("expand", mode="before")
+    @classmethod
+    def split_expand(cls, value: Any) -> Any:
+        if isinstance(value, str):
+            value = [value]
+        if isinstance(value, list):
+            return [part.strip() for entry in value for part in str(entry).split(",") if part.strip()]
+        return value
+
+
+class ItemBatchCreate(BaseModel):
+    items: list[ItemCreate] = Field(min_length=1, max_length=ITEM_BATCH_MAX_SIZE)
+
+
+class ItemBatchResult(BaseModel):
+    index: int
+    status: Literal["created", "failed"]
+    item: Optional[ItemRead] = None
+    error: Optional[str] = None
+
+
+class ItemBatchRead(BaseModel):
+    created: int
+    failed: int
+    results: list[ItemBatchResult]
+
+
+class ItemListQuery(SortedPageQuery, ItemExpandQuery):
+    material_id: Optional[int] = None
+    product_type_id: Optional[int] = None
+    source_image_id: Optional[int] = None
+    min_width: Optional[int] = None
+    max_width: Optional[int] = None
+    min_height: Optional[int] = None
+    max_height: Optional[int] = None
+    render_status: Optional[str] = None
+
+
+class ItemExportQuery(BaseModel):
+    format: Literal["ndjson", "csv"] = "ndjson"
+    include_names: bool = False
+    updated_since: Optional[datetime] = None
+
+
+class ItemRenderRead(BaseModel):
+    id: int
+    render_status: str
+    render_error: Optional[str] = None
+    pdf_path: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,28 @@
+from typing import Generic, Literal, Optional, TypeVar
+from pydantic import BaseModel, Field
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+T = TypeVar("T")
+
+
+class PageQuery(BaseModel):
+    cursor: Optional[str] = None
+    limit: int = Field(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+    order: Literal["asc", "desc"] = "asc"
+
+
+class SortedPageQuery(PageQuery):
+    sort: Literal["id", "created_at"] = "id"
+
+
+class SearchQuery(BaseModel):
+    q: str = Field(min_length=1, max_length=100)
+    cursor: Optional[str] = None
+    limit: int = Field(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,11 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class RequestProfileRead(BaseModel):
+    id: int
+    method: str
+    route: str
+    status_code: int
+    duration_seconds: float
+    created_at: datetime
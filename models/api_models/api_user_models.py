@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel, EmailStr, ConfigDict
+from models.api_models.api_pagination_models import SortedPageQuery
 
 
 class UserBase(BaseModel):
@@ -26,6 +27,10 @@ class UserRead(UserBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class UserListQuery(SortedPageQuery):
+    is_active: Optional[bool] = None
+
+
 class LoginData(BaseModel):
     email: EmailStr
     password: str
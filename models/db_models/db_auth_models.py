@@ -10,7 +10,18 @@ class TokenSession(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     jti: Mapped[str] = mapped_column(String(255), index=True)
-    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    # sessions live until their token expires, the token janitor deletes them along this index
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
     is_revoked: Mapped[bool] = mapped_column(Boolean, default=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+    user: Mapped["User"] = relationship(back_populates="sessions")
+
+
+class RevokedToken(Base):
+    # jtis of revoked or deleted sessions, kept until the token expires; the revocation index is loaded from here
+    __tablename__ = "revoked_tokens"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    jti: Mapped[str] = mapped_column(String(255), unique=True, index=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
-    user: Mapped["User"] = relationship(back_populates="sessions")
\ No newline at end of file
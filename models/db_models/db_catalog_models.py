@@ -1,10 +1,16 @@
 from datetime import datetime
 from typing import List
-from sqlalchemy import String, Integer, ForeignKey, DateTime, func
+from sqlalchemy import String, Integer, Boolean, ForeignKey, DateTime, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from models.db_models.db_base import Base
 
 
+RENDER_STATUS_PENDING = "pending"
+RENDER_STATUS_RENDERING = "rendering"
+RENDER_STATUS_DONE = "done"
+RENDER_STATUS_FAILED = "failed"
+
+
 class Material(Base):
     __tablename__ = "materials"
 
@@ -23,6 +29,21 @@ class ProductType(Base):
     items: Mapped[List["ItemConfiguration"]] = relationship(back_populates="product_type", cascade="all, delete-orphan")
 
 
+class SourceImage(Base):
+    __tablename__ = "source_images"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(100))
+    content_hash: Mapped[str] = mapped_column(String(64), unique=True, index=True)
+
+    width: Mapped[int] = mapped_column(Integer)
+    height: Mapped[int] = mapped_column(Integer)
+    tile_size: Mapped[int] = mapped_column(Integer)
+    levels: Mapped[int] = mapped_column(Integer)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
 class ItemConfiguration(Base):
     __tablename__ = "item_configurations"
 
@@ -31,12 +52,33 @@ class ItemConfiguration(Base):
     material_id: Mapped[int] = mapped_column(ForeignKey("materials.id", ondelete="RESTRICT"), index=True)
     product_type_id: Mapped[int] = mapped_column(ForeignKey("product_types.id", ondelete="RESTRICT"), index=True)
 
+    # no source image = the built-in calm_kitchen.jpg
+    source_image_id: Mapped[int | None] = mapped_column(ForeignKey("source_images.id", ondelete="RESTRICT"), nullable=True, index=True)
+    crop_x: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    crop_y: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
     width: Mapped[int] = mapped_column(Integer)
     height: Mapped[int] = mapped_column(Integer)
 
-    pdf_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    timestamp_overlay: Mapped[bool] = mapped_column(Boolean, default=False, server_default="0")
+    pdf_path: Mapped[str | None] = mapped_column(String(255), nullable=True, index=True)
+    render_key: Mapped[str | None] = mapped_column(String(64), nullable=True)  # source image + geometry the pdf was rendered from
+
+    render_status: Mapped[str] = mapped_column(String(20), default=RENDER_STATUS_DONE, server_default=RENDER_STATUS_DONE, index=True)
+    render_error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    render_started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
 
     material: Mapped["Material"] = relationship(back_populates="items")
     product_type: Mapped["ProductType"] = relationship(back_populates="items")
+
+
+class ItemDeletion(Base):
+    # ids of deleted items, so exports with updated_since can report deletions next to the changes
+    __tablename__ = "item_deletions"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True)
+    item_id: Mapped[int] = mapped_column(Integer, index=True)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
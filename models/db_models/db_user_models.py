@@ -13,6 +13,6 @@ class User(Base):
     email: Mapped[EmailStr] = mapped_column(String(255), unique=True, index=True)
     hashed_password: Mapped[str] = mapped_column(String(255))
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
     sessions: Mapped[List["TokenSession"]] = relationship(back_populates="user", cascade="all, delete-orphan")
 
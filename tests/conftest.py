@@ -1,7 +1,19 @@
+import os
 import sys
+import tempfile
 from pathlib import Path
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
+
+# the app reads its settings at import time: rendered test PDFs go to a temporary storage
+# instead of resources/cropped_images
+_STORAGE_DIR = tempfile.TemporaryDirectory(prefix="storage_")
+os.environ["STORAGE_LOCAL_DIR"] = _STORAGE_DIR.name
+os.environ["STORAGE_BACKEND"] = "local"
+
+
+def pytest_sessionfinish(session, exitstatus):
+    _STORAGE_DIR.cleanup()
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from core.cache_core import TTLCache, LocalCacheBackend, RedisCacheBackend, set_cache_backend
+from core.auth_cache_core import (
+    cache_session,
+    get_cached_session,
+    cache_user,
+    get_cached_user,
+    invalidate_session,
+    invalidate_user,
+)
+from models.db_models.db_user_models import User
+
+
+class FakeRedis:
+    # local stand-in for a redis server that several app workers would share
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        value, expires_at = self.values.get(key, (None, 0))
+        return value if expires_at > time.monotonic() else None
+
+    async def set(self, key, value, px, nx=False):
+        if nx and await self.get(key) is not None:
+            return None
+        self.values[key] = (value, time.monotonic() + px / 1000)
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+
+def in_minutes(minutes: int) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(minutes=minutes)
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    assert cache.get("a") == 1
+    cache.set("c", 3, ttl=60)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    cache.set("d", 4, ttl=-1)
+    assert cache.get("d") is None
+
+
+def test_sessions_and_users_are_cached_until_invalidated():
+    set_cache_backend(LocalCacheBackend())
+    user = User(id=7, email="alex@el-shaikh.com", is_active=True, created_at=datetime(2025, 11, 28))
+
+    async def scenario():
+        await cache_session("jti-1", 7, False, in_minutes(5))
+        await cache_user(user, in_minutes(5))
+        assert await get_cached_session("jti-1") == {"user_id": 7, "is_revoked": False}
+        cached_user = await get_cached_user(7)
+        assert (cached_user.id, cached_user.email) == (7, "alex@el-shaikh.com")
+
+        await invalidate_session("jti-1", in_minutes(5))
+        await invalidate_user(7)
+        assert await get_cached_session("jti-1") == {"user_id": None, "is_revoked": True}
+        assert await get_cached_user(7) is None
+
+        # entries never outlive the token they were cached for
+        await cache_session("jti-2", 7, False, in_minutes(-1))
+        assert await get_cached_session("jti-2") is None
+
+    asyncio.run(scenario())
+
+
+def test_a_session_read_before_its_revocation_is_not_cached_afterwards():
+    async def scenario(backend):
+        set_cache_backend(backend)
+        # a request read the session from the database, then the session was revoked before it cached it
+        await invalidate_session("jti-4", in_minutes(5))
+        await cache_session("jti-4", 7, False, in_minutes(5))
+        return await get_cached_session("jti-4")
+
+    assert asyncio.run(scenario(LocalCacheBackend()))["is_revoked"]
+    assert asyncio.run(scenario(RedisCacheBackend(FakeRedis())))["is_revoked"]
+    set_cache_backend(LocalCacheBackend())
+
+
+def test_invalidation_propagates_through_shared_backend():
+    shared = FakeRedis()
+    worker_a = RedisCacheBackend(shared)
+    worker_b = RedisCacheBackend(shared)
+
+    async def scenario():
+        set_cache_backend(worker_a)
+        await cache_session("jti-3", 7, False, in_minutes(5))
+
+        set_cache_backend(worker_b)
+        assert await get_cached_session("jti-3") == {"user_id": 7, "is_revoked": False}
+        await invalidate_session("jti-3", in_minutes(5))
+
+        set_cache_backend(worker_a)
+        assert (await get_cached_session("jti-3"))["is_revoked"]
+
+    asyncio.run(scenario())
+    set_cache_backend(LocalCacheBackend())
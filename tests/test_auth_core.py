@@ -1,8 +1,12 @@
+import asyncio
 from datetime import timedelta
 
 from core.auth_core import (
     hash_password,
     verify_password,
+    hash_password_async,
+    shutdown_password_executor,
+    verify_password_async,
     create_access_token,
     decode_token,
 )
@@ -25,3 +29,22 @@ def test_create_and_decode_token():
     assert decoded["sub"] == "123"
     assert decoded["jti"] == "test_jti"
     assert "exp" in decoded
+
+
+def test_async_hash_and_verify_password():
+    async def scenario():
+        hashed = await hash_password_async("MyBigSecret123!")
+        return (
+            await verify_password_async("MyBigSecret123!", hashed),
+            await verify_password_async("wrong_password", hashed),
+        )
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_password_hashing_works_again_after_shutdown():
+    # e.g. a second app lifespan in the same process
+    shutdown_password_executor()
+    shutdown_password_executor()
+    hashed = asyncio.run(hash_password_async("MyBigSecret123!"))
+    assert asyncio.run(verify_password_async("MyBigSecret123!", hashed))
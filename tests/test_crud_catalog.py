@@ -0,0 +1,332 @@
+import os
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import core.crud.crud_catalog as crud_catalog
+import core.storage_core as storage_core
+from core.crud.crud_catalog import (
+    claim_render_jobs,
+    create_source_image,
+    delete_item,
+    delete_material,
+    ensure_pdfs_stored,
+    evict_unreferenced_pdfs,
+    find_stale_render_item_ids,
+    finish_render_job,
+    get_item_by_id,
+    get_material_by_id,
+    item_export_fields,
+    list_items,
+    release_unused_pdf,
+    stream_items_for_export,
+    update_item,
+)
+from core.database_core import create_engine_from_settings
+from core.metrics_core import instrument_engine, start_request_db_stats
+from core.image_core import generate_item_pdf, generate_item_render, item_artifact_keys, remove_item_pdf
+from core.source_image_core import load_pyramid
+from core.storage_core import LocalDiskStorage, get_storage
+from models.api_models.api_catalog_models import ItemExportQuery, ItemListQuery, ItemUpdate
+from models.db_models.db_base import Base
+from models.db_models.db_catalog_models import (
+    ItemConfiguration,
+    Material,
+    ProductType,
+    SourceImage,
+    RENDER_STATUS_DONE,
+    RENDER_STATUS_PENDING,
+    RENDER_STATUS_RENDERING,
+)
+
+
+def catalog_database(tmp_path, name: str):
+    engine = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / name}")
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def create_catalog(engine, session_factory, items: list[ItemConfiguration]) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_factory() as db:
+        db.add_all([Material(id=1, name="Wood"), Material(id=2, name="Glass"), ProductType(id=1, name="Backwall")])
+        db.add_all(items)
+        await db.commit()
+
+
+def new_item(item_id: int, **values) -> ItemConfiguration:
+    values = {"material_id": 1, "product_type_id": 1, "width": 300 + item_id, "height": 200, **values}
+    return ItemConfiguration(id=item_id, **values)
+
+
+def test_concurrent_workers_never_claim_the_same_job(tmp_path):
+    engine, session_factory = catalog_database(tmp_path, "claims.db")
+    stale_before = datetime.now(timezone.utc) - timedelta(minutes=5)
+
+    async def claim(limit: int) -> list[int]:
+        async with session_factory() as db:
+            return [item.id for item in await claim_render_jobs(db, limit, stale_before)]
+
+    async def scenario():
+        await create_catalog(engine, session_factory, [
+            new_item(item_id, render_status=RENDER_STATUS_PENDING) for item_id in range(1, 6)
+        ])
+        claimed = await asyncio.gather(claim(3), claim(3), claim(3))
+        # jobs a worker lost to another one are left for the next poll
+        claimed.append(await claim(10))
+        claimed.append(await claim(10))
+        await engine.dispose()
+        return claimed
+
+    claimed = asyncio.run(scenario())
+    all_claimed = [item_id for ids in claimed for item_id in ids]
+    assert sorted(all_claimed) == [1, 2, 3, 4, 5]
+    assert claimed[-1] == []
+
+
+def test_timed_out_claims_are_taken_over_and_their_late_results_dropped(tmp_path):
+    engine, session_factory = catalog_database(tmp_path, "takeover.db")
+    now = datetime.now(timezone.utc)
+
+    async def scenario():
+        await create_catalog(engine, session_factory, [
+            new_item(1, render_status=RENDER_STATUS_RENDERING, render_started_at=now - timedelta(minutes=10)),
+            new_item(2, render_status=RENDER_STATUS_RENDERING, render_started_at=now),
+        ])
+        async with session_factory() as db:
+            taken_over = await claim_render_jobs(db, 10, now - timedelta(minutes=5))
+            assert [item.id for item in taken_over] == [1]
+
+            # the geometry changed while the job was rendering, its PDF does not fit anymore
+            job = taken_over[0]
+            async with session_factory() as other:
+                (await other.get(ItemConfiguration, 1)).width = 999
+                await other.commit()
+            assert not await finish_render_job(db, job, RENDER_STATUS_DONE, "old.pdf", None, "old-key")
+
+            await db.refresh(job)
+            assert await finish_render_job(db, job, RENDER_STATUS_DONE, "new.pdf", None, "new-key")
+            await db.refresh(job)
+        await engine.dispose()
+        return job
+
+    item = asyncio.run(scenario())
+    assert item.render_status == RENDER_STATUS_DONE
+    assert item.pdf_path == "new.pdf"
+
+
+def test_unreferenced_shared_pdfs_are_evicted_oldest_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_core, "_storage", LocalDiskStorage(tmp_path / "storage"))
+    engine, session_factory = catalog_database(tmp_path, "evict.db")
+    oldest, older, used = generate_item_pdf(330, 250, -1), generate_item_pdf(340, 260, -2), generate_item_pdf(301, 200, -3)
+    for age, pdf_path in enumerate((used, older, oldest), start=1):
+        os.utime(get_storage().local_path(pdf_path), (0, 1_000_000 - age))
+    older_size = sum(get_storage().stat(key).size for key in item_artifact_keys(older))
+
+    async def scenario():
+        await create_catalog(engine, session_factory, [new_item(1, pdf_path=used, render_status=RENDER_STATUS_DONE)])
+        async with session_factory() as db:
+            evicted = await evict_unreferenced_pdfs(db, max_bytes=older_size)
+        await engine.dispose()
+        return evicted
+
+    # the cache is found in the storage and the item table, nothing is remembered in between
+    assert asyncio.run(scenario()) == [oldest]
+    assert not any(get_storage().exists(key) for key in item_artifact_keys(oldest))
+    assert get_storage().exists(older)
+    assert get_storage().exists(used)
+
+
+def test_releases_leave_shared_pdfs_to_the_janitor(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_core, "_storage", LocalDiskStorage(tmp_path / "storage"))
+    engine, session_factory = catalog_database(tmp_path, "release.db")
+    shared, own = generate_item_pdf(301, 200, -1), generate_item_pdf(302, 200, -2, timestamp_overlay=True)
+
+    async def scenario():
+        await create_catalog(engine, session_factory, [])
+        async with session_factory() as db:
+            # the request that released them never sweeps the whole storage
+            monkeypatch.setattr(crud_catalog, "list_shared_pdfs", None)
+            await release_unused_pdf(db, shared)
+            await release_unused_pdf(db, own)
+        await engine.dispose()
+
+    asyncio.run(scenario())
+    assert all(get_storage().exists(key) for key in item_artifact_keys(shared))
+    assert not any(get_storage().exists(key) for key in item_artifact_keys(own))
+
+
+def test_shared_pdfs_removed_by_a_concurrent_release_are_rendered_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_core, "_storage", LocalDiskStorage(tmp_path / "storage"))
+    engine, session_factory = catalog_database(tmp_path, "restore.db")
+    pdf_path = generate_item_pdf(301, 200, -1)
+    count_items_with_pdf_path = crud_catalog.count_items_with_pdf_path
+    counts = []
+
+    async def count_before_the_reuse_committed(db, counted_path):
+        # the first count ran before the item that reuses the render was committed
+        counts.append(counted_path)
+        return 0 if len(counts) == 1 else await count_items_with_pdf_path(db, counted_path)
+
+    async def scenario():
+        await create_catalog(engine, session_factory, [new_item(1, pdf_path=pdf_path, render_status=RENDER_STATUS_DONE)])
+        async with session_factory() as db:
+            # the item that reuses the render checks the storage after its commit
+            remove_item_pdf(pdf_path)
+            await ensure_pdfs_stored(db, [pdf_path])
+            assert get_storage().exists(pdf_path)
+
+            # the release counts again after the removal and restores what the item still needs
+            monkeypatch.setattr(crud_catalog, "count_items_with_pdf_path", count_before_the_reuse_committed)
+            assert not await crud_catalog._remove_unreferenced_pdf(db, pdf_path)
+        await engine.dispose()
+
+    asyncio.run(scenario())
+    assert counts == [pdf_path, pdf_path]
+    assert all(get_storage().exists(key) for key in item_artifact_keys(pdf_path))
+
+
+def test_a_concurrent_upload_of_the_same_source_keeps_the_first_pyramid(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_core, "_storage", LocalDiskStorage(tmp_path / "storage"))
+    engine, session_factory = catalog_database(tmp_path, "sources.db")
+
+    def stored_pyramid(tiles_prefix: str) -> dict:
+        pyramid = {"width": 10, "height": 10, "tile_size": 16, "levels": 1, "content_hash": "a" * 64, "tiles_prefix": tiles_prefix}
+        get_storage().save(f"{tiles_prefix}_0_0_0.png", lambda fp: fp.write(b"tile"))
+        return pyramid
+
+    async def scenario():
+        await create_catalog(engine, session_factory, [])
+        async with session_factory() as db:
+            first = await create_source_image(db, "Marble", stored_pyramid("source_first"))
+        # the upload that lost the race got past the content hash check before the first one was committed
+        async with session_factory() as db:
+            with pytest.raises(IntegrityError):
+                await create_source_image(db, "Marble", stored_pyramid("source_second"))
+        await engine.dispose()
+        return first
+
+    first = asyncio.run(scenario())
+    assert load_pyramid(first.id)["tiles_prefix"] == "source_first"
+    assert get_storage().exists("source_first_0_0_0.png")
+    assert not get_storage().exists("source_second_0_0_0.png")
+
+
+def test_only_changes_of_the_rendered_input_render_again(tmp_path, monkeypatch):
+    engine, session_factory = catalog_database(tmp_path, "updates.db")
+    monkeypatch.setattr(crud_catalog, "RENDER_MODE", "inline")
+    renders = []
+
+    async def render_configuration(item):
+        renders.append((item.width, item.height))
+        return f"item_{item.id}_{item.width}.pdf", "new-key"
+
+    monkeypatch.setattr(crud_catalog, "render_configuration", render_configuration)
+
+    async def scenario():
+        await create_catalog(engine, session_factory, [new_item(1, pdf_path="old.pdf", render_key="old-key")])
+        async with session_factory() as db:
+            item = await db.get(ItemConfiguration, 1)
+            # material and product type only change what the item is called, not its PDF
+            item = await update_item(db, item, ItemUpdate(material_id=2))
+            assert (item.material_id, item.pdf_path, renders) == (2, "old.pdf", [])
+
+            item = await update_item(db, item, ItemUpdate(width=500))
+            assert (item.pdf_path, item.render_key, renders) == ("item_1_500.pdf", "new-key", [(500, 200)])
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_renders_with_an_outdated_render_key_are_stale(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_core, "_storage", LocalDiskStorage(tmp_path / "storage"))
+    engine, session_factory = catalog_database(tmp_path, "stale.db")
+    pdf_path, render_key = generate_item_render(301, 200, -1)
+
+    async def scenario():
+        await create_catalog(engine, session_factory, [
+            SourceImage(id=1, name="Marble", content_hash="a" * 64, width=1000, height=1000, tile_size=512, levels=2),
+            new_item(1, pdf_path=pdf_path, render_key=render_key),
+            # e.g. rendered from an earlier version of the source image
+            new_item(2, width=301, pdf_path=pdf_path, render_key="0" * 64),
+            new_item(3, width=301, pdf_path=pdf_path, render_key=None),
+            new_item(4, width=301, pdf_path=pdf_path, render_key=render_key, render_status=RENDER_STATUS_PENDING),
+            # the pyramid of its source image is gone, it cannot be rendered from it anymore
+            new_item(5, width=301, source_image_id=1, pdf_path=pdf_path, render_key=render_key),
+        ])
+        async with session_factory() as db:
+            stale_ids = await find_stale_render_item_ids(db)
+        await engine.dispose()
+        return stale_ids
+
+    assert asyncio.run(scenario()) == [2, 3, 5]
+
+
+def test_incremental_exports_report_deleted_items(tmp_path):
+    engine, session_factory = catalog_database(tmp_path, "deletions.db")
+    # SQLite stores timestamps to the second, the items are older than the last sync to keep them apart
+    synced_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    before_sync = {"updated_at": synced_at - timedelta(days=1)}
+
+    async def scenario():
+        await create_catalog(engine, session_factory, [
+            new_item(1, **before_sync), new_item(2, **before_sync), new_item(3, material_id=2, **before_sync)
+        ])
+        async with session_factory() as db:
+            await delete_item(db, await db.get(ItemConfiguration, 1))
+            # items of a deleted material go with it
+            await delete_material(db, await get_material_by_id(db, 2))
+            (await db.get(ItemConfiguration, 2)).width = 999
+            await db.commit()
+
+        query = ItemExportQuery(updated_since=synced_at)
+        async with session_factory() as db:
+            rows = [row async for row in stream_items_for_export(db, query)]
+        await engine.dispose()
+        return query, rows
+
+    query, rows = asyncio.run(scenario())
+    assert all(list(row) == item_export_fields(query) for row in rows)
+    assert [(row["id"], row["width"], row["deleted_at"] is not None) for row in rows] == [
+        (2, 999, False), (1, None, True), (3, None, True)
+    ]
+
+
+def test_expanded_item_pages_take_one_statement(tmp_path):
+    engine, session_factory = catalog_database(tmp_path, "items.db")
+    instrument_engine(engine)
+
+    async def scenario():
+        await create_catalog(engine, session_factory, [new_item(i, material_id=2 - i % 2, pdf_path="x.pdf") for i in range(1, 6)])
+        async with session_factory() as db:
+            stats = start_request_db_stats()
+            items, next_cursor = await list_items(db, ItemListQuery(limit=3, expand="material,product_type"))
+            # the relations are already loaded, reading them must not query again
+            names = [(item.material.name, item.product_type.name) for item in items]
+        await engine.dispose()
+        return stats.queries, names, next_cursor
+
+    queries, names, next_cursor = asyncio.run(scenario())
+    assert queries == 1
+    assert names == [("Wood", "Backwall"), ("Glass", "Backwall"), ("Wood", "Backwall")]
+    assert next_cursor is not None
+
+
+def test_an_updated_item_is_expanded_with_its_new_material(tmp_path):
+    engine, session_factory = catalog_database(tmp_path, "expand.db")
+
+    async def scenario():
+        await create_catalog(engine, session_factory, [new_item(1)])
+        async with session_factory() as db:
+            item = await get_item_by_id(db, 1, ["material"])
+            assert item.material.name == "Wood"
+            await update_item(db, item, ItemUpdate(material_id=2))
+            # like PATCH /items/{item_id}?expand=material, which loads the relations again after the update
+            item = await get_item_by_id(db, 1, ["material"])
+        await engine.dispose()
+        return item.material.name
+
+    assert asyncio.run(scenario()) == "Glass"
@@ -0,0 +1,40 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+
+from core.database_core import backoff_delay, create_engine_from_settings, pool_metrics, InstrumentedAsyncQueuePool
+
+
+def test_in_memory_sqlite_uses_a_single_static_connection():
+    engine = create_engine_from_settings("sqlite+aiosqlite:///:memory:")
+    assert isinstance(engine.pool, StaticPool)
+    assert pool_metrics(engine) == {"pool": "StaticPool"}
+
+
+def test_pool_metrics_report_checkouts_and_wait_time(tmp_path):
+    engine = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}")
+    assert isinstance(engine.pool, InstrumentedAsyncQueuePool)
+
+    async def scenario():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            during = pool_metrics(engine)
+        after = pool_metrics(engine)
+        await engine.dispose()
+        return during, after
+
+    during, after = asyncio.run(scenario())
+    assert during["checked_out"] == 1
+    assert after["checked_out"] == 0
+    assert after["checkouts"] >= 1
+    assert after["wait_seconds_max"] >= 0
+
+
+def test_backoff_grows_exponentially_up_to_the_cap():
+    delays = [[backoff_delay(attempt, 0.5, 10) for _ in range(200)] for attempt in (1, 3, 10)]
+    assert all(0 <= delay <= 0.5 for delay in delays[0])
+    assert all(0 <= delay <= 2 for delay in delays[1])
+    assert all(0 <= delay <= 10 for delay in delays[2])
+    # jittered, so replicas starting together spread their retries
+    assert len(set(delays[2])) > 1
@@ -0,0 +1,43 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+
+from core.export_core import to_ndjson, to_csv
+
+ROWS = [
+    {"id": 1, "width": 300, "created_at": datetime(2025, 11, 28, 13, 17, 32), "pdf_path": None},
+    {"id": 2, "width": 400, "created_at": datetime(2025, 11, 29, 8, 0, 0), "pdf_path": "a,b.pdf"},
+]
+
+
+async def rows():
+    for row in ROWS:
+        yield row
+
+
+async def collect(chunks) -> list[str]:
+    return [chunk async for chunk in chunks]
+
+
+def test_to_ndjson_writes_one_line_per_row():
+    chunks = asyncio.run(collect(to_ndjson(rows())))
+    assert len(chunks) == 2
+    assert json.loads(chunks[0]) == {"id": 1, "width": 300, "created_at": "2025-11-28T13:17:32", "pdf_path": None}
+
+
+def test_to_csv_writes_header_and_quotes_values():
+    chunks = asyncio.run(collect(to_csv(rows(), list(ROWS[0]))))
+    assert len(chunks) == 3
+    parsed = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert parsed[1] == {"id": "2", "width": "400", "created_at": "2025-11-29T08:00:00", "pdf_path": "a,b.pdf"}
+
+
+def test_to_csv_writes_the_header_of_an_empty_export():
+    async def no_rows():
+        return
+        yield
+
+    chunks = asyncio.run(collect(to_csv(no_rows(), ["id", "width"])))
+    assert "".join(chunks) == "id,width\r\n"
@@ -0,0 +1,40 @@
+import os
+
+from starlette.requests import Request
+
+from core.http_cache_core import file_etag, http_date, is_not_modified
+
+
+def make_request(**headers: str) -> Request:
+    raw_headers = [(name.replace("_", "-").lower().encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw_headers})
+
+
+def test_file_etag_changes_with_file(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"first")
+    first = file_etag(os.stat(path), path.name)
+
+    path.write_bytes(b"second")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+
+    assert first.startswith('"') and not first.startswith('W/')
+    assert file_etag(os.stat(path), path.name) != first
+
+
+def test_is_not_modified_with_if_none_match():
+    etag = '"abc"'
+    assert is_not_modified(make_request(if_none_match='"abc"'), etag)
+    assert is_not_modified(make_request(if_none_match='"x", W/"abc"'), etag)
+    assert is_not_modified(make_request(if_none_match="*"), etag)
+    assert not is_not_modified(make_request(if_none_match='"other"'), etag)
+    # If-None-Match wins over If-Modified-Since
+    assert not is_not_modified(make_request(if_none_match='"other"', if_modified_since=http_date(2_000_000_000)), etag, 1_000_000_000)
+
+
+def test_is_not_modified_with_if_modified_since():
+    last_modified = 1_700_000_000.5
+    assert is_not_modified(make_request(if_modified_since=http_date(last_modified)), '"abc"', last_modified)
+    assert not is_not_modified(make_request(if_modified_since=http_date(last_modified - 10)), '"abc"', last_modified)
+    assert not is_not_modified(make_request(if_modified_since="not a date"), '"abc"', last_modified)
+    assert not is_not_modified(make_request(), '"abc"', last_modified)
@@ -1,8 +1,25 @@
+import os
+
 import pytest
 from PIL import Image
-from fastapi import HTTPException
 
-from core.image_core import generate_item_pdf, BASE_DIR, PDF_OUTPUT_DIR, SOURCE_IMAGE_PATH
+import core.image_core as image_core
+from core.image_core import (
+    RenderError,
+    generate_item_pdf,
+    generate_item_render,
+    get_render_key,
+    is_shared_pdf,
+    item_artifact_keys,
+    list_shared_pdfs,
+    parse_preview_specs,
+    preview_key,
+    PreviewSpec,
+    remove_item_pdf,
+    SOURCE_IMAGE_PATH,
+)
+import core.storage_core as storage_core
+from core.storage_core import STORAGE_LOCAL_DIR, LocalDiskStorage, get_storage
 
 
 def test_generate_item_pdf_creates_file():
@@ -10,17 +27,18 @@ def test_generate_item_pdf_creates_file():
     item_id = -1
 
     pdf_rel_path = generate_item_pdf(width, height, item_id)
-    pdf_full_path = BASE_DIR / pdf_rel_path
+    pdf_full_path = get_storage().local_path(pdf_rel_path)
 
     assert pdf_full_path.exists()
     assert pdf_full_path.suffix.lower() == ".pdf"
-    assert pdf_full_path.parent == PDF_OUTPUT_DIR
+    # stored below two levels of hash prefixed directories
+    assert pdf_full_path.parent.parent.parent == STORAGE_LOCAL_DIR
 
 
 def test_generate_item_pdf_rejects_non_positive_size():
-    with pytest.raises(HTTPException):
+    with pytest.raises(RenderError):
         generate_item_pdf(0, 100, 1)
-    with pytest.raises(HTTPException):
+    with pytest.raises(RenderError):
         generate_item_pdf(100, -5, 2)
 
 
@@ -28,8 +46,84 @@ def test_generate_item_pdf_rejects_too_large_size():
     with Image.open(SOURCE_IMAGE_PATH) as img:
         img_w, img_h = img.size
 
-    with pytest.raises(HTTPException):
+    with pytest.raises(RenderError):
         generate_item_pdf(img_w + 1, img_h, 3)
 
-    with pytest.raises(HTTPException):
+    with pytest.raises(RenderError):
         generate_item_pdf(img_w, img_h + 1, 4)
+
+
+def test_source_image_is_decoded_once_and_reloaded_on_change(tmp_path, monkeypatch):
+    source_copy = tmp_path / "source.jpg"
+    source_copy.write_bytes(SOURCE_IMAGE_PATH.read_bytes())
+    monkeypatch.setattr(image_core, "SOURCE_IMAGE_PATH", source_copy)
+
+    first = image_core.get_source_image()
+    assert image_core.get_source_image() is first
+
+    stat = source_copy.stat()
+    os.utime(source_copy, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reloaded = image_core.get_source_image()
+    assert reloaded is not first
+    assert reloaded.size == first.size
+
+
+def test_generate_item_pdf_shares_identical_crops():
+    first = generate_item_pdf(320, 240, -20)
+    first_mtime = get_storage().local_path(first).stat().st_mtime_ns
+
+    assert generate_item_pdf(320, 240, -21) == first
+    assert get_storage().local_path(first).stat().st_mtime_ns == first_mtime
+    assert generate_item_pdf(240, 320, -22) != first
+
+
+def test_generate_item_pdf_with_timestamp_is_per_item():
+    pdf_rel_path = generate_item_pdf(300, 200, -23, timestamp_overlay=True)
+    assert get_storage().local_path(pdf_rel_path).name == "item_-23.pdf"
+    assert not is_shared_pdf(pdf_rel_path)
+
+
+def test_generate_item_render_returns_the_render_key():
+    pdf_rel_path, render_key = generate_item_render(350, 270, -27)
+    assert render_key == get_render_key(350, 270)
+    assert render_key != get_render_key(270, 350)
+    assert pdf_rel_path == generate_item_pdf(350, 270, -28)
+
+
+def test_shared_pdfs_are_listed_from_the_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_core, "_storage", LocalDiskStorage(tmp_path))
+    shared = generate_item_pdf(330, 250, -24)
+    generate_item_pdf(330, 250, -25, timestamp_overlay=True)
+
+    assert is_shared_pdf(shared)
+    [render] = list_shared_pdfs()
+    assert render.pdf_path == shared
+    # the size covers the PDF together with its previews
+    assert render.size == sum(get_storage().stat(key).size for key in item_artifact_keys(shared))
+
+
+def test_previews_are_rendered_next_to_the_pdf():
+    pdf_rel_path = generate_item_pdf(800, 400, -32)
+    for spec in image_core.PREVIEW_SPECS:
+        preview_path = get_storage().local_path(preview_key(pdf_rel_path, spec))
+        with Image.open(preview_path) as preview:
+            assert preview.format == spec.format.upper()
+            assert preview.width == min(spec.width, 800)
+            assert preview.height == round(400 * preview.width / 800)
+
+
+def test_missing_previews_are_added_to_an_existing_render(monkeypatch):
+    pdf_rel_path = generate_item_pdf(360, 280, -33)
+    monkeypatch.setattr(image_core, "PREVIEW_SPECS", [PreviewSpec("jpeg", 100, 70)])
+    assert generate_item_pdf(360, 280, -34) == pdf_rel_path
+    assert get_storage().exists(preview_key(pdf_rel_path, PreviewSpec("jpeg", 100, 70)))
+
+
+def test_parse_preview_specs():
+    assert parse_preview_specs("webp:320:80, jpeg:640:85") == [PreviewSpec("webp", 320, 80), PreviewSpec("jpeg", 640, 85)]
+    assert parse_preview_specs("") == []
+    with pytest.raises(ValueError):
+        parse_preview_specs("gif:320:80")
+    with pytest.raises(ValueError):
+        parse_preview_specs("webp:320")
+
@@ -0,0 +1,83 @@
+import asyncio
+
+from sqlalchemy import text
+
+from core.database_core import create_engine_from_settings
+from core.image_core import generate_item_pdf, remove_item_pdf
+from core.metrics_core import (
+    Histogram,
+    RENDERS,
+    RENDER_SECONDS,
+    call_collecting_render_metrics,
+    instrument_engine,
+    start_request_db_stats,
+)
+
+
+def test_histogram_renders_cumulative_prometheus_buckets():
+    histogram = Histogram("test_seconds", "Test.", ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/items")
+    histogram.observe(0.5, "/items")
+    histogram.observe(5, "/items")
+
+    assert histogram.render() == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{route="/items",le="0.1"} 1',
+        'test_seconds_bucket{route="/items",le="1.0"} 2',
+        'test_seconds_bucket{route="/items",le="+Inf"} 3',
+        'test_seconds_sum{route="/items"} 5.55',
+        'test_seconds_count{route="/items"} 3',
+    ]
+
+
+def test_sql_statements_are_counted_per_request(tmp_path):
+    engine = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'metrics.db'}")
+    instrument_engine(engine)
+    instrument_engine(engine)  # listeners are only added once
+
+    async def request():
+        stats = start_request_db_stats()
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await conn.execute(text("SELECT 2"))
+        return stats
+
+    async def scenario():
+        first, second = await asyncio.gather(request(), request())
+        await engine.dispose()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.queries == 2
+    assert second.queries == 2
+    assert first.seconds > 0
+
+
+def test_render_metrics_record_phases_and_reuse():
+    # start without a stored render, so the first call renders and the second one reuses it
+    remove_item_pdf(generate_item_pdf(330, 230, -40))
+    rendered = RENDERS.value("rendered")
+    cached = RENDERS.value("cached")
+    totals = RENDER_SECONDS.count("total")
+
+    generate_item_pdf(330, 230, -41)
+    pdf_path = generate_item_pdf(330, 230, -42)
+    remove_item_pdf(pdf_path)
+
+    assert RENDERS.value("rendered") == rendered + 1
+    assert RENDERS.value("cached") == cached + 1
+    assert RENDER_SECONDS.count("total") == totals + 1
+
+
+def test_render_metrics_are_collected_for_the_parent_process():
+    rendered = RENDERS.value("rendered")
+
+    pdf_path, observations = call_collecting_render_metrics(generate_item_pdf, 340, 240, -43, True)
+    remove_item_pdf(pdf_path)
+
+    assert RENDERS.value("rendered") == rendered
+    (was_rendered, phase_seconds, artifact_bytes), = observations
+    assert was_rendered
+    assert set(phase_seconds) == {"source", "crop", "previews", "pdf", "total"}
+    assert artifact_bytes["pdf"] > 0
@@ -0,0 +1,209 @@
+import asyncio
+
+import pytest
+from sqlalchemy import inspect, text
+
+import core.migrations_core as migrations_core
+import core.storage_core as storage_core
+from core.database_core import create_engine_from_settings
+from core.migrations_core import LATEST_SCHEMA_VERSION, SchemaVersionError, check_schema_version, migrate
+from core.storage_core import LocalDiskStorage
+from models.db_models.db_base import Base
+# the model modules register their tables on Base
+import models.db_models.db_user_models
+import models.db_models.db_auth_models
+import models.db_models.db_catalog_models
+
+# the DDL create_all of the first release's models (before any migration existed) emits on SQLite
+FIRST_RELEASE_SCHEMA = [
+    "CREATE TABLE materials (id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, description VARCHAR(255), PRIMARY KEY (id))",
+    "CREATE INDEX ix_materials_id ON materials (id)",
+    "CREATE TABLE product_types (id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, description VARCHAR(255), PRIMARY KEY (id))",
+    "CREATE INDEX ix_product_types_id ON product_types (id)",
+    "CREATE TABLE users (id INTEGER NOT NULL, email VARCHAR(255) NOT NULL, hashed_password VARCHAR(255) NOT NULL, "
+    "is_active BOOLEAN NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL, PRIMARY KEY (id))",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    "CREATE INDEX ix_users_id ON users (id)",
+    "CREATE TABLE item_configurations (id INTEGER NOT NULL, material_id INTEGER NOT NULL, product_type_id INTEGER NOT NULL, "
+    "width INTEGER NOT NULL, height INTEGER NOT NULL, pdf_path VARCHAR(255), "
+    "created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL, PRIMARY KEY (id), "
+    "FOREIGN KEY(material_id) REFERENCES materials (id) ON DELETE RESTRICT, "
+    "FOREIGN KEY(product_type_id) REFERENCES product_types (id) ON DELETE RESTRICT)",
+    "CREATE INDEX ix_item_configurations_id ON item_configurations (id)",
+    "CREATE INDEX ix_item_configurations_material_id ON item_configurations (material_id)",
+    "CREATE INDEX ix_item_configurations_product_type_id ON item_configurations (product_type_id)",
+    "CREATE TABLE token_sessions (id INTEGER NOT NULL, user_id INTEGER NOT NULL, jti VARCHAR(255) NOT NULL, "
+    "expires_at DATETIME NOT NULL, is_revoked BOOLEAN NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL, "
+    "PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE CASCADE)",
+    "CREATE INDEX ix_token_sessions_id ON token_sessions (id)",
+    "CREATE INDEX ix_token_sessions_jti ON token_sessions (jti)",
+]
+FIRST_RELEASE_ROWS = [
+    "INSERT INTO materials (id, name) VALUES (1, 'Wood')",
+    "INSERT INTO product_types (id, name) VALUES (1, 'Backwall')",
+    "INSERT INTO item_configurations (material_id, product_type_id, width, height, pdf_path) VALUES (1, 1, 300, 200, 'a.pdf')",
+]
+
+
+def describe_schema(conn) -> dict:
+    # what a migration has to get right: columns with their nullability, indexes and foreign keys
+    inspector = inspect(conn)
+    return {
+        table: (
+            {(column["name"], column["nullable"]) for column in inspector.get_columns(table)},
+            {(index["name"], tuple(index["column_names"]), bool(index["unique"])) for index in inspector.get_indexes(table)},
+            {(tuple(key["constrained_columns"]), key["referred_table"]) for key in inspector.get_foreign_keys(table)},
+        )
+        for table in inspector.get_table_names()
+        if table != "schema_version"
+    }
+
+
+async def schema_of(engine, statements: list[str] = (), target: int = None) -> dict:
+    async with engine.begin() as conn:
+        for statement in statements:
+            await conn.execute(text(statement))
+    if target is not None:
+        await migrate(engine, target)
+    async with engine.connect() as conn:
+        schema = await conn.run_sync(describe_schema)
+    await engine.dispose()
+    return schema
+
+
+def test_new_database_needs_migrating_before_the_app_starts(tmp_path):
+    engine = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'new.db'}")
+
+    async def scenario():
+        with pytest.raises(SchemaVersionError):
+            await check_schema_version(engine)
+        applied = await migrate(engine)
+        version = await check_schema_version(engine)
+        await engine.dispose()
+        return applied, version
+
+    applied, version = asyncio.run(scenario())
+    assert [migration.version for migration in applied] == list(range(1, LATEST_SCHEMA_VERSION + 1))
+    assert version == LATEST_SCHEMA_VERSION
+
+
+def test_databases_of_the_first_release_are_brought_up_to_date(tmp_path):
+    engine = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+
+    def describe(conn):
+        inspector = inspect(conn)
+        return (
+            {column["name"] for column in inspector.get_columns("item_configurations")},
+            {index["name"] for index in inspector.get_indexes("token_sessions")},
+            set(inspector.get_table_names()),
+        )
+
+    async def scenario():
+        async with engine.begin() as conn:
+            for statement in FIRST_RELEASE_SCHEMA + FIRST_RELEASE_ROWS:
+                await conn.execute(text(statement))
+        await migrate(engine)
+        # nothing left to do, running it again changes nothing
+        assert await migrate(engine) == []
+        async with engine.connect() as conn:
+            schema = await conn.run_sync(describe)
+            item = (await conn.execute(text(
+                "SELECT render_status, crop_x, timestamp_overlay, updated_at FROM item_configurations"
+            ))).one()
+        await engine.dispose()
+        return schema, item
+
+    (item_columns, session_indexes, tables), item = asyncio.run(scenario())
+    assert {"render_status", "render_key", "source_image_id", "crop_x", "crop_y", "updated_at"} <= item_columns
+    assert "ix_token_sessions_expires_at" in session_indexes
+    assert {"source_images", "revoked_tokens", "schema_version"} <= tables
+    assert item.render_status == "done"
+    assert item.crop_x == 0
+    assert item.updated_at is not None
+
+
+def test_the_initial_migration_creates_the_first_release_schema(tmp_path):
+    # frozen: later model changes must not change what version 1 creates
+    first_release = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'first.db'}")
+    migrated = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'migrated.db'}")
+    assert asyncio.run(schema_of(migrated, target=1)) == asyncio.run(schema_of(first_release, FIRST_RELEASE_SCHEMA))
+
+
+def test_migrations_arrive_at_the_schema_of_the_models(tmp_path):
+    migrated = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'migrated.db'}")
+    models = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'models.db'}")
+
+    async def create_all():
+        async with models.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        return await schema_of(models)
+
+    migrated_schema, models_schema = asyncio.run(schema_of(migrated, target=LATEST_SCHEMA_VERSION)), asyncio.run(create_all())
+    # SQLite adds columns with a non-constant default as nullable and cannot add foreign keys to existing tables
+    columns, indexes, foreign_keys = models_schema["item_configurations"]
+    models_schema["item_configurations"] = (
+        {(name, nullable or name == "updated_at") for name, nullable in columns},
+        indexes,
+        {key for key in foreign_keys if key[1] != "source_images"},
+    )
+    assert migrated_schema == models_schema
+
+
+def test_pdfs_of_older_releases_move_into_the_storage(tmp_path, monkeypatch):
+    storage = LocalDiskStorage(tmp_path / "storage")
+    monkeypatch.setattr(storage_core, "_storage", storage)
+    monkeypatch.setattr(migrations_core, "_PROJECT_DIR", tmp_path)
+    legacy_file = tmp_path / "resources" / "cropped_images" / "item_7.pdf"
+    legacy_file.parent.mkdir(parents=True)
+    legacy_file.write_bytes(b"%PDF-legacy")
+    engine = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}")
+
+    async def scenario():
+        # the release before the pdf storage keys step
+        await migrate(engine, target=9)
+        async with engine.begin() as conn:
+            await conn.execute(text("INSERT INTO materials (id, name) VALUES (1, 'Wood')"))
+            await conn.execute(text("INSERT INTO product_types (id, name) VALUES (1, 'Backwall')"))
+            for item_id, pdf_path in ((7, "resources/cropped_images/item_7.pdf"), (8, "resources/cropped_images/item_8.pdf")):
+                await conn.execute(text(
+                    "INSERT INTO item_configurations (id, material_id, product_type_id, width, height, pdf_path) "
+                    f"VALUES ({item_id}, 1, 1, 300, 200, '{pdf_path}')"
+                ))
+        await migrate(engine)
+        async with engine.connect() as conn:
+            rows = (await conn.execute(text("SELECT id, pdf_path FROM item_configurations ORDER BY id"))).all()
+        await engine.dispose()
+        return rows
+
+    assert [tuple(row) for row in asyncio.run(scenario())] == [(7, "item_7.pdf"), (8, "item_8.pdf")]
+    assert b"".join(storage.iter_bytes("item_7.pdf")) == b"%PDF-legacy"
+    assert not legacy_file.exists()
+    # the file of item 8 was already gone, rerender-stale finds its PDF missing
+    assert not storage.exists("item_8.pdf")
+
+
+def test_sessions_revoked_before_the_upgrade_are_backfilled(tmp_path):
+    engine = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'sessions.db'}")
+
+    async def scenario():
+        async with engine.begin() as conn:
+            for statement in FIRST_RELEASE_SCHEMA:
+                await conn.execute(text(statement))
+            await conn.execute(text("INSERT INTO users (id, email, hashed_password, is_active) VALUES (1, 'a@b.c', 'x', 1)"))
+            for jti, expires_at, is_revoked in (
+                ("logged-out", "2999-01-01 00:00:00", 1),
+                ("expired", "2000-01-01 00:00:00", 1),
+                ("active", "2999-01-01 00:00:00", 0),
+            ):
+                await conn.execute(text(
+                    "INSERT INTO token_sessions (user_id, jti, expires_at, is_revoked) "
+                    f"VALUES (1, '{jti}', '{expires_at}', {is_revoked})"
+                ))
+        await migrate(engine)
+        async with engine.connect() as conn:
+            jtis = (await conn.execute(text("SELECT jti FROM revoked_tokens"))).scalars().all()
+        await engine.dispose()
+        return jtis
+
+    # a token logged out before the revocation index existed must not become valid again
+    assert asyncio.run(scenario()) == ["logged-out"]
@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.database_core import create_engine_from_settings
+from core.pagination_core import encode_cursor, decode_cursor, paginate, paginate_rows
+from models.api_models.api_pagination_models import PageQuery
+from models.db_models.db_base import Base
+from models.db_models.db_catalog_models import ItemConfiguration, Material, ProductType
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2025, 11, 28, 13, 17, 32)
+    assert decode_cursor(encode_cursor("id", "asc", [42]), "id", "asc") == [42]
+    assert decode_cursor(encode_cursor("created_at", "desc", [created_at, 7]), "created_at", "desc") == [created_at, 7]
+
+
+def test_cursor_rejects_garbage_and_other_orderings():
+    cursor = encode_cursor("id", "asc", [42])
+    with pytest.raises(HTTPException):
+        decode_cursor("garbage", "id", "asc")
+    with pytest.raises(HTTPException):
+        decode_cursor(cursor, "id", "desc")
+    with pytest.raises(HTTPException):
+        decode_cursor(cursor, "created_at", "asc")
+
+
+def test_cursor_values_of_the_wrong_type_are_rejected():
+    for sort, values in (
+        ("id", ["42"]),
+        ("id", [True]),
+        ("id", [{"id": 42}]),
+        ("created_at", ["2025-11-28T13:17:32", "7"]),
+        ("created_at", [42, 7]),
+    ):
+        with pytest.raises(HTTPException) as error:
+            decode_cursor(encode_cursor(sort, "asc", values), sort, "asc")
+        assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("sort", ["id", "created_at"])
+def test_pages_cover_every_row_exactly_once(tmp_path, sort, order):
+    engine = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'pages.db'}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    start = datetime(2025, 11, 28, 13, 17, 32)
+    # several rows share a timestamp, the id breaks the ties
+    offsets = [0, 2, 0, 1, 1, 0, 2, 1, 0]
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as db:
+            db.add_all([Material(id=1, name="Wood"), ProductType(id=1, name="Backwall")])
+            db.add_all([
+                ItemConfiguration(id=item_id, material_id=1, product_type_id=1, width=300, height=200,
+                                  created_at=start + timedelta(seconds=offset))
+                for item_id, offset in enumerate(offsets, start=1)
+            ])
+            await db.commit()
+
+        pages, cursor = [], None
+        while True:
+            async with session_factory() as db:
+                query = PageQuery(limit=2, order=order, cursor=cursor)
+                items, cursor = await paginate(db, select(ItemConfiguration), ItemConfiguration, query, sort=sort)
+            pages.append([item.id for item in items])
+            if cursor is None:
+                break
+        await engine.dispose()
+        return pages
+
+    pages = asyncio.run(scenario())
+    key = (lambda item_id: (offsets[item_id - 1], item_id)) if sort == "created_at" else (lambda item_id: item_id)
+    expected = sorted(range(1, len(offsets) + 1), key=key, reverse=order == "desc")
+    assert [item_id for page in pages for item_id in page] == expected
+    assert [len(page) for page in pages] == [2, 2, 2, 2, 1]
+
+
+def test_in_memory_pages_match_the_database_cursors():
+    rows = [{"id": row_id} for row_id in (3, 1, 2)]
+    page, cursor = paginate_rows(rows, PageQuery(limit=2, order="desc"))
+    assert page == [{"id": 3}, {"id": 2}]
+    assert cursor == encode_cursor("id", "desc", [2])
+    assert paginate_rows(rows, PageQuery(limit=2, order="desc", cursor=cursor)) == ([{"id": 1}], None)
+    with pytest.raises(HTTPException):
+        paginate_rows(rows, PageQuery(cursor=encode_cursor("id", "asc", ["2"])))
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import core.auth_core as auth_core
+import core.render_core as render_core
+from core.image_core import remove_item_pdf
+from core.profiling_core import start_request_profile, finish_request_profile, get_profile, profile_summary
+from models.db_models.db_user_models import User
+
+
+def test_only_slow_sampled_requests_are_kept():
+    assert start_request_profile(sample_rate=0) is None
+
+    fast = start_request_profile(sample_rate=1)
+    assert finish_request_profile(fast, "GET", "/items", 200, 0.01, slow_seconds=0.5) is None
+
+    slow = start_request_profile(sample_rate=1)
+    sum(range(10000))
+    profile = finish_request_profile(slow, "GET", "/items", 200, 0.7, slow_seconds=0.5)
+    assert get_profile(profile.id) == profile
+    assert "Ordered by: cumulative time" in profile_summary(profile)
+
+
+def test_renders_of_a_profiled_request_are_profiled_in_the_worker():
+
+    async def scenario():
+        active = start_request_profile(sample_rate=1)
+        # only one request per process is profiled at a time
+        assert start_request_profile(sample_rate=1) is None
+        pdf_path = await render_core.render_item_pdf(350, 250, -50, True)
+        return finish_request_profile(active, "POST", "/items", 200, 1.0, slow_seconds=0), pdf_path
+
+    profile, pdf_path = asyncio.run(scenario())
+    remove_item_pdf(pdf_path)
+    assert "generate_item_pdf" in profile_summary(profile, limit=500)
+
+
+def test_admin_endpoints_require_a_configured_admin_email(monkeypatch):
+    monkeypatch.setattr(auth_core, "ADMIN_EMAILS", {"admin@example.com"})
+
+    admin = User(id=1, email="Admin@example.com", is_active=True)
+    assert asyncio.run(auth_core.get_current_admin(admin)) is admin
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(auth_core.get_current_admin(User(id=2, email="user@example.com", is_active=True)))
+    assert exc_info.value.status_code == 403
@@ -0,0 +1,50 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import core.reference_cache_core as reference_cache_core
+from core.database_core import create_engine_from_settings
+from core.metrics_core import instrument_engine, start_request_db_stats
+from core.reference_cache_core import ReferenceTable
+from models.api_models.api_catalog_models import MaterialRead
+from models.db_models.db_base import Base
+from models.db_models.db_catalog_models import Material
+
+
+def test_writes_of_one_worker_reach_the_others(tmp_path, monkeypatch):
+    monkeypatch.setattr(reference_cache_core, "REFERENCE_CACHE_CHECK_SECONDS", 60)
+    engine = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'reference.db'}")
+    instrument_engine(engine)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    # two app workers, sharing nothing but the database and the cache backend
+    writer = ReferenceTable("test_materials", Material, MaterialRead)
+    reader = ReferenceTable("test_materials", Material, MaterialRead)
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as db:
+            db.add(Material(id=1, name="Wood"))
+            await db.commit()
+
+            first = await reader.snapshot(db)
+            stats = start_request_db_stats()
+            assert await reader.existing_ids(db, {1}) == {1}
+            assert stats.queries == 0
+            # a row created elsewhere is not in the copy yet, but the miss still finds it
+            db.add(Material(id=2, name="Glass"))
+            await db.commit()
+            assert await reader.existing_ids(db, {1, 2, 3}) == {1, 2}
+
+            await writer.invalidate()
+            cached = await reader.snapshot(db)
+            monkeypatch.setattr(reference_cache_core, "REFERENCE_CACHE_CHECK_SECONDS", 0)
+            reloaded = await reader.snapshot(db)
+        await engine.dispose()
+        return first, cached, reloaded
+
+    first, cached, reloaded = asyncio.run(scenario())
+    assert cached is first
+    assert list(reloaded.rows) == [1, 2]
+    assert reloaded.rows[2] == {"id": 2, "name": "Glass", "description": None}
+    assert reloaded.etag != first.etag
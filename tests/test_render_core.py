@@ -0,0 +1,84 @@
+import os
+import asyncio
+import threading
+import time
+
+import pytest
+from PIL import Image
+from fastapi import HTTPException
+
+import core.render_core as render_core
+from core.image_core import SOURCE_IMAGE_PATH
+from core.storage_core import get_storage
+
+
+def test_render_item_pdf_creates_file():
+    pdf_rel_path = asyncio.run(render_core.render_item_pdf(300, 200, -2))
+    assert get_storage().exists(pdf_rel_path)
+
+
+def test_event_loop_stays_responsive_while_rendering():
+    with Image.open(SOURCE_IMAGE_PATH) as img:
+        img_w, img_h = img.size
+
+    async def heartbeat(stop: asyncio.Event, lags: list[float]):
+        interval = 0.005
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - start - interval)
+
+    async def scenario() -> list[float]:
+        stop = asyncio.Event()
+        lags: list[float] = []
+        beat = asyncio.create_task(heartbeat(stop, lags))
+        await asyncio.gather(*(render_core.render_item_pdf(img_w, img_h, -10 - i, True) for i in range(8)))
+        stop.set()
+        await beat
+        return lags
+
+    lags = sorted(asyncio.run(scenario()))
+    p99 = lags[int(len(lags) * 0.99) - 1]
+    # a synchronous full-size render blocks the loop for the whole render, a pooled one only for scheduling
+    assert p99 < 0.05
+
+
+def test_run_render_rejects_when_queue_is_full(monkeypatch):
+    monkeypatch.setattr(render_core, "RENDER_MAX_WORKERS", 1)
+    monkeypatch.setattr(render_core, "RENDER_MAX_QUEUE", 1)
+    release = threading.Event()
+
+    async def scenario():
+        first = asyncio.create_task(render_core.run_render(release.wait))
+        second = asyncio.create_task(render_core.run_render(release.wait))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc_info:
+            await render_core.run_render(release.wait)
+        release.set()
+        await asyncio.gather(first, second)
+        return exc_info.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert error.headers["Retry-After"] == str(render_core.RENDER_RETRY_AFTER_SECONDS)
+
+
+def test_process_pool_survives_invalid_renders_and_dead_workers(monkeypatch):
+    render_core.shutdown_render_executor()
+    monkeypatch.setattr(render_core, "RENDER_EXECUTOR", "process")
+
+    async def scenario():
+        with pytest.raises(HTTPException) as invalid:
+            await render_core.render_item_pdf(0, 100, -60)
+        with pytest.raises(HTTPException) as crashed:
+            await render_core.run_render(os._exit, 1)
+        # the broken pool is replaced, later renders work again
+        return invalid.value, crashed.value, await render_core.render_item_pdf(300, 200, -61)
+
+    try:
+        invalid, crashed, pdf_path = asyncio.run(scenario())
+    finally:
+        render_core.shutdown_render_executor()
+    assert invalid.status_code == 400
+    assert crashed.status_code == 503
+    assert get_storage().exists(pdf_path)
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.database_core import create_engine_from_settings
+from core.revocation_core import RevocationIndex, get_revocation_index, sync_revocation_index
+from core.crud.crud_tokens import revoke_token_session, delete_token_session, get_token_session_by_jti
+from core.crud.crud_users import delete_user
+from models.db_models.db_base import Base
+from models.db_models.db_auth_models import TokenSession
+from models.db_models.db_user_models import User
+
+
+def in_minutes(minutes: int) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(minutes=minutes)
+
+
+def test_revocation_index_forgets_expired_tokens():
+    index = RevocationIndex()
+    assert not index.is_fresh()
+
+    index.merge([("revoked", in_minutes(5)), ("expired", in_minutes(-1))])
+    index.add("logged-out", in_minutes(5))
+    assert index.is_fresh()
+    assert index.contains("revoked")
+    assert index.contains("logged-out")
+    assert not index.contains("valid")
+    assert not index.contains("expired")
+    assert len(index) == 2
+
+    index.add("about-to-expire", in_minutes(-1))
+    assert index.prune() == 1
+    assert not index.is_fresh(max_staleness_seconds=-1)
+
+
+def test_revoked_and_deleted_sessions_reach_every_index(tmp_path):
+    engine = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'revocations.db'}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as db:
+            db.add(User(id=1, email="revoked@example.com", hashed_password="x"))
+            db.add_all([TokenSession(user_id=1, jti=jti, expires_at=in_minutes(30)) for jti in ("a", "b", "c")])
+            await db.commit()
+
+            await revoke_token_session(db, "a")
+            await revoke_token_session(db, "a")  # logging out twice must not fail
+            await delete_token_session(db, await get_token_session_by_jti(db, "b"))
+
+            # another app worker only learns about them from the database
+            other_worker = RevocationIndex()
+            await sync_revocation_index(db, other_worker)
+        await engine.dispose()
+        return other_worker
+
+    other_worker = asyncio.run(scenario())
+    for index in (get_revocation_index(), other_worker):
+        assert index.contains("a")
+        assert index.contains("b")
+        assert not index.contains("c")
+
+
+def test_sessions_of_a_deleted_user_reach_every_index(tmp_path):
+    engine = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'deleted_user.db'}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as db:
+            db.add_all([User(id=1, email="deleted@example.com", hashed_password="x"),
+                        User(id=2, email="kept@example.com", hashed_password="x")])
+            db.add_all([
+                TokenSession(user_id=1, jti="first", expires_at=in_minutes(30)),
+                TokenSession(user_id=1, jti="second", expires_at=in_minutes(30)),
+                TokenSession(user_id=2, jti="other", expires_at=in_minutes(30)),
+            ])
+            await db.commit()
+
+            await revoke_token_session(db, "second")
+            await delete_user(db, await db.get(User, 1))
+
+            other_worker = RevocationIndex()
+            await sync_revocation_index(db, other_worker)
+        await engine.dispose()
+        return other_worker
+
+    other_worker = asyncio.run(scenario())
+    for index in (get_revocation_index(), other_worker):
+        assert index.contains("first")
+        assert index.contains("second")
+        assert not index.contains("other")
@@ -0,0 +1,52 @@
+import pytest
+from fastapi import HTTPException
+
+from core.pagination_core import paginate_ranked
+from core.search_core import TrigramIndex
+from models.api_models.api_pagination_models import SearchQuery
+
+
+def test_names_containing_the_term_rank_first_and_typos_still_match():
+    index = TrigramIndex()
+    index.add(1, "Walnut wood veneer")
+    index.add(2, "Oak Wood")
+    index.add(3, "Aluminium")
+    index.add(4, "Woodland green")
+
+    # whole words before prefixes, shorter names before longer ones
+    assert index.search("wood") == [2, 1, 4]
+    assert index.search("alumnium") == [3]
+    assert index.search("glass") == []
+
+
+def test_short_terms_match_inside_names():
+    index = TrigramIndex()
+    index.add(1, "Plexiglas")
+    index.add(2, "Wood")
+    index.add(3, "Glass")
+
+    # prefixes rank by their padded trigrams, infixes still count as containing the term
+    assert index.search("gl") == [3, 1]
+    assert index.search("oo") == [2]
+    assert index.search("x") == [1]
+
+
+def test_index_follows_renames_and_deletes():
+    index = TrigramIndex()
+    index.sync({1: "Glass", 2: "Acrylic glass"})
+    index.sync({1: "Safety glass", 3: "Steel"})
+
+    assert index.search("acrylic") == []
+    assert index.search("safety") == [1]
+    assert index.search("steel") == [3]
+    assert len(index) == 2
+
+
+def test_ranked_pages_are_bound_to_their_term():
+    rows = [{"id": row_id} for row_id in (5, 3, 8)]
+    page, cursor = paginate_ranked(rows, SearchQuery(q="wood", limit=2))
+    assert page == [{"id": 5}, {"id": 3}]
+    assert paginate_ranked(rows, SearchQuery(q="wood", limit=2, cursor=cursor)) == ([{"id": 8}], None)
+
+    with pytest.raises(HTTPException):
+        paginate_ranked(rows, SearchQuery(q="glass", limit=2, cursor=cursor))
@@ -0,0 +1,99 @@
+import io
+
+import pytest
+from PIL import Image, ImageChops
+
+import core.source_image_core as source_image_core
+from core.source_image_core import (
+    build_source_pyramid,
+    load_pyramid,
+    publish_pyramid,
+    pyramid_level_for,
+    read_source_region,
+    remove_pyramid,
+    save_upload,
+)
+from core.image_core import RenderError, build_source_image, generate_item_pdf, get_render_key
+import core.storage_core as storage_core
+from core.storage_core import LocalDiskStorage, get_storage
+
+
+def save_image_upload(image: Image.Image, upload_path) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    buffer.seek(0)
+    return save_upload(buffer, upload_path)
+
+
+def tile_keys(level: int) -> list[str]:
+    return [key for key, _ in get_storage().iter_objects() if key.startswith(f"source_test_{level}_")]
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_core, "_storage", LocalDiskStorage(tmp_path / "storage"))
+    image = Image.new("RGB", (1300, 700))
+    for x in range(0, 1300, 10):
+        image.paste((x % 256, (x * 7) % 256, 90), (x, 0, x + 10, 700))
+
+    content_hash = save_image_upload(image, tmp_path / "upload.png")
+    pyramid = build_source_pyramid(tmp_path / "upload.png", "source_test", content_hash, tile_size=256)
+    publish_pyramid(pyramid, -1)
+    yield image, pyramid
+    remove_pyramid(-1)
+
+
+def test_pyramid_levels_halve_until_one_tile(source):
+    image, pyramid = source
+    assert (pyramid["width"], pyramid["height"], pyramid["levels"]) == (1300, 700, 4)
+    assert len(tile_keys(0)) == 6 * 3
+    assert len(tile_keys(3)) == 1
+    assert load_pyramid(-1) == pyramid
+
+
+def test_removed_pyramids_leave_no_tiles(source):
+    remove_pyramid(-1)
+    assert list(get_storage().iter_objects()) == []
+    with pytest.raises(FileNotFoundError):
+        load_pyramid(-1)
+
+
+def test_oversized_and_unsupported_uploads_are_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_core, "_storage", LocalDiskStorage(tmp_path / "storage"))
+    content_hash = save_image_upload(Image.new("RGB", (300, 300)), tmp_path / "upload.png")
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100 * 100)
+    with pytest.raises(RenderError) as error:
+        build_source_image(tmp_path / "upload.png", "source_bomb", content_hash)
+    assert error.value.status_code == 400
+
+    (tmp_path / "upload.txt").write_text("not an image")
+    with pytest.raises(RenderError) as error:
+        build_source_image(tmp_path / "upload.txt", "source_text", content_hash)
+    assert error.value.status_code == 400
+    assert list(get_storage().iter_objects()) == []
+
+
+def test_regions_match_the_original_pixels(source):
+    image, _ = source
+    region = read_source_region(-1, 250, 100, 600, 500)
+    assert ImageChops.difference(region, image.crop((250, 100, 850, 600))).getbbox() is None
+
+    assert read_source_region(-1, 250, 100, 600, 500, level=2).size == (150, 125)
+
+
+def test_pyramid_level_for():
+    assert pyramid_level_for(1200, 300, levels=4) == 2
+    assert pyramid_level_for(1200, 1000, levels=4) == 0
+    assert pyramid_level_for(12000, 10, levels=3) == 2
+
+
+def test_items_render_from_registered_sources(source):
+    pdf_path = generate_item_pdf(400, 300, -40, source_image_id=-1, crop_x=800, crop_y=200)
+    assert get_storage().exists(pdf_path)
+    assert pdf_path == f"{get_render_key(400, 300, -1, 800, 200)}.pdf"
+    assert get_render_key(400, 300, -1, 800, 200) != get_render_key(400, 300, -1)
+
+    with pytest.raises(RenderError):
+        generate_item_pdf(400, 300, -41, source_image_id=-1, crop_x=1000)
+    with pytest.raises(RenderError):
+        generate_item_pdf(400, 300, -42, source_image_id=-2)
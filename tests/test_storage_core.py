@@ -0,0 +1,124 @@
+import io
+from datetime import datetime, timezone
+
+import pytest
+
+import core.storage_core as storage_core
+from core.storage_core import LocalDiskStorage, S3Storage
+from core.image_core import generate_item_pdf, is_shared_pdf, remove_item_pdf
+
+
+class FakeS3Error(Exception):
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeBody:
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+        self.closed = False
+
+    def iter_chunks(self, chunk_size):
+        while chunk := self.stream.read(chunk_size):
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeS3Client:
+    # local stand-in for an S3 compatible object store shared by all app replicas
+
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise FakeS3Error("404")
+        data, content_type = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(data), "LastModified": datetime.now(timezone.utc), "ETag": f'"{hash(data)}"'}
+
+    def upload_fileobj(self, fp, bucket, key, ExtraArgs=None):
+        self.objects[(bucket, key)] = (fp.read(), ExtraArgs["ContentType"])
+
+    def get_object(self, Bucket, Key):
+        return {"Body": FakeBody(self.objects[(Bucket, Key)][0])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        contents = [
+            {"Key": key, "Size": len(data), "LastModified": datetime.now(timezone.utc), "ETag": f'"{hash(data)}"'}
+            for (bucket, key), (data, _) in self.objects.items()
+            if bucket == Bucket and key.startswith(Prefix)
+        ]
+        return [{"Contents": contents}] if contents else [{}]
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+def test_local_disk_storage_shards_keys_and_streams_files(tmp_path):
+    storage = LocalDiskStorage(tmp_path, shard_depth=2)
+    storage.save("a.pdf", lambda fp: fp.write(b"x" * 10))
+
+    path = storage.local_path("a.pdf")
+    assert len(path.relative_to(tmp_path).parts) == 3
+    assert storage.stat("a.pdf").size == 10
+    assert b"".join(storage.iter_bytes("a.pdf", chunk_size=3)) == b"x" * 10
+    assert list(path.parent.iterdir()) == [path]
+    assert [(key, info.size) for key, info in storage.iter_objects()] == [("a.pdf", 10)]
+
+    storage.delete("a.pdf")
+    assert not storage.exists("a.pdf")
+    assert storage.stat("a.pdf") is None
+
+
+def test_failed_save_leaves_no_partial_file(tmp_path):
+    storage = LocalDiskStorage(tmp_path)
+
+    def write(fp):
+        fp.write(b"partial")
+        raise RuntimeError("render crashed")
+
+    with pytest.raises(RuntimeError):
+        storage.save("b.pdf", write)
+    assert not storage.exists("b.pdf")
+    assert list(storage.local_path("b.pdf").parent.iterdir()) == []
+
+
+def test_s3_storage_round_trip():
+    client = FakeS3Client()
+    storage = S3Storage(client, "bucket", prefix="pdfs/")
+    storage.save("c.pdf", lambda fp: fp.write(b"%PDF"))
+
+    assert client.objects[("bucket", "pdfs/c.pdf")] == (b"%PDF", "application/pdf")
+    assert storage.stat("c.pdf").size == 4
+    assert b"".join(storage.iter_bytes("c.pdf")) == b"%PDF"
+    assert storage.local_path("c.pdf") is None
+    assert storage.presigned_url("c.pdf", "item_1.pdf").startswith("https://s3.test/bucket/pdfs/c.pdf")
+    assert [(key, info.size) for key, info in storage.iter_objects()] == [("c.pdf", 4)]
+
+    storage.delete("c.pdf")
+    assert storage.stat("c.pdf") is None
+    assert list(storage.iter_objects()) == []
+
+
+def test_generate_item_pdf_uses_the_configured_storage(monkeypatch):
+    client = FakeS3Client()
+    monkeypatch.setattr(storage_core, "_storage", S3Storage(client, "bucket", prefix=""))
+
+    pdf_path = generate_item_pdf(310, 210, -30)
+    assert client.objects[("bucket", pdf_path)][0].startswith(b"%PDF")
+
+    pdf_path = generate_item_pdf(310, 210, -31, timestamp_overlay=True)
+    assert not is_shared_pdf(pdf_path)
+    remove_item_pdf(pdf_path)
+    assert ("bucket", pdf_path) not in client.objects
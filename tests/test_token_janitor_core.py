@@ -0,0 +1,40 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.database_core import create_engine_from_settings
+from core.crud.crud_tokens import delete_expired_token_sessions
+from models.db_models.db_base import Base
+from models.db_models.db_auth_models import TokenSession
+from models.db_models.db_user_models import User
+
+
+def test_expired_sessions_are_deleted_in_bounded_batches(tmp_path):
+    engine = create_engine_from_settings(f"sqlite+aiosqlite:///{tmp_path / 'janitor.db'}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    now = datetime.now(timezone.utc)
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as db:
+            db.add(User(id=1, email="janitor@example.com", hashed_password="x"))
+            db.add_all([
+                TokenSession(user_id=1, jti=f"expired-{index}", expires_at=now - timedelta(minutes=index + 1), is_revoked=index % 2 == 0)
+                for index in range(5)
+            ])
+            db.add(TokenSession(user_id=1, jti="valid", expires_at=now + timedelta(minutes=30)))
+            await db.commit()
+
+            batches = [await delete_expired_token_sessions(db, now, batch_size=2) for _ in range(4)]
+            remaining = (await db.execute(select(TokenSession.jti))).scalars().all()
+            count = (await db.execute(select(func.count()).select_from(TokenSession))).scalar_one()
+        await engine.dispose()
+        return batches, remaining, count
+
+    batches, remaining, count = asyncio.run(scenario())
+    assert batches == [2, 2, 1, 0]
+    assert remaining == ["valid"]
+    assert count == 1